@@ -1,29 +1,125 @@
 from http import HTTPStatus
-from typing import Tuple
+from typing import Tuple, Optional, Dict, Any, Iterable
 
-from flask import jsonify, Response
+from flask import jsonify, request, Response
+from werkzeug.datastructures import Accept, ETags
+
+from celery_app.crimes_codec import CrimesColumns, pyarrow
+from celery_app.prepared_responses import PreparedResponse
+from utilities.metrics_utils import MetricsUtils
+from utilities.profiling_utils import ProfilingUtils
 
 
 class APIResponse:
     """A class that is used to unify app's API responses"""
 
+    arrow_mimetype = 'application/vnd.apache.arrow.stream'
+
     @staticmethod
-    def ok_response(data, http_status: HTTPStatus = HTTPStatus.OK) -> Tuple[Response, HTTPStatus]:
+    def ok_response(
+            data, http_status: HTTPStatus = HTTPStatus.OK, extra: Optional[Dict[str, Any]] = None
+    ) -> Tuple[Response, HTTPStatus]:
         """Serialize given data and http status as JSON object.
 
         Args:
             data: any JSON serializable data.
             http_status (HTTPStatus): successful HTTP status code, default HTTPStatus.OK.
+            extra (dict): extra JSON serializable fields of response, e.g. pagination cursor.
         Returns:
             A tuple object that contain JSON data and HTTP status code
         """
-        return jsonify(
-            {
-                "code": http_status,
-                "message": http_status.description,
-                "data": data
-            }
-        ), http_status
+        with ProfilingUtils.time_stage('serialize', MetricsUtils.api_serialize_seconds.labels(format='json')):
+            return jsonify(
+                {
+                    "code": http_status,
+                    "message": http_status.description,
+                    "data": data,
+                    **(extra or {})
+                }
+            ), http_status
+
+    @staticmethod
+    def negotiate_prepared_response(
+            prepared_response: PreparedResponse, accept_encodings: Accept, if_none_match: ETags
+    ) -> Tuple[HTTPStatus, Optional[str], bytes]:
+        """Select the prepared body that must be sent for a request. The best content encoding that client
+        accepts is selected, and if client already has the same response(If-None-Match header), nothing is sent.
+
+        Args:
+            prepared_response (PreparedResponse): serialized and compressed response
+            accept_encodings (Accept): parsed Accept-Encoding header of request
+            if_none_match (ETags): parsed If-None-Match header of request
+        Returns:
+            A tuple of HTTP status, content encoding(None if body is not compressed), and body
+        """
+        if prepared_response.etag in if_none_match:
+            return HTTPStatus.NOT_MODIFIED, None, b''
+        # an encoding with zero quality, e.g. "gzip;q=0", is refused by client
+        content_encoding = next(
+            item for item in PreparedResponse.encodings
+            if item in prepared_response.bodies and (item == 'identity' or accept_encodings[item] > 0)
+        )
+        body = prepared_response.bodies[content_encoding]
+        return HTTPStatus.OK, None if content_encoding == 'identity' else content_encoding, body
+
+    @classmethod
+    def prepared_response(cls, prepared_response: PreparedResponse) -> Response:
+        """Send a response that is already serialized and compressed, see `negotiate_prepared_response`
+
+        Args:
+            prepared_response (PreparedResponse): serialized and compressed response
+        Returns:
+            A Response object that contains prepared JSON bytes, or a 304 response
+        """
+        http_status, content_encoding, body = cls.negotiate_prepared_response(
+            prepared_response, request.accept_encodings, request.if_none_match
+        )
+        response = Response(body, status=http_status, mimetype='application/json')
+        if content_encoding is not None:
+            response.content_encoding = content_encoding
+        response.set_etag(prepared_response.etag)
+        response.vary.update(('Accept', 'Accept-Encoding'))
+        return response
+
+    @classmethod
+    def arrow_response(cls, crimes: CrimesColumns, next_cursor: Optional[str] = None) -> Response:
+        """Send crimes data as an Arrow IPC stream, so clients load columns without parsing JSON.
+
+        Args:
+            crimes (CrimesColumns): crimes data
+            next_cursor (str): pagination cursor of the next page, it is sent in "X-Next-Cursor" header
+        Returns:
+            A Response object that contains Arrow IPC stream bytes
+        """
+        with ProfilingUtils.time_stage('serialize', MetricsUtils.api_serialize_seconds.labels(format='arrow')):
+            response = Response(crimes.to_arrow_ipc(), mimetype=cls.arrow_mimetype)
+        if next_cursor is not None:
+            response.headers['X-Next-Cursor'] = next_cursor
+        response.vary.add('Accept')
+        return response
+
+    @staticmethod
+    def ndjson_response(lines: Iterable[bytes]) -> Response:
+        """Stream newline delimited JSON lines with chunked transfer encoding, lines are sent while they are
+        generated, so the whole response is never kept in memory.
+
+        Args:
+            lines: An iterable of NDJSON bytes
+        Returns:
+            A streamed Response object
+        """
+        return Response(lines, mimetype='application/x-ndjson')
+
+    @classmethod
+    def accepts_arrow(cls) -> bool:
+        """Check whether client prefers Arrow IPC stream over JSON(Accept header) and pyarrow is installed
+
+        Returns:
+            A boolean value that shows crimes must be sent as Arrow IPC stream or not
+        """
+        if pyarrow is None:
+            return False
+        return request.accept_mimetypes.best_match(['application/json', cls.arrow_mimetype]) == cls.arrow_mimetype
 
     @staticmethod
     def error_response(http_status: HTTPStatus) -> Tuple[Response, HTTPStatus]:
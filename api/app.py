@@ -1,9 +1,13 @@
 import os
+import time
+from http import HTTPStatus
 
 from dotenv import load_dotenv
-from flask import Flask
+from flask import Flask, Response, g, request
 
+from api.request_profiler import RequestProfiler
 from api.routes import chicago_crimes_blueprint
+from utilities.metrics_utils import MetricsUtils
 
 # loading environment variables which are defined in .env file
 load_dotenv()
@@ -13,6 +17,39 @@ application.config['SECRET_KEY'] = os.environ['FLASK_SECRET_KEY']
 
 # register crimes routes blueprint to our application
 application.register_blueprint(chicago_crimes_blueprint)
+# add Server-Timing header to API responses and profile sampled requests if request profiling is enabled
+RequestProfiler.init_app(application)
+
+
+@application.before_request
+def start_request_timer():
+    """Save start time of request, so its duration is measured after the response is created"""
+    g.request_start_time = time.perf_counter()
+
+
+@application.after_request
+def observe_request_duration(response: Response) -> Response:
+    """Measure duration of request by its endpoint(route function name), so paths with query params
+    don't create new metrics"""
+
+    if 'request_start_time' in g:
+        MetricsUtils.api_request_seconds.labels(endpoint=request.endpoint, status=response.status_code).observe(
+            time.perf_counter() - g.request_start_time
+        )
+    return response
+
+
+@application.route('/metrics', methods=['GET'])
+def get_metrics() -> Response:
+    """Returns Prometheus metrics of all API workers, e.g. cache hits and misses, redis latency,
+    and BigQuery queries duration and bytes
+
+    Returns:
+        A Response object that contains Prometheus text exposition
+    """
+    metrics, content_type = MetricsUtils.generate_metrics()
+    return Response(metrics, status=HTTPStatus.OK, content_type=content_type)
+
 
 if __name__ == '__main__':
     application.run(debug=debug_mode, port=8000, host='0.0.0.0')
@@ -0,0 +1,256 @@
+import logging
+import os
+import time
+from http import HTTPStatus
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+from urllib.parse import parse_qsl
+
+from dotenv import load_dotenv
+from uvicorn.middleware.wsgi import WSGIMiddleware
+from werkzeug.datastructures import Accept, Headers, MIMEAccept
+from werkzeug.http import parse_accept_header, parse_etags, quote_etag
+
+from api.api_response import APIResponse
+from api.app import application as flask_application
+from api.local_cache import CrimesLocalCache
+from api.popularity import CrimesPopularity
+from api.request_profiler import request_profiling_enabled
+from api.routes import chicago_crimes_blueprint
+from celery_app.cache_manager import AsyncCacheManager, AsyncRedisUtils
+from celery_app.crimes_aggregation import crimes_aggregate_resolutions
+from celery_app.prepared_responses import PreparedResponse
+from utilities.log_utils import LogUtils
+from utilities.metrics_utils import MetricsUtils
+from utilities.profiling_utils import ProfilingUtils
+
+# loading environment variables which are defined in .env file
+load_dotenv()
+# number of threads that run requests of Flask app, e.g. cache misses that wait for crimes data backend
+asgi_wsgi_threads = int(os.environ.get('ASGI_WSGI_THREADS', 16))
+
+logger = LogUtils.get_logger(logger_name='asgi_api', level=logging.ERROR)
+
+# status, headers, and body of a response
+ASGIResponse = Tuple[int, List[Tuple[bytes, bytes]], bytes]
+# a coroutine that answers a request by its query params and headers, or returns None to pass it to Flask app
+ASGIRoute = Callable[[Dict[str, str], Headers], Awaitable[Optional[ASGIResponse]]]
+
+
+class CrimesASGIApplication:
+    """An ASGI application of crimes API. Hot endpoints are answered in the event loop from local cache or
+    with non-blocking redis reads, so one process serves many concurrent clients. Other requests, cache misses,
+    and stale data are passed to the Flask app, which runs in a thread pool, so slow crimes data backend calls
+    don't block the event loop"""
+
+    def __init__(self, wsgi_application, wsgi_threads: int):
+        """Initialize the application
+
+        Args:
+            wsgi_application: The Flask app that handles requests which are not answered here
+            wsgi_threads (int): number of threads that run Flask app
+        """
+        self.wsgi_application = WSGIMiddleware(wsgi_application, workers=wsgi_threads)
+        # each route is measured by the endpoint name of its Flask route, so metrics of both apps are summed up
+        self.routes: Dict[str, Tuple[str, ASGIRoute]] = {
+            '/api/crimes/primary_types': (
+                f'{chicago_crimes_blueprint.name}.get_chicago_crimes_primary_types', self.get_crimes_primary_types
+            ),
+            '/api/crimes/': (
+                f'{chicago_crimes_blueprint.name}.get_chicago_crimes_by_primary_type', self.get_crimes_by_primary_type
+            ),
+            '/api/crimes/aggregate': (
+                f'{chicago_crimes_blueprint.name}.get_chicago_crimes_aggregate', self.get_crimes_aggregate
+            ),
+        }
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            return await self.lifespan(receive, send)
+
+        route = self.routes.get(scope['path']) if scope['type'] == 'http' and scope['method'] == 'GET' else None
+        if route is None:
+            return await self.wsgi_application(scope, receive, send)
+
+        endpoint, answer_request = route
+        start_time = time.perf_counter()
+        if request_profiling_enabled:
+            ProfilingUtils.start_request_timings()
+        query_params: Dict[str, str] = {}
+        for key, value in parse_qsl(scope['query_string'].decode('latin1')):
+            # the first value of a repeated param is used, same as `request.args.get` of Flask app
+            query_params.setdefault(key, value)
+        headers = Headers([(key.decode('latin1'), value.decode('latin1')) for key, value in scope['headers']])
+        response = None
+        try:
+            response = await answer_request(query_params, headers)
+        except Exception:
+            # Flask app handles the request again and returns a proper error response
+            logger.exception('Error while answering request in event loop, passing it to Flask app')
+        # requests that are passed to Flask app are measured, profiled, and counted there
+        timings = ProfilingUtils.stop_request_timings() if request_profiling_enabled else None
+        if response is None:
+            return await self.wsgi_application(scope, receive, send)
+        if 'primary_type' in query_params:
+            # responses are answered here only for cached primary types, so primary type is known
+            CrimesPopularity.record_request(query_params['primary_type'])
+
+        status, headers, body = response
+        total_seconds = time.perf_counter() - start_time
+        if timings is not None:
+            headers = headers + [
+                (b'server-timing', ProfilingUtils.format_server_timing(timings, total_seconds).encode())
+            ]
+        MetricsUtils.api_request_seconds.labels(endpoint=endpoint, status=int(status)).observe(total_seconds)
+        await send({'type': 'http.response.start', 'status': int(status), 'headers': headers})
+        await send({'type': 'http.response.body', 'body': body})
+
+    @staticmethod
+    async def lifespan(receive, send):
+        """Handles ASGI lifespan events, redis connections are closed when server shuts down"""
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await AsyncRedisUtils.get_redis_client().close()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    @staticmethod
+    def json_response(body: bytes, extra_headers: Optional[List[Tuple[bytes, bytes]]] = None) -> ASGIResponse:
+        """Create a successful JSON response
+
+        Args:
+            body (bytes): serialized JSON body
+            extra_headers: extra response headers
+        Returns:
+            An ASGI response tuple
+        """
+        headers = [(b'content-type', b'application/json'), (b'content-length', str(len(body)).encode())]
+        return HTTPStatus.OK, headers + (extra_headers or []), body
+
+    @staticmethod
+    async def get_crimes_generation() -> Optional[int]:
+        """Returns the generation of cached crimes data, it is kept in local cache until a new generation
+        is published, same as Flask app
+
+        Returns:
+            A generation of cached crimes data, or None if redis is not ready
+        """
+        return await CrimesLocalCache.get_or_load_async('generation', AsyncCacheManager.get_crimes_generation)
+
+    @staticmethod
+    async def get_cached_crimes_primary_types() -> Optional[Tuple[str]]:
+        """Returns crimes primary types from local cache or redis, same as Flask app
+
+        Returns:
+            A tuple containing distinct strings of primary types, or None if they are not cached yet
+        """
+        return await CrimesLocalCache.get_or_load_async('primary_types', AsyncCacheManager.get_crimes_primary_types)
+
+    async def record_crimes_cache_lookup(self, primary_type: str, is_hit: bool):
+        """Count a hit or miss of cached crimes of primary type, same as Flask app
+
+        Args:
+            primary_type (str): A string that indicates primary type
+            is_hit (bool): crimes are cached or not
+        """
+        primary_type_label = MetricsUtils.primary_type_label(
+            primary_type, await self.get_cached_crimes_primary_types() or ()
+        )
+        MetricsUtils.crimes_cache_lookups.labels(
+            primary_type=primary_type_label, result='hit' if is_hit else 'miss'
+        ).inc()
+
+    async def get_crimes_primary_types(self, query_params: Dict[str, str], headers: Headers) -> Optional[ASGIResponse]:
+        """Returns all distinct crimes primary types, same as Flask endpoint
+
+        Returns:
+            An ASGI response tuple, or None if primary types are not cached
+        """
+        crimes_primary_types = await self.get_cached_crimes_primary_types()
+        if crimes_primary_types is None:
+            return
+        return self.json_response(PreparedResponse.dumps(
+            {'code': HTTPStatus.OK.value, 'data': list(crimes_primary_types), 'message': HTTPStatus.OK.description}
+        ))
+
+    async def get_crimes_by_primary_type(
+            self, query_params: Dict[str, str], headers: Headers
+    ) -> Optional[ASGIResponse]:
+        """Returns prepared response of all crimes of primary type, same as Flask endpoint.
+        Requests with filters, pagination, or Arrow format are passed to Flask app.
+
+        Returns:
+            An ASGI response tuple, or None if request is not answered here
+        """
+
+        primary_type = query_params.get('primary_type')
+        if primary_type is None or len(query_params) != 1:
+            return
+        accept = parse_accept_header(headers.get('Accept'), MIMEAccept)
+        if accept.best_match(['application/json', APIResponse.arrow_mimetype]) == APIResponse.arrow_mimetype:
+            return
+
+        generation = await self.get_crimes_generation()
+        if generation is None:
+            return
+
+        async def load_prepared_response() -> Optional[PreparedResponse]:
+            fresh_prepared_response = await AsyncCacheManager.get_fresh_crimes_prepared_response(
+                primary_type, generation
+            )
+            # missing and stale responses are passed to Flask app, which counts their lookups
+            if fresh_prepared_response is not None:
+                await self.record_crimes_cache_lookup(primary_type, is_hit=True)
+            return fresh_prepared_response
+
+        prepared_response = await CrimesLocalCache.get_or_load_async(('response', primary_type), load_prepared_response)
+        if prepared_response is None:
+            return
+        http_status, content_encoding, body = APIResponse.negotiate_prepared_response(
+            prepared_response, parse_accept_header(headers.get('Accept-Encoding'), Accept),
+            parse_etags(headers.get('If-None-Match'))
+        )
+        response_headers = [
+            (b'etag', quote_etag(prepared_response.etag).encode()), (b'vary', b'Accept, Accept-Encoding')
+        ]
+        if content_encoding is not None:
+            response_headers.append((b'content-encoding', content_encoding.encode()))
+        if http_status == HTTPStatus.NOT_MODIFIED:
+            return http_status, response_headers, body
+        return self.json_response(body, response_headers)
+
+    async def get_crimes_aggregate(self, query_params: Dict[str, str], headers: Headers) -> Optional[ASGIResponse]:
+        """Returns number of crimes of primary type in each grid cell, same as Flask endpoint.
+        Requests with date filters or invalid params are passed to Flask app.
+
+        Returns:
+            An ASGI response tuple, or None if request is not answered here
+        """
+
+        primary_type = query_params.get('primary_type')
+        if primary_type is None or not set(query_params).issubset({'primary_type', 'resolution'}):
+            return
+        resolution = query_params.get('resolution', str(crimes_aggregate_resolutions[0]))
+        if not resolution.isdigit() or int(resolution) not in crimes_aggregate_resolutions:
+            return
+        resolution = int(resolution)
+
+        generation = await self.get_crimes_generation()
+        if generation is None:
+            return
+        crimes_aggregate = await CrimesLocalCache.get_or_load_async(
+            ('aggregate', primary_type, resolution),
+            lambda: AsyncCacheManager.get_fresh_crimes_aggregate(primary_type, resolution, generation)
+        )
+        if crimes_aggregate is None:
+            return
+        return self.json_response(PreparedResponse.dumps({
+            'code': HTTPStatus.OK.value, 'data': crimes_aggregate, 'message': HTTPStatus.OK.description,
+            'resolution': resolution
+        }))
+
+
+# run with an ASGI server, e.g. "uvicorn api.asgi:application --host 0.0.0.0 --port 8000"
+application = CrimesASGIApplication(flask_application, wsgi_threads=asgi_wsgi_threads)
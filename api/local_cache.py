@@ -0,0 +1,287 @@
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional, Union
+
+from dotenv import load_dotenv
+
+from celery_app.cache_manager import CacheManager, RedisUtils
+from utilities.log_utils import LogUtils
+from utilities.metrics_utils import MetricsUtils
+
+# loading environment variables which are defined in .env file
+load_dotenv()
+# maximum number of items that each API worker keeps in its local cache
+local_cache_max_items = int(os.environ.get('LOCAL_CACHE_MAX_ITEMS', 64))
+# local cache items are expired after this many seconds, even if no invalidation message is received
+local_cache_ttl_seconds = float(os.environ.get('LOCAL_CACHE_TTL_SECONDS', 300))
+
+logger = LogUtils.get_logger(logger_name='local_cache', level=logging.ERROR)
+
+
+class LocalCache:
+    """A bounded, thread-safe in-process cache with LRU eviction and expiry time for items"""
+
+    def __init__(self, max_items: int, ttl_seconds: float):
+        """Initialize an empty cache
+
+        Args:
+            max_items (int): maximum number of items, the least recently used item is evicted when cache is full
+            ttl_seconds (float): seconds that each item is valid after it is set, 0 disables the cache
+        """
+        self.max_items = max_items
+        self.ttl_seconds = ttl_seconds
+        self.__items = OrderedDict()
+        self.__lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """Returns cached value of given key, or None if it is not cached or expired
+
+        Args:
+            key: A hashable key
+
+        Returns:
+            Cached value or None
+        """
+
+        with self.__lock:
+            item = self.__items.get(key)
+            if item is None:
+                return
+            value, expire_time = item
+            if expire_time < time.monotonic():
+                del self.__items[key]
+                return
+            self.__items.move_to_end(key)
+            return value
+
+    def set(self, key: Hashable, value: Any):
+        """Caches a value with given key
+
+        Args:
+            key: A hashable key
+            value: Any value except None
+        """
+
+        if not self.ttl_seconds or not self.max_items:
+            return
+        with self.__lock:
+            self.__items[key] = (value, time.monotonic() + self.ttl_seconds)
+            self.__items.move_to_end(key)
+            while len(self.__items) > self.max_items:
+                self.__items.popitem(last=False)
+
+    def clear(self):
+        """Removes all cached items"""
+        with self.__lock:
+            self.__items.clear()
+
+    def remove_if(self, predicate: Callable[[Hashable], bool]):
+        """Removes cached items that given predicate returns True for their keys
+
+        Args:
+            predicate: A function that gets a key and returns whether its item is removed or not
+        """
+
+        with self.__lock:
+            for key in [key for key in self.__items if predicate(key)]:
+                del self.__items[key]
+
+
+class CrimesLocalCache:
+    """Local cache of each API worker for crimes data, a background thread listens to dataset version updates
+    that are published by celery refresh tasks. A new generation invalidates all items, and a refresh of some
+    primary types only invalidates items of those primary types, which are keyed like ("crimes", "THEFT")"""
+
+    __cache = LocalCache(max_items=local_cache_max_items, ttl_seconds=local_cache_ttl_seconds)
+    __dataset_version = 0
+    # number of invalidations that this worker has received, a value that is loaded while an invalidation is
+    # received may be old, so it is not cached
+    __invalidations_count = 0
+    __invalidation_lock = threading.Lock()
+    # gunicorn forks worker processes, so we remember which process has started the listener thread
+    __listener_pid = None
+    __listener_lock = threading.Lock()
+
+    @classmethod
+    def __listen_to_dataset_versions(cls):
+        """Subscribes to crimes invalidation channel and updates dataset version, runs forever in a thread"""
+
+        while True:
+            try:
+                pubsub = RedisUtils.get_redis_client().pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(CacheManager.crimes_invalidation_channel)
+                # we may have missed some messages before subscribing, so we read the version again
+                cls.__set_dataset_version(CacheManager.get_crimes_dataset_version())
+                for message in pubsub.listen():
+                    cls.invalidate(message['data'])
+            except Exception:
+                logger.exception('Crimes invalidation listener is disconnected, reconnecting...')
+                time.sleep(1)
+
+    @classmethod
+    def invalidate(cls, message: Union[bytes, str]):
+        """Drop local items that are invalidated by a message of crimes invalidation channel
+
+        Args:
+            message: A dataset version, or a JSON of dataset version and primary types that are refreshed
+        """
+
+        # a refresh of some primary types publishes them with the version, a new generation doesn't
+        invalidation = json.loads(message)
+        if isinstance(invalidation, dict):
+            cls.__set_dataset_version(invalidation['dataset_version'], invalidation['primary_types'])
+        else:
+            cls.__set_dataset_version(int(invalidation))
+
+    @classmethod
+    def __set_dataset_version(cls, dataset_version: int, primary_types: Optional[List[str]] = None):
+        """Set current dataset version and drop items of refreshed primary types, or all items if primary types
+        are not given, e.g. a new generation is published or some invalidations may be missed"""
+
+        with cls.__invalidation_lock:
+            if dataset_version == cls.__dataset_version:
+                return
+            # versions are increased one by one, so a skipped version means a missed invalidation
+            is_missed = dataset_version != cls.__dataset_version + 1
+            cls.__dataset_version = dataset_version
+            cls.__invalidations_count += 1
+            if primary_types is None or is_missed:
+                cls.__cache.clear()
+            else:
+                primary_types = set(primary_types)
+                cls.__cache.remove_if(lambda key: isinstance(key, tuple) and key[1] in primary_types)
+
+    @classmethod
+    def __set(cls, key: Hashable, value: Any, invalidations_count: int):
+        """Cache a loaded value, if no invalidation is received since it started loading
+
+        Args:
+            key: A hashable key
+            value: A loaded value
+            invalidations_count (int): number of received invalidations when value started loading
+        """
+        with cls.__invalidation_lock:
+            if invalidations_count == cls.__invalidations_count:
+                cls.__cache.set(key, value)
+
+    @classmethod
+    def __start_listener(cls):
+        """Start listener thread once in each process"""
+
+        if cls.__listener_pid == os.getpid():
+            return
+        with cls.__listener_lock:
+            if cls.__listener_pid == os.getpid():
+                return
+            # items of parent process may be stale, because parent process doesn't listen to updates anymore
+            with cls.__invalidation_lock:
+                cls.__cache.clear()
+                cls.__invalidations_count += 1
+                cls.__dataset_version = CacheManager.get_crimes_dataset_version()
+            threading.Thread(target=cls.__listen_to_dataset_versions, name='crimes_invalidation', daemon=True).start()
+            cls.__listener_pid = os.getpid()
+
+    @staticmethod
+    def __record_lookup(key: Hashable, is_hit: bool):
+        """Count a hit or miss of local cache, keys are counted by their kind, e.g. "crimes" of ("crimes", "THEFT")"""
+        MetricsUtils.local_cache_lookups.labels(
+            cache=key[0] if isinstance(key, tuple) else key, result='hit' if is_hit else 'miss'
+        ).inc()
+
+    @classmethod
+    def get_dataset_version(cls) -> int:
+        """Returns current cached crimes dataset version, it is kept up to date by the listener thread,
+        so it doesn't need a redis round trip
+
+        Returns:
+            An integer that shows version of cached crimes data
+        """
+
+        if not local_cache_ttl_seconds:
+            return CacheManager.get_crimes_dataset_version()
+        cls.__start_listener()
+        return cls.__dataset_version
+
+    @classmethod
+    def get_or_load(cls, key: Hashable, loader: Callable[[], Optional[Any]]) -> Optional[Any]:
+        """Returns locally cached value of key,
+        if it is not cached, loads it by given loader and caches it
+
+        Args:
+            key: A hashable key, e.g. a primary type
+            loader: A function that loads value, e.g. from redis, a None value is not cached
+
+        Returns:
+            Cached or loaded value
+        """
+
+        if not local_cache_ttl_seconds:
+            return loader()
+        cls.__start_listener()
+        invalidations_count = cls.__invalidations_count
+        value = cls.__cache.get(key)
+        cls.__record_lookup(key, is_hit=value is not None)
+        if value is None:
+            value = loader()
+            if value is not None:
+                cls.__set(key, value, invalidations_count)
+        return value
+
+    @classmethod
+    def get_many_or_load(
+            cls, keys: List[Hashable], loader: Callable[[List[Hashable]], Dict[Hashable, Optional[Any]]]
+    ) -> Dict[Hashable, Optional[Any]]:
+        """Same as `get_or_load` for several keys, values that are not cached locally are loaded
+        by one call of given loader, e.g. one redis MGET
+
+        Args:
+            keys: A list of hashable keys, e.g. primary types
+            loader: A function that loads values of a list of keys and returns a dict of them, None values
+                are not cached
+
+        Returns:
+            A dict that maps each key to its cached or loaded value
+        """
+
+        if not local_cache_ttl_seconds:
+            return loader(keys)
+        cls.__start_listener()
+        invalidations_count = cls.__invalidations_count
+        values = {key: cls.__cache.get(key) for key in keys}
+        missing_keys = [key for key, value in values.items() if value is None]
+        for key, value in values.items():
+            cls.__record_lookup(key, is_hit=value is not None)
+        if missing_keys:
+            for key, value in loader(missing_keys).items():
+                values[key] = value
+                if value is not None:
+                    cls.__set(key, value, invalidations_count)
+        return values
+
+    @classmethod
+    async def get_or_load_async(cls, key: Hashable, loader: Callable[[], Awaitable[Optional[Any]]]) -> Optional[Any]:
+        """Same as `get_or_load`, but value is loaded by a coroutine, so event loop is not blocked while loading
+
+        Args:
+            key: A hashable key, e.g. a primary type
+            loader: A coroutine function that loads value, e.g. from redis, a None value is not cached
+
+        Returns:
+            Cached or loaded value
+        """
+
+        if not local_cache_ttl_seconds:
+            return await loader()
+        cls.__start_listener()
+        invalidations_count = cls.__invalidations_count
+        value = cls.__cache.get(key)
+        cls.__record_lookup(key, is_hit=value is not None)
+        if value is None:
+            value = await loader()
+            if value is not None:
+                cls.__set(key, value, invalidations_count)
+        return value
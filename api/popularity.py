@@ -0,0 +1,57 @@
+import os
+import threading
+import time
+from collections import Counter
+
+from dotenv import load_dotenv
+
+from celery_app.cache_manager import CacheManager
+
+# loading environment variables which are defined in .env file
+load_dotenv()
+# requests counters of each API worker are saved to redis at most once in this many seconds
+crimes_popularity_flush_seconds = float(os.environ.get('CRIMES_POPULARITY_FLUSH_SECONDS', 10))
+
+
+class CrimesPopularity:
+    """Counts requests and cache misses of each primary type in this worker. Counters are saved to redis
+    in a background thread at most once in `CRIMES_POPULARITY_FLUSH_SECONDS`, so requests never wait for them.
+    Refresh tasks use these counters to cache the most requested primary types first and keep them longer."""
+
+    __requests = Counter()
+    __misses = Counter()
+    __lock = threading.Lock()
+    __flushed_at = time.monotonic()
+
+    @classmethod
+    def record_request(cls, primary_type: str):
+        """Counts a request of primary type
+
+        Args:
+            primary_type (str): A string that indicates primary type
+        """
+        cls.__record(primary_type, is_miss=False)
+
+    @classmethod
+    def record_miss(cls, primary_type: str):
+        """Counts a cache miss of primary type, i.e. its crimes are fetched from crimes data backend
+
+        Args:
+            primary_type (str): A string that indicates primary type
+        """
+        cls.__record(primary_type, is_miss=True)
+
+    @classmethod
+    def __record(cls, primary_type: str, is_miss: bool):
+        """Counts a request or a cache miss, and saves counters if they are not saved recently"""
+
+        with cls.__lock:
+            (cls.__misses if is_miss else cls.__requests)[primary_type] += 1
+            if time.monotonic() - cls.__flushed_at < crimes_popularity_flush_seconds:
+                return
+            requests, misses = cls.__requests, cls.__misses
+            cls.__requests, cls.__misses = Counter(), Counter()
+            cls.__flushed_at = time.monotonic()
+        threading.Thread(
+            target=CacheManager.record_crimes_requests, args=(requests, misses), name='crimes_popularity', daemon=True
+        ).start()
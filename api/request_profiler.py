@@ -0,0 +1,135 @@
+import cProfile
+import hmac
+import logging
+import os
+import random
+import threading
+import time
+from typing import Optional
+
+from dotenv import load_dotenv
+from flask import Flask, Response, g, request
+
+from utilities.log_utils import LogUtils
+from utilities.profiling_utils import ProfilingUtils
+
+# loading environment variables which are defined in .env file
+load_dotenv()
+# API responses have `Server-Timing` header of redis, decoding, serializing, and crimes data backend durations
+# when it is 1, other profiling settings work only when it is enabled
+request_profiling_enabled = os.environ.get('REQUEST_PROFILING_ENABLED') == '1'
+# fraction of API requests that are profiled by cProfile, e.g. 0.01 profiles 1% of requests
+request_profile_sample_rate = float(os.environ.get('REQUEST_PROFILE_SAMPLE_RATE', 0))
+# requests with `X-Request-Profile` header of this value are profiled, empty value disables profiling on demand
+request_profile_token = os.environ.get('REQUEST_PROFILE_TOKEN', '')
+# directory that profiles of requests are written to
+request_profile_dir = os.environ.get('REQUEST_PROFILE_DIR', '/tmp/request_profiles')
+
+logger = LogUtils.get_logger(logger_name='request_profiler', level=logging.ERROR)
+
+
+class RequestProfiler:
+    """A Flask middleware that records per-stage timings of API requests and profiles sampled requests.
+    Its hooks are registered only when `REQUEST_PROFILING_ENABLED` is 1, so it costs nothing when it is disabled"""
+
+    profile_header = 'X-Request-Profile'
+    # one request of each worker process is profiled at a time, so profiling doesn't slow down all of its threads
+    __profile_lock = threading.Lock()
+
+    @classmethod
+    def init_app(cls, application: Flask):
+        """Register hooks of profiler in the given Flask app if request profiling is enabled
+
+        Args:
+            application: A Flask app
+        """
+
+        if not request_profiling_enabled:
+            return
+        application.before_request(cls.__start_request)
+        application.after_request(cls.__finish_request)
+        application.teardown_request(cls.__teardown_request)
+
+    @staticmethod
+    def __should_profile() -> bool:
+        """Returns True if the current request is sampled or its profile is requested with the profile token"""
+
+        if request_profile_token:
+            token = request.headers.get(RequestProfiler.profile_header)
+            if token and hmac.compare_digest(token, request_profile_token):
+                return True
+        return random.random() < request_profile_sample_rate
+
+    @classmethod
+    def __start_request(cls):
+        """Start recording stage timings of API requests, and start profiler if the request is profiled"""
+
+        if not request.path.startswith('/api/'):
+            return
+        ProfilingUtils.start_request_timings()
+        g.request_profiling_start_time = time.perf_counter()
+        if cls.__should_profile() and cls.__profile_lock.acquire(blocking=False):
+            g.request_profiler = cProfile.Profile()
+            g.request_profiler.enable()
+
+    @classmethod
+    def __stop_profiler(cls) -> Optional[cProfile.Profile]:
+        """Stop profiler of the current request if it is profiled
+
+        Returns:
+            A stopped profiler, or None if the current request is not profiled
+        """
+
+        profiler = g.pop('request_profiler', None)
+        if profiler is not None:
+            profiler.disable()
+            cls.__profile_lock.release()
+        return profiler
+
+    @staticmethod
+    def __save_profile(profiler: cProfile.Profile) -> Optional[str]:
+        """Write profile of the current request to `REQUEST_PROFILE_DIR`, it can be read by `python -m pstats`
+        or visualized by tools like snakeviz
+
+        Args:
+            profiler: A stopped profiler of the current request
+
+        Returns:
+            Name of profile file, or None if it can not be written
+        """
+
+        profile_name = f'{time.time_ns()}_{request.endpoint}_{os.getpid()}.prof'
+        try:
+            os.makedirs(request_profile_dir, exist_ok=True)
+            profiler.dump_stats(os.path.join(request_profile_dir, profile_name))
+        except OSError:
+            logger.exception('Can not write profile of request')
+            return None
+        return profile_name
+
+    @classmethod
+    def __finish_request(cls, response: Response) -> Response:
+        """Add `Server-Timing` header to response, and save profile of the request if it is profiled.
+        Bodies of streamed responses are generated after this hook, so they are not measured"""
+
+        if 'request_profiling_start_time' not in g:
+            return response
+        profiler = cls.__stop_profiler()
+        total_seconds = time.perf_counter() - g.pop('request_profiling_start_time')
+        response.headers['Server-Timing'] = ProfilingUtils.format_server_timing(
+            ProfilingUtils.stop_request_timings(), total_seconds
+        )
+        if profiler is not None:
+            profile_name = cls.__save_profile(profiler)
+            if profile_name:
+                response.headers[cls.profile_header] = profile_name
+        return response
+
+    # noinspection PyUnusedLocal
+    @classmethod
+    def __teardown_request(cls, exception: Optional[BaseException] = None):
+        """Stop profiler and timings of requests that have not finished because of an unhandled exception"""
+
+        cls.__stop_profiler()
+        if g.pop('request_profiling_start_time', None) is not None:
+            ProfilingUtils.stop_request_timings()
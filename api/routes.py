@@ -1,19 +1,97 @@
+import datetime
 import logging
+import os
 from http import HTTPStatus
+from typing import Optional
 
+from dotenv import load_dotenv
 from flask import Blueprint, request
 
 from api.api_response import APIResponse
+from api.popularity import CrimesPopularity
 from api.services import CrimesDataManager
-from big_query.crimes import BigQueryManager
+from big_query.backend import CrimesDataBackend
+from celery_app.crimes_aggregation import crimes_aggregate_resolutions
+from celery_app.crimes_statistics import crimes_statistics_periods
 from utilities.log_utils import LogUtils
 
+# loading environment variables which are defined in .env file
+load_dotenv()
+# maximum number of primary types in one request of batch endpoint
+crimes_batch_max_primary_types = int(os.environ.get('CRIMES_BATCH_MAX_PRIMARY_TYPES', 40))
+
 logger = LogUtils.get_logger(logger_name='flask_api', level=logging.ERROR)
 
 # create a blueprint for crimes endpoints and set url prefix for this routes
 chicago_crimes_blueprint = Blueprint('chicago_crimes_routes', __name__, url_prefix='/api/crimes')
 
 
+@chicago_crimes_blueprint.before_request
+def record_primary_types_requests():
+    """Counts requests of primary types that are sent in query params, so the most requested primary types
+    are cached first and kept longer by refresh tasks, unknown primary types are not counted"""
+    primary_types = set(request.args.getlist('primary_type', str))
+    if primary_types:
+        for primary_type in primary_types.intersection(CrimesDataManager.get_cached_crimes_primary_types()):
+            CrimesPopularity.record_request(primary_type)
+
+
+def get_date_query_param(name: str) -> Optional[datetime.date]:
+    """Parse a "%Y-%m-%d" date from query params
+
+    Args:
+        name (str): name of the query param
+
+    Returns:
+        A date object, or None if query param is not sent
+
+    Raises:
+        ValueError: if query param is not a valid date
+    """
+    value = request.args.get(name, None, str)
+    return None if value is None else datetime.datetime.strptime(value, '%Y-%m-%d').date()
+
+
+def get_positive_int_query_param(name: str) -> Optional[int]:
+    """Parse a positive integer from query params
+
+    Args:
+        name (str): name of the query param
+
+    Returns:
+        An integer, or None if query param is not sent
+
+    Raises:
+        ValueError: if query param is not a positive integer
+    """
+    value = request.args.get(name, None, str)
+    if value is None:
+        return
+    if not value.isdigit() or int(value) <= 0:
+        raise ValueError(f'{name} must be a positive integer')
+    return int(value)
+
+
+def get_float_query_param(name: str, min_value: float, max_value: float) -> float:
+    """Parse a required float number from query params
+
+    Args:
+        name (str): name of the query param
+        min_value (float), max_value (float): valid range of the number
+
+    Returns:
+        A float number
+
+    Raises:
+        TypeError: if query param is not sent
+        ValueError: if query param is not a valid number
+    """
+    value = float(request.args.get(name, None, str))
+    if not min_value <= value <= max_value:
+        raise ValueError(f'{name} must be between {min_value} and {max_value}')
+    return value
+
+
 # noinspection PyTypeChecker
 @chicago_crimes_blueprint.route('/primary_types', methods=['GET'])
 def get_chicago_crimes_primary_types() -> APIResponse:
@@ -32,11 +110,11 @@ def get_chicago_crimes_primary_types() -> APIResponse:
     try:
         crimes_primary_types = CrimesDataManager.get_crimes_primary_type()
         return APIResponse.ok_response(data=crimes_primary_types)
-    except BigQueryManager.QueryTimeoutError:
-        logger.error('BigQuery timeout error')
+    except CrimesDataBackend.QueryTimeoutError:
+        logger.error('Crimes data backend timeout error')
         return APIResponse.error_response(HTTPStatus.REQUEST_TIMEOUT)
-    except BigQueryManager.GoogleCloudQueryError:
-        logger.error('BigQuery does not provide data, maybe credential is missing!')
+    except CrimesDataBackend.QueryError:
+        logger.error('Crimes data backend does not provide data, maybe credential is missing!')
         return APIResponse.error_response(HTTPStatus.BAD_GATEWAY)
     except Exception:
         # we should capture this kind of exceptions somewhere like Slack ot Telegram to get notify
@@ -44,6 +122,29 @@ def get_chicago_crimes_primary_types() -> APIResponse:
         return APIResponse.error_response(HTTPStatus.INTERNAL_SERVER_ERROR)
 
 
+# noinspection PyTypeChecker
+@chicago_crimes_blueprint.route('/version', methods=['GET'])
+def get_chicago_crimes_dataset_version() -> APIResponse:
+    """Returns version of cached crimes data, it is increased after each refresh,
+    so clients can keep crimes data until it is changed
+
+    Responses part can be used by auto doc generators like `swagger`
+
+    Returns:
+        An APIResponse which contains JSON data and proper HTTP status
+    Responses:
+        * 200: version of cached crimes data.
+        * 500: can not get version.
+        * 503: service currently is unavailable.
+    """
+    try:
+        return APIResponse.ok_response(data=CrimesDataManager.get_crimes_dataset_version())
+    except Exception:
+        # we should capture this kind of exceptions somewhere like Slack ot Telegram to get notify
+        logger.exception('Error while getting crimes dataset version')
+        return APIResponse.error_response(HTTPStatus.INTERNAL_SERVER_ERROR)
+
+
 # noinspection PyTypeChecker
 @chicago_crimes_blueprint.route('/', methods=['GET'])
 def get_chicago_crimes_by_primary_type():
@@ -51,12 +152,26 @@ def get_chicago_crimes_by_primary_type():
 
     Responses part can be used by auto doc generators like `swagger`
 
+    Query params:
+        * primary_type: crimes primary type.
+        * start_date, end_date (optional): only crimes between these dates are returned, e.g. 2023-01-05.
+        * limit (optional): maximum number of crimes in response, "next_cursor" of response is used to get
+          the next page, it is null for the last page.
+        * cursor (optional): "next_cursor" of previous page.
+
+    Headers:
+        * Accept (optional): crimes are sent as an Arrow IPC stream if client prefers
+          "application/vnd.apache.arrow.stream", "next_cursor" is sent in "X-Next-Cursor" header.
+
     Returns:
         An APIResponse which contains JSON data and proper HTTP status
 
     Responses:
         * 200: A list of latitude, longitude, and the date of crime.
+        * 400: primary type is not sent or query params are not valid.
         * 408: request timed out from data provider.
+        * 410: crimes of primary type are refreshed since cursor was created, pages must be requested from the
+          first page.
         * 500: can not connect to data provider.
         * 503: service currently is unavailable.
     """
@@ -66,15 +181,309 @@ def get_chicago_crimes_by_primary_type():
         # from Streamlit dashboard it's better to notify the error, maybe Streamlit has gone wrong!
         if primary_type is None:
             return APIResponse.error_response(HTTPStatus.BAD_REQUEST)
-        crimes_by_primary_type = CrimesDataManager.get_crimes_by_primary_type(primary_type)
-        return APIResponse.ok_response(data=crimes_by_primary_type)
-    except BigQueryManager.QueryTimeoutError:
-        logger.error('BigQuery timeout error')
+        try:
+            start_date, end_date = get_date_query_param('start_date'), get_date_query_param('end_date')
+            limit, cursor = get_positive_int_query_param('limit'), request.args.get('cursor', None, str)
+            if cursor is not None:
+                CrimesDataManager.parse_crimes_cursor(cursor)
+        except ValueError:
+            return APIResponse.error_response(HTTPStatus.BAD_REQUEST)
+
+        if APIResponse.accepts_arrow():
+            crimes_columns, next_cursor = CrimesDataManager.get_crimes_columns_page_by_primary_type(
+                primary_type, start_date, end_date, limit, cursor
+            )
+            return APIResponse.arrow_response(crimes_columns, next_cursor)
+        if start_date is None and end_date is None and limit is None and cursor is None:
+            # response of all crimes is serialized once after each refresh, so we just send its bytes
+            prepared_response = CrimesDataManager.get_crimes_prepared_response(primary_type)
+            return APIResponse.prepared_response(prepared_response)
+
+        crimes_by_primary_type, next_cursor = CrimesDataManager.get_crimes_page_by_primary_type(
+            primary_type, start_date, end_date, limit, cursor
+        )
+        return APIResponse.ok_response(
+            data=crimes_by_primary_type, extra=None if limit is None else {'next_cursor': next_cursor}
+        )
+    except CrimesDataManager.CursorExpiredError:
+        return APIResponse.error_response(HTTPStatus.GONE)
+    except CrimesDataBackend.QueryTimeoutError:
+        logger.error('Crimes data backend timeout error')
         return APIResponse.error_response(HTTPStatus.REQUEST_TIMEOUT)
-    except BigQueryManager.GoogleCloudQueryError:
-        logger.error('BigQuery does not provide data, maybe credential is missing!')
+    except CrimesDataBackend.QueryError:
+        logger.error('Crimes data backend does not provide data, maybe credential is missing!')
         return APIResponse.error_response(HTTPStatus.BAD_GATEWAY)
     except Exception:
         # we should capture this kind of exceptions somewhere like Slack ot Telegram to get notify
         logger.exception(f'Error while getting crimes of primary type')
         return APIResponse.error_response(HTTPStatus.INTERNAL_SERVER_ERROR)
+
+
+# noinspection PyTypeChecker
+@chicago_crimes_blueprint.route('/batch', methods=['GET'])
+def get_chicago_crimes_by_primary_types():
+    """Returns crimes of several primary types in one response, so clients don't send one request for each
+    primary type, cached crimes are read with one redis round trip and missing ones are fetched with one query
+
+    Responses part can be used by auto doc generators like `swagger`
+
+    Query params:
+        * primary_type: crimes primary type, it is repeated for each primary type,
+          e.g. "?primary_type=THEFT&primary_type=BATTERY", at most `CRIMES_BATCH_MAX_PRIMARY_TYPES` of them.
+
+    Returns:
+        An APIResponse which contains JSON data and proper HTTP status
+
+    Responses:
+        * 200: A dict that maps each primary type to a list of latitude, longitude, and the date of crime.
+        * 400: primary type is not sent or too many primary types are sent.
+        * 408: request timed out from data provider.
+        * 500: can not connect to data provider.
+        * 503: service currently is unavailable.
+    """
+    # duplicate primary types are removed, but their order is kept
+    primary_types = list(dict.fromkeys(request.args.getlist('primary_type', str)))
+    try:
+        if not primary_types or len(primary_types) > crimes_batch_max_primary_types:
+            return APIResponse.error_response(HTTPStatus.BAD_REQUEST)
+
+        crimes_by_primary_types = CrimesDataManager.get_crimes_by_primary_types(primary_types)
+        return APIResponse.ok_response(data=crimes_by_primary_types)
+    except CrimesDataBackend.QueryTimeoutError:
+        logger.error('Crimes data backend timeout error')
+        return APIResponse.error_response(HTTPStatus.REQUEST_TIMEOUT)
+    except CrimesDataBackend.QueryError:
+        logger.error('Crimes data backend does not provide data, maybe credential is missing!')
+        return APIResponse.error_response(HTTPStatus.BAD_GATEWAY)
+    except Exception:
+        # we should capture this kind of exceptions somewhere like Slack ot Telegram to get notify
+        logger.exception('Error while getting crimes of primary types')
+        return APIResponse.error_response(HTTPStatus.INTERNAL_SERVER_ERROR)
+
+
+# noinspection PyTypeChecker
+@chicago_crimes_blueprint.route('/stream', methods=['GET'])
+def get_chicago_crimes_stream():
+    """Streams all cached crimes of primary type as newline delimited JSON, number of crimes is limited by
+    `CRIMES_STREAM_ROW_LIMIT` instead of `CRIMES_ROW_LIMIT`, so it can be the full history of primary type
+
+    Responses part can be used by auto doc generators like `swagger`
+
+    Query params:
+        * primary_type: crimes primary type.
+
+    Returns:
+        A streamed response of NDJSON lines, or an APIResponse which contains JSON error and proper HTTP status
+
+    Responses:
+        * 200: latitude, longitude, and the date of each crime in a line.
+        * 400: primary type is not sent.
+        * 500: can not connect to data provider.
+        * 503: crimes are not cached yet, they are being cached and request can be retried later.
+
+        If cached crimes can not be read after the response is started, e.g. redis is not ready, the response is
+        closed before its end, so clients see an incomplete chunked response instead of a truncated list of crimes.
+    """
+    primary_type = request.args.get('primary_type', None, str)
+    try:
+        if primary_type is None:
+            return APIResponse.error_response(HTTPStatus.BAD_REQUEST)
+        crimes_lines = CrimesDataManager.iter_crimes_ndjson_by_primary_type(primary_type)
+        if crimes_lines is None:
+            return APIResponse.error_response(HTTPStatus.SERVICE_UNAVAILABLE)
+        return APIResponse.ndjson_response(crimes_lines)
+    except Exception:
+        # we should capture this kind of exceptions somewhere like Slack ot Telegram to get notify
+        logger.exception('Error while streaming crimes of primary type')
+        return APIResponse.error_response(HTTPStatus.INTERNAL_SERVER_ERROR)
+
+
+# noinspection PyTypeChecker
+@chicago_crimes_blueprint.route('/aggregate', methods=['GET'])
+def get_chicago_crimes_aggregate():
+    """Returns number of crimes of primary type in each grid cell, so maps can draw cells instead of all crimes
+
+    Responses part can be used by auto doc generators like `swagger`
+
+    Query params:
+        * primary_type: crimes primary type.
+        * resolution (optional): size of grid cells in meters, it must be one of `CRIMES_AGGREGATE_RESOLUTIONS`,
+          default is the first one.
+        * start_date, end_date (optional): only crimes between these dates are counted, e.g. 2023-01-05.
+
+    Returns:
+        An APIResponse which contains JSON data and proper HTTP status
+
+    Responses:
+        * 200: A list of cell center latitude, longitude, and number of crimes in the cell.
+        * 400: primary type is not sent or query params are not valid.
+        * 408: request timed out from data provider.
+        * 500: can not connect to data provider.
+        * 503: service currently is unavailable.
+    """
+    primary_type = request.args.get('primary_type', None, str)
+    try:
+        if primary_type is None:
+            return APIResponse.error_response(HTTPStatus.BAD_REQUEST)
+        try:
+            start_date, end_date = get_date_query_param('start_date'), get_date_query_param('end_date')
+            resolution = get_positive_int_query_param('resolution') or crimes_aggregate_resolutions[0]
+        except ValueError:
+            return APIResponse.error_response(HTTPStatus.BAD_REQUEST)
+        if resolution not in crimes_aggregate_resolutions:
+            return APIResponse.error_response(HTTPStatus.BAD_REQUEST)
+
+        crimes_aggregate = CrimesDataManager.get_crimes_aggregate(primary_type, resolution, start_date, end_date)
+        return APIResponse.ok_response(data=crimes_aggregate, extra={'resolution': resolution})
+    except CrimesDataBackend.QueryTimeoutError:
+        logger.error('Crimes data backend timeout error')
+        return APIResponse.error_response(HTTPStatus.REQUEST_TIMEOUT)
+    except CrimesDataBackend.QueryError:
+        logger.error('Crimes data backend does not provide data, maybe credential is missing!')
+        return APIResponse.error_response(HTTPStatus.BAD_GATEWAY)
+    except Exception:
+        # we should capture this kind of exceptions somewhere like Slack ot Telegram to get notify
+        logger.exception('Error while getting aggregated crimes of primary type')
+        return APIResponse.error_response(HTTPStatus.INTERNAL_SERVER_ERROR)
+
+
+# noinspection PyTypeChecker
+@chicago_crimes_blueprint.route('/stats', methods=['GET'])
+def get_chicago_crimes_statistics():
+    """Returns number of crimes of primary type in each day, week, or month and summary of them,
+    so trend charts don't download all crimes
+
+    Responses part can be used by auto doc generators like `swagger`
+
+    Query params:
+        * primary_type: crimes primary type.
+        * period (optional): "daily", "weekly", or "monthly", default is "weekly", weeks start on Monday.
+        * start_date, end_date (optional): only crimes between these dates are counted, e.g. 2023-01-05.
+
+    Returns:
+        An APIResponse which contains JSON data and proper HTTP status
+
+    Responses:
+        * 200: "counts", a list of period start date and number of crimes in the period, and "summary" of crimes,
+          e.g. total count, first and last date, average and maximum crimes per day, and crimes in each weekday.
+          If cached crimes are limited by `CRIMES_ROW_LIMIT`, crimes before "truncated_before" of summary are
+          not counted, and partial periods before it are not sent.
+        * 400: primary type is not sent or query params are not valid.
+        * 408: request timed out from data provider.
+        * 500: can not connect to data provider.
+        * 503: service currently is unavailable.
+    """
+    primary_type = request.args.get('primary_type', None, str)
+    period = request.args.get('period', 'weekly', str)
+    try:
+        if primary_type is None or period not in crimes_statistics_periods:
+            return APIResponse.error_response(HTTPStatus.BAD_REQUEST)
+        try:
+            start_date, end_date = get_date_query_param('start_date'), get_date_query_param('end_date')
+        except ValueError:
+            return APIResponse.error_response(HTTPStatus.BAD_REQUEST)
+
+        crimes_statistics = CrimesDataManager.get_crimes_statistics(primary_type, period, start_date, end_date)
+        return APIResponse.ok_response(data=crimes_statistics, extra={'period': period})
+    except CrimesDataBackend.QueryTimeoutError:
+        logger.error('Crimes data backend timeout error')
+        return APIResponse.error_response(HTTPStatus.REQUEST_TIMEOUT)
+    except CrimesDataBackend.QueryError:
+        logger.error('Crimes data backend does not provide data, maybe credential is missing!')
+        return APIResponse.error_response(HTTPStatus.BAD_GATEWAY)
+    except Exception:
+        # we should capture this kind of exceptions somewhere like Slack ot Telegram to get notify
+        logger.exception('Error while getting statistics of crimes of primary type')
+        return APIResponse.error_response(HTTPStatus.INTERNAL_SERVER_ERROR)
+
+
+# noinspection PyTypeChecker
+@chicago_crimes_blueprint.route('/nearby', methods=['GET'])
+def get_chicago_crimes_nearby():
+    """Returns crimes of primary type within a distance of a location
+
+    Responses part can be used by auto doc generators like `swagger`
+
+    Query params:
+        * primary_type: crimes primary type.
+        * lat, lon: latitude and longitude of the location.
+        * radius (optional): maximum distance from the location in meters, default is 500.
+
+    Returns:
+        An APIResponse which contains JSON data and proper HTTP status
+
+    Responses:
+        * 200: A list of latitude, longitude, and the date of crime.
+        * 400: primary type is not sent or query params are not valid.
+        * 408: request timed out from data provider.
+        * 500: can not connect to data provider.
+        * 503: service currently is unavailable.
+    """
+    primary_type = request.args.get('primary_type', None, str)
+    try:
+        if primary_type is None:
+            return APIResponse.error_response(HTTPStatus.BAD_REQUEST)
+        try:
+            lat, lon = get_float_query_param('lat', -90, 90), get_float_query_param('lon', -180, 180)
+            radius = get_positive_int_query_param('radius') or 500
+        except (TypeError, ValueError):
+            return APIResponse.error_response(HTTPStatus.BAD_REQUEST)
+
+        crimes_nearby = CrimesDataManager.get_crimes_near_location(primary_type, lat, lon, radius)
+        return APIResponse.ok_response(data=crimes_nearby)
+    except CrimesDataBackend.QueryTimeoutError:
+        logger.error('Crimes data backend timeout error')
+        return APIResponse.error_response(HTTPStatus.REQUEST_TIMEOUT)
+    except CrimesDataBackend.QueryError:
+        logger.error('Crimes data backend does not provide data, maybe credential is missing!')
+        return APIResponse.error_response(HTTPStatus.BAD_GATEWAY)
+    except Exception:
+        # we should capture this kind of exceptions somewhere like Slack ot Telegram to get notify
+        logger.exception('Error while getting crimes near location')
+        return APIResponse.error_response(HTTPStatus.INTERNAL_SERVER_ERROR)
+
+
+# noinspection PyTypeChecker
+@chicago_crimes_blueprint.route('/bbox', methods=['GET'])
+def get_chicago_crimes_in_bbox():
+    """Returns crimes of primary type inside a bounding box, e.g. the visible area of a map
+
+    Responses part can be used by auto doc generators like `swagger`
+
+    Query params:
+        * primary_type: crimes primary type.
+        * min_lat, min_lon: latitude and longitude of south-west corner of the box.
+        * max_lat, max_lon: latitude and longitude of north-east corner of the box.
+
+    Returns:
+        An APIResponse which contains JSON data and proper HTTP status
+
+    Responses:
+        * 200: A list of latitude, longitude, and the date of crime.
+        * 400: primary type is not sent or query params are not valid.
+        * 408: request timed out from data provider.
+        * 500: can not connect to data provider.
+        * 503: service currently is unavailable.
+    """
+    primary_type = request.args.get('primary_type', None, str)
+    try:
+        if primary_type is None:
+            return APIResponse.error_response(HTTPStatus.BAD_REQUEST)
+        try:
+            min_lat, max_lat = get_float_query_param('min_lat', -90, 90), get_float_query_param('max_lat', -90, 90)
+            min_lon, max_lon = get_float_query_param('min_lon', -180, 180), get_float_query_param('max_lon', -180, 180)
+        except (TypeError, ValueError):
+            return APIResponse.error_response(HTTPStatus.BAD_REQUEST)
+
+        crimes_in_bbox = CrimesDataManager.get_crimes_in_bbox(primary_type, min_lat, min_lon, max_lat, max_lon)
+        return APIResponse.ok_response(data=crimes_in_bbox)
+    except CrimesDataBackend.QueryTimeoutError:
+        logger.error('Crimes data backend timeout error')
+        return APIResponse.error_response(HTTPStatus.REQUEST_TIMEOUT)
+    except CrimesDataBackend.QueryError:
+        logger.error('Crimes data backend does not provide data, maybe credential is missing!')
+        return APIResponse.error_response(HTTPStatus.BAD_GATEWAY)
+    except Exception:
+        # we should capture this kind of exceptions somewhere like Slack ot Telegram to get notify
+        logger.exception('Error while getting crimes in bounding box')
+        return APIResponse.error_response(HTTPStatus.INTERNAL_SERVER_ERROR)
@@ -1,36 +1,69 @@
-from typing import Tuple, List, Dict, Union
+import datetime
+import logging
+import os
+from typing import Tuple, List, Dict, Union, Optional, Iterator
 
-from big_query.crimes import BigQueryManager
+from dotenv import load_dotenv
+import redis.lock
+from redis.exceptions import LockError
+
+from api.local_cache import CrimesLocalCache
+from api.popularity import CrimesPopularity
+from big_query.backend import CrimesDataBackend
 from celery_app.cache_manager import CacheManager
+from celery_app.crimes_aggregation import CrimesAggregator
+from celery_app.crimes_codec import CrimesColumns
+from celery_app.crimes_statistics import CrimesStatistics
+from celery_app.prepared_responses import PreparedResponse
+from celery_app.spatial_index import CrimesSpatialIndex
+from celery_app.tasks import celery
+from utilities.log_utils import LogUtils
+from utilities.metrics_utils import MetricsUtils
+from utilities.profiling_utils import ProfilingUtils
+
+# loading environment variables which are defined in .env file
+load_dotenv()
+# while a worker is fetching crimes of a primary type, other requests of that type wait this many seconds for it,
+# the lock is released automatically after this time if its owner worker is dead
+crimes_fetch_lock_timeout = float(os.environ.get('CRIMES_FETCH_LOCK_TIMEOUT_SECONDS', 90))
+
+logger = LogUtils.get_logger(logger_name='crimes_services', level=logging.ERROR)
 
 
 class CrimesDataManager:
-    """A class that fetch Chicago crimes data from Google BigQuery dataset"""
+    """A class that fetch Chicago crimes data from cache or crimes data backend(e.g. Google BigQuery dataset)"""
+
+    class CursorExpiredError(Exception):
+        """An Exception class to raise when a pagination cursor belongs to crimes data that is refreshed since then"""
+
+    class CrimesChunkMissingError(Exception):
+        """An Exception class to raise when a chunk of streamed crimes can not be read, e.g. chunks are expired"""
 
     @staticmethod
     def get_crimes_primary_type() -> Tuple[str]:
         """Get crimes distinct primary types.
         At first, it tries to get data from cache, if cache
-        is empty, it will query data from Google BigQuery dataset
+        is empty, it will query data from crimes data backend
 
         Returns:
             A tuple containing distinct strings of primary types
 
         Raises:
-            BigQueryManager.QueryTimeoutError
-            BigQueryManager.GoogleCloudQueryError
+            CrimesDataBackend.QueryTimeoutError
+            CrimesDataBackend.QueryError
         """
 
-        # getting crimes primary types from cache
-        crimes_primary_types = CacheManager.get_crimes_primary_types()
+        # getting crimes primary types from local cache of this worker or redis
+        crimes_primary_types = CrimesLocalCache.get_or_load('primary_types', CacheManager.get_crimes_primary_types)
         if crimes_primary_types is None:
             # there is no crimes primary types cached, so let's get them from dataset
             try:
-                crimes_primary_types = BigQueryManager().query_crimes_primary_types()
-            except BigQueryManager.QueryTimeoutError:
-                raise BigQueryManager.QueryTimeoutError
-            except BigQueryManager.GoogleCloudQueryError:
-                raise BigQueryManager.GoogleCloudQueryError
+                with ProfilingUtils.time_stage('backend'):
+                    crimes_primary_types = CrimesDataBackend.get_backend().query_crimes_primary_types()
+            except CrimesDataBackend.QueryTimeoutError:
+                raise CrimesDataBackend.QueryTimeoutError
+            except CrimesDataBackend.QueryError:
+                raise CrimesDataBackend.QueryError
             except Exception as ex:
                 raise ex
 
@@ -38,35 +71,648 @@ class CrimesDataManager:
             CacheManager.set_crimes_primary_types(crimes_primary_types)
         return crimes_primary_types
 
+    @staticmethod
+    def get_cached_crimes_primary_types() -> Tuple[str]:
+        """Get crimes primary types from local cache of this worker or redis without querying crimes data backend,
+        they are used to validate primary types that clients send before they are counted
+
+        Returns:
+            A tuple containing distinct strings of primary types, or an empty tuple if they are not cached yet
+        """
+        return CrimesLocalCache.get_or_load('primary_types', CacheManager.get_crimes_primary_types) or ()
+
+    @staticmethod
+    def get_crimes_generation() -> Optional[int]:
+        """Get the generation of cached crimes data that is read by this worker. It is kept in local cache until
+        a new generation is published, so it doesn't need a redis round trip for each request.
+
+        Returns:
+            A generation of cached crimes data, or None if redis is not ready
+        """
+        return CrimesLocalCache.get_or_load('generation', CacheManager.get_crimes_generation)
+
+    @staticmethod
+    def get_crimes_dataset_version() -> int:
+        """Get version of cached crimes data, clients like the dashboard keep crimes data
+        until this version is changed.
+
+        Returns:
+            An integer that shows version of cached crimes data, 0 if data is never refreshed
+        """
+        return CrimesLocalCache.get_dataset_version()
+
     @staticmethod
     def get_crimes_by_primary_type(primary_type: str) -> List[Dict[str, Union[float, str]]]:
         """Get crimes of primary type.
         At first, it tries to get data from cache, if cache
-        is empty, it will query data from Google BigQuery dataset
+        is empty, it will query data from crimes data backend
+
+        Args:
+            primary_type (str): A string that indicates primary type
+
+        Returns:
+             A list of crimes that contains crime location and date in a dict.
+
+        Raises:
+            CrimesDataBackend.QueryTimeoutError
+            CrimesDataBackend.QueryError
+        """
+        return CrimesDataManager.get_crimes_columns_by_primary_type(primary_type).to_records()
+
+    @staticmethod
+    def get_crimes_by_primary_types(primary_types: List[str]) -> Dict[str, List[Dict[str, Union[float, str]]]]:
+        """Get crimes of several primary types, see `get_crimes_columns_by_primary_types`
+
+        Args:
+            primary_types: A list of primary types
+
+        Returns:
+             A dict that maps each primary type to a list of crimes that contains crime location and date in a dict.
+
+        Raises:
+            CrimesDataBackend.QueryTimeoutError
+            CrimesDataBackend.QueryError
+        """
+        crimes_columns = CrimesDataManager.get_crimes_columns_by_primary_types(primary_types)
+        return {primary_type: crimes.to_records() for primary_type, crimes in crimes_columns.items()}
+
+    @staticmethod
+    def get_crimes_prepared_response(primary_type: str) -> PreparedResponse:
+        """Get serialized and compressed API response of all crimes of primary type.
+        Responses are prepared by refresh tasks, if it is not cached, it is prepared from cached crimes.
+
+        Args:
+            primary_type (str): A string that indicates primary type
+
+        Returns:
+             A PreparedResponse object
+
+        Raises:
+            CrimesDataBackend.QueryTimeoutError
+            CrimesDataBackend.QueryError
+        """
+
+        def load_prepared_response() -> PreparedResponse:
+            prepared_response, is_fresh = CacheManager.get_crimes_prepared_response_with_freshness(
+                primary_type, CrimesDataManager.get_crimes_generation()
+            )
+            if prepared_response is None:
+                # cache lookup and refresh of crimes are handled by crimes columns
+                crimes_columns = CrimesDataManager.get_crimes_columns_by_primary_type(primary_type)
+                return PreparedResponse.build(crimes_columns.to_records())
+            CrimesDataManager.__record_crimes_cache_lookup(primary_type, is_hit=True)
+            if not is_fresh:
+                CrimesDataManager.__request_crimes_refresh(primary_type)
+            return prepared_response
+
+        return CrimesLocalCache.get_or_load(('response', primary_type), load_prepared_response)
+
+    @staticmethod
+    def get_crimes_page_by_primary_type(
+            primary_type: str,
+            start_date: Optional[datetime.date] = None,
+            end_date: Optional[datetime.date] = None,
+            limit: Optional[int] = None,
+            cursor: Optional[str] = None
+    ) -> Tuple[List[Dict[str, Union[float, str]]], Optional[str]]:
+        """Get a page of crimes of primary type that happened between two dates as a list of dicts,
+        see `get_crimes_columns_page_by_primary_type`
+
+        Returns:
+             A tuple of crimes list and a cursor for the next page, cursor is None if there is no next page.
+
+        Raises:
+            CrimesDataBackend.QueryTimeoutError
+            CrimesDataBackend.QueryError
+            CrimesDataManager.CursorExpiredError
+        """
+        crimes_columns, next_cursor = CrimesDataManager.get_crimes_columns_page_by_primary_type(
+            primary_type, start_date, end_date, limit, cursor
+        )
+        return crimes_columns.to_records(), next_cursor
+
+    @staticmethod
+    def get_crimes_columns_page_by_primary_type(
+            primary_type: str,
+            start_date: Optional[datetime.date] = None,
+            end_date: Optional[datetime.date] = None,
+            limit: Optional[int] = None,
+            cursor: Optional[str] = None
+    ) -> Tuple[CrimesColumns, Optional[str]]:
+        """Get a page of crimes of primary type that happened between two dates.
+        Crimes are found by binary search over cached crimes dates, and the page is a view of cached columns.
+
+        Args:
+            primary_type (str): A string that indicates primary type
+            start_date: first date of crimes, None means no start limit
+            end_date: last date of crimes, None means no end limit
+            limit (int): maximum number of crimes in the page, None means all crimes between dates
+            cursor (str): the cursor that is returned with previous page, None means the first page
+
+        Returns:
+             A tuple of crimes columns and a cursor for the next page, cursor is None if there is no next page.
+
+        Raises:
+            ValueError: if cursor is not valid
+            CrimesDataBackend.QueryTimeoutError
+            CrimesDataBackend.QueryError
+            CrimesDataManager.CursorExpiredError
+        """
+
+        crimes_columns = CrimesDataManager.get_crimes_columns_by_primary_type(primary_type)
+        start_index, end_index = crimes_columns.date_range_indexes(start_date, end_date)
+        if cursor is not None:
+            cursor_fingerprint, cursor_index = CrimesDataManager.parse_crimes_cursor(cursor)
+            # indexes of refreshed crimes don't point to the same crimes, so pages would skip or repeat crimes,
+            # refreshes of other primary types don't change these crimes, so their cursors are still valid
+            if cursor_fingerprint != crimes_columns.fingerprint:
+                raise CrimesDataManager.CursorExpiredError
+            start_index = max(start_index, cursor_index)
+        page_end_index = end_index if limit is None else min(end_index, start_index + limit)
+        next_cursor = f'{crimes_columns.fingerprint}.{page_end_index}' if page_end_index < end_index else None
+        return crimes_columns[start_index:page_end_index], next_cursor
+
+    @staticmethod
+    def parse_crimes_cursor(cursor: str) -> Tuple[int, int]:
+        """Parse a pagination cursor, it is "<fingerprint of crimes>.<index of the first crime of next page>",
+        so it is valid only for the crimes of primary type that it is created for
+
+        Args:
+            cursor (str): the cursor that is returned with previous page
+
+        Returns:
+            A tuple of fingerprint of crimes and index of crime
+
+        Raises:
+            ValueError: if cursor is not valid
+        """
+        fingerprint, _, index = cursor.partition('.')
+        if not fingerprint.isdigit() or not index.isdigit():
+            raise ValueError('cursor is not valid')
+        return int(fingerprint), int(index)
+
+    @staticmethod
+    def get_crimes_aggregate(
+            primary_type: str,
+            resolution: int,
+            start_date: Optional[datetime.date] = None,
+            end_date: Optional[datetime.date] = None
+    ) -> List[Dict[str, Union[float, int]]]:
+        """Get number of crimes of primary type in each grid cell of given resolution.
+        Aggregates of all crimes are precomputed by refresh tasks, aggregates of a date range
+        are computed from cached crimes.
+
+        Args:
+            primary_type (str): A string that indicates primary type
+            resolution (int): size of grid cells in meters
+            start_date: first date of crimes, None means no start limit
+            end_date: last date of crimes, None means no end limit
+
+        Returns:
+            A list of occupied cells that contains cell center location and number of its crimes in a dict
+
+        Raises:
+            CrimesDataBackend.QueryTimeoutError
+            CrimesDataBackend.QueryError
+        """
+
+        if start_date is None and end_date is None:
+            crimes_aggregate = CrimesLocalCache.get_or_load(
+                ('aggregate', primary_type, resolution),
+                lambda: CacheManager.get_crimes_aggregate(
+                    primary_type, resolution, CrimesDataManager.get_crimes_generation()
+                )
+            )
+            if crimes_aggregate is not None:
+                return crimes_aggregate
+
+        crimes_columns = CrimesDataManager.get_crimes_columns_by_primary_type(primary_type)
+        start_index, end_index = crimes_columns.date_range_indexes(start_date, end_date)
+        return CrimesAggregator.aggregate(crimes_columns[start_index:end_index], resolution)
+
+    @staticmethod
+    def get_crimes_statistics(
+            primary_type: str,
+            period: str,
+            start_date: Optional[datetime.date] = None,
+            end_date: Optional[datetime.date] = None
+    ) -> Dict[str, Union[list, dict]]:
+        """Get number of crimes of primary type in each day, week, or month and summary of them.
+        Statistics of all crimes are precomputed by refresh tasks, statistics of a date range
+        are computed from cached crimes.
 
         Args:
             primary_type (str): A string that indicates primary type
+            period (str): One of `crimes_statistics_periods`, e.g. "weekly"
+            start_date: first date of crimes, None means no start limit
+            end_date: last date of crimes, None means no end limit
+
+        Returns:
+            A dict of "counts", a list of periods that contains period start date and number of its crimes in a dict,
+            and "summary" of crimes
+
+        Raises:
+            CrimesDataBackend.QueryTimeoutError
+            CrimesDataBackend.QueryError
+        """
+
+        if start_date is None and end_date is None:
+            crimes_statistics = CrimesLocalCache.get_or_load(
+                ('statistics', primary_type, period),
+                lambda: CacheManager.get_crimes_statistics(
+                    primary_type, period, CrimesDataManager.get_crimes_generation()
+                )
+            )
+            if crimes_statistics is not None:
+                return crimes_statistics
+
+        crimes_columns = CrimesDataManager.get_crimes_columns_by_primary_type(primary_type)
+        start_index, end_index = crimes_columns.date_range_indexes(start_date, end_date)
+        # cached crimes are limited to the latest crimes, so a date range that reaches the oldest cached crime
+        # may miss older crimes of its oldest periods
+        is_truncated = 0 < CrimesDataBackend.crimes_limit <= len(crimes_columns) and end_index == len(crimes_columns)
+        crimes_statistics = CrimesStatistics.compute(crimes_columns[start_index:end_index], is_truncated)
+        return {'counts': crimes_statistics[period], 'summary': crimes_statistics['summary']}
+
+    @staticmethod
+    def get_crimes_near_location(
+            primary_type: str, lat: float, lon: float, radius: float
+    ) -> List[Dict[str, Union[float, str]]]:
+        """Get crimes of primary type within a distance of a location.
+
+        Args:
+            primary_type (str): A string that indicates primary type
+            lat (float), lon (float): the center location
+            radius (float): maximum distance in meters
+
+        Returns:
+             A list of crimes that contains crime location and date in a dict.
+
+        Raises:
+            CrimesDataBackend.QueryTimeoutError
+            CrimesDataBackend.QueryError
+        """
+
+        crimes_columns = CrimesDataManager.get_crimes_columns_by_primary_type(primary_type)
+        spatial_index = CrimesDataManager.__get_crimes_spatial_index(primary_type, crimes_columns)
+        return crimes_columns[spatial_index.query_radius(crimes_columns, lat, lon, radius)].to_records()
+
+    @staticmethod
+    def get_crimes_in_bbox(
+            primary_type: str, min_lat: float, min_lon: float, max_lat: float, max_lon: float
+    ) -> List[Dict[str, Union[float, str]]]:
+        """Get crimes of primary type inside a bounding box, e.g. visible area of a map.
+
+        Args:
+            primary_type (str): A string that indicates primary type
+            min_lat (float), min_lon (float): south-west corner of the box
+            max_lat (float), max_lon (float): north-east corner of the box
 
         Returns:
              A list of crimes that contains crime location and date in a dict.
 
         Raises:
-            BigQueryManager.QueryTimeoutError
-            BigQueryManager.GoogleCloudQueryError
+            CrimesDataBackend.QueryTimeoutError
+            CrimesDataBackend.QueryError
         """
 
-        # getting crimes data from cache
-        crimes_by_primary_type = CacheManager.get_crimes_by_primary_type(primary_type)
+        crimes_columns = CrimesDataManager.get_crimes_columns_by_primary_type(primary_type)
+        spatial_index = CrimesDataManager.__get_crimes_spatial_index(primary_type, crimes_columns)
+        return crimes_columns[spatial_index.query_bbox(crimes_columns, min_lat, min_lon, max_lat, max_lon)].to_records()
+
+    @staticmethod
+    def __get_crimes_spatial_index(primary_type: str, crimes_columns: CrimesColumns) -> CrimesSpatialIndex:
+        """Get spatial index of crimes of primary type, which is built by refresh tasks.
+        If it is not cached or it doesn't belong to given crimes, it is built from given crimes.
+
+        Args:
+            primary_type (str): A string that indicates primary type
+            crimes_columns: crimes of primary type
+
+        Returns:
+            A CrimesSpatialIndex object
+        """
+
+        def load_spatial_index() -> CrimesSpatialIndex:
+            generation = CrimesDataManager.get_crimes_generation()
+            spatial_index = CacheManager.get_crimes_spatial_index(primary_type, generation)
+            return spatial_index or CrimesSpatialIndex.build(crimes_columns)
+
+        spatial_index = CrimesLocalCache.get_or_load(('spatial_index', primary_type), load_spatial_index)
+        # crimes may be refreshed after their spatial index was read, then the index is not valid for them,
+        # refreshed crimes may have the same number of rows, e.g. `CRIMES_ROW_LIMIT` rows, so their rows are compared
+        if spatial_index.fingerprint != crimes_columns.fingerprint:
+            spatial_index = CrimesSpatialIndex.build(crimes_columns)
+        return spatial_index
+
+    @staticmethod
+    def get_crimes_columns_by_primary_type(primary_type: str) -> CrimesColumns:
+        """Get crimes of primary type as columns.
+        At first, it tries to get data from cache, if cache
+        is empty, it will query data from crimes data backend
+
+        Args:
+            primary_type (str): A string that indicates primary type
+
+        Returns:
+             A CrimesColumns object, crimes are sorted based on crime date in descending order.
+
+        Raises:
+            CrimesDataBackend.QueryTimeoutError
+            CrimesDataBackend.QueryError
+        """
+
+        # getting crimes data from local cache of this worker or redis
+        crimes_by_primary_type = CrimesLocalCache.get_or_load(
+            ('crimes', primary_type), lambda: CrimesDataManager.__load_crimes_from_cache(primary_type)
+        )
         if crimes_by_primary_type is None:
             # there is no cached crimes of primary types, so fetching data from dataset
-            try:
-                crimes_by_primary_type = BigQueryManager().query_crimes_by_primary_type(primary_type)
-            except BigQueryManager.QueryTimeoutError:
-                raise BigQueryManager.QueryTimeoutError
-            except BigQueryManager.GoogleCloudQueryError:
-                raise BigQueryManager.GoogleCloudQueryError
-            except Exception as ex:
-                raise ex
-            # cache fetched data for crimes of primary type
-            CacheManager.set_crimes_filtered_by_primary_type(primary_type, crimes_by_primary_type)
+            crimes_by_primary_type = CrimesDataManager.__fetch_crimes_once(primary_type)
         return crimes_by_primary_type
+
+    @staticmethod
+    def get_crimes_columns_by_primary_types(primary_types: List[str]) -> Dict[str, CrimesColumns]:
+        """Get crimes of several primary types as columns.
+        Crimes that are not in local cache are read from redis with one MGET, and crimes that are not
+        cached at all are fetched from crimes data backend with one query.
+
+        Args:
+            primary_types: A list of primary types
+
+        Returns:
+             A dict that maps each primary type to a CrimesColumns object, crimes are sorted based on crime date
+             in descending order.
+
+        Raises:
+            CrimesDataBackend.QueryTimeoutError
+            CrimesDataBackend.QueryError
+        """
+
+        def load_crimes_of_primary_types(keys: List[Tuple[str, str]]) -> Dict[Tuple[str, str], CrimesColumns]:
+            # loaded crimes are keyed like local cache keys, so they are cached and returned for their keys
+            cached_crimes = CrimesDataManager.__load_crimes_of_primary_types_from_cache([key[1] for key in keys])
+            return {('crimes', primary_type): crimes for primary_type, crimes in cached_crimes.items()}
+
+        crimes_by_primary_types = CrimesLocalCache.get_many_or_load(
+            [('crimes', primary_type) for primary_type in primary_types], load_crimes_of_primary_types
+        )
+        crimes_by_primary_types = {key[1]: crimes for key, crimes in crimes_by_primary_types.items()}
+        missing_primary_types = [item for item in primary_types if crimes_by_primary_types[item] is None]
+        if missing_primary_types:
+            # there is no cached crimes of these primary types, so fetching data from dataset
+            crimes_by_primary_types.update(
+                CrimesDataManager.__fetch_crimes_of_primary_types_once(missing_primary_types)
+            )
+        return {primary_type: crimes_by_primary_types[primary_type] for primary_type in primary_types}
+
+    @staticmethod
+    def iter_crimes_ndjson_by_primary_type(primary_type: str) -> Optional[Iterator[bytes]]:
+        """Get crimes of primary type for streaming as newline delimited JSON, crimes may be the full history
+        of primary type, so they are read from cache chunk by chunk while the response is being sent.
+        If crimes chunks are stale or not cached, a celery task is requested to cache them in background.
+
+        Args:
+            primary_type (str): A string that indicates primary type
+
+        Returns:
+             An iterator of NDJSON bytes, each item contains lines of one chunk, or None if chunks are not cached yet.
+             The iterator raises CrimesDataManager.CrimesChunkMissingError if a chunk can not be read while
+             the response is being sent, so the stream is closed before its end instead of looking complete.
+        """
+
+        chunks_key, is_fresh = CacheManager.get_crimes_chunks_key(primary_type)
+        # number of chunks is read once, then a missing chunk is an error instead of the end of the list
+        chunks_count = None if chunks_key is None else CacheManager.get_crimes_chunks_count(chunks_key)
+        # published chunks may be expired, e.g. `CRIMES_CHUNKS_RETENTION_SECONDS` after a newer list is published
+        if (not is_fresh or chunks_count == 0) and CacheManager.claim_crimes_refresh(
+                primary_type, timeout=crimes_fetch_lock_timeout, refresh_name='chunks_refreshing'
+        ):
+            try:
+                celery.send_task('cache_crimes_chunks_of_primary_type', args=(primary_type,), queue='crimes')
+            except Exception:
+                logger.exception('Can not request caching crimes chunks, maybe celery broker is not ready')
+        if not chunks_count:
+            return
+
+        def iter_chunks() -> Iterator[bytes]:
+            for chunk_index in range(chunks_count):
+                crimes_chunk = CacheManager.get_crimes_chunk(chunks_key, chunk_index)
+                if crimes_chunk is None:
+                    raise CrimesDataManager.CrimesChunkMissingError(
+                        f'Chunk {chunk_index} of {chunks_count} crimes chunks of {primary_type} can not be read'
+                    )
+                yield b''.join(PreparedResponse.dumps(item) + b'\n' for item in crimes_chunk.to_records())
+
+        return iter_chunks()
+
+    @staticmethod
+    def __load_crimes_from_cache(primary_type: str) -> Optional[CrimesColumns]:
+        """Get cached crimes of primary type, see `__load_crimes_of_primary_types_from_cache`
+
+        Args:
+            primary_type (str): A string that indicates primary type
+
+        Returns:
+             A CrimesColumns object, or None if cache is empty.
+        """
+        return CrimesDataManager.__load_crimes_of_primary_types_from_cache([primary_type])[primary_type]
+
+    @staticmethod
+    def __load_crimes_of_primary_types_from_cache(primary_types: List[str]) -> Dict[str, Optional[CrimesColumns]]:
+        """Get cached crimes of primary types with one redis round trip, stale crimes are returned immediately
+        and a celery task is requested to refresh each of them in background.
+
+        Args:
+            primary_types: A list of primary types
+
+        Returns:
+             A dict that maps each primary type to a CrimesColumns object, or None if its cache is empty.
+        """
+
+        crimes_by_primary_types = {}
+        cached_crimes = CacheManager.get_crimes_columns_by_primary_types_with_freshness(
+            primary_types, CrimesDataManager.get_crimes_generation()
+        )
+        for primary_type, (crimes_by_primary_type, is_fresh) in cached_crimes.items():
+            CrimesDataManager.__record_crimes_cache_lookup(primary_type, is_hit=crimes_by_primary_type is not None)
+            if crimes_by_primary_type is not None and not is_fresh:
+                CrimesDataManager.__request_crimes_refresh(primary_type)
+            crimes_by_primary_types[primary_type] = crimes_by_primary_type
+        return crimes_by_primary_types
+
+    @staticmethod
+    def __record_crimes_cache_lookup(primary_type: str, is_hit: bool):
+        """Count a hit or miss of cached crimes of primary type, so cache hit ratio is exposed as a metric
+
+        Args:
+            primary_type (str): A string that indicates primary type
+            is_hit (bool): crimes are cached or not
+        """
+        primary_type_label = MetricsUtils.primary_type_label(
+            primary_type, CrimesDataManager.get_cached_crimes_primary_types()
+        )
+        MetricsUtils.crimes_cache_lookups.labels(
+            primary_type=primary_type_label, result='hit' if is_hit else 'miss'
+        ).inc()
+
+    @staticmethod
+    def __record_crimes_backend_fetch(primary_type: str):
+        """Count a fetch of crimes of primary type from crimes data backend by API workers, it is counted as
+        a miss of popularity counters and as a metric
+
+        Args:
+            primary_type (str): A string that indicates primary type
+        """
+        CrimesPopularity.record_miss(primary_type)
+        primary_type_label = MetricsUtils.primary_type_label(
+            primary_type, CrimesDataManager.get_cached_crimes_primary_types()
+        )
+        MetricsUtils.crimes_backend_fetches.labels(primary_type=primary_type_label).inc()
+
+    @staticmethod
+    def __request_crimes_refresh(primary_type: str):
+        """Request a celery task to refresh stale crimes of primary type in background, only one request claims
+        the refresh, so stale crimes are refreshed once
+
+        Args:
+            primary_type (str): A string that indicates primary type
+        """
+
+        if not CacheManager.claim_crimes_refresh(primary_type, timeout=crimes_fetch_lock_timeout):
+            return
+        try:
+            celery.send_task('get_crimes_by_primary_type_from_bigquery_and_cache', args=(primary_type,), queue='crimes')
+        except Exception:
+            logger.exception('Can not request refreshing stale crimes data, maybe celery broker is not ready')
+
+    @staticmethod
+    def __fetch_crimes_of_primary_types_once(primary_types: List[str]) -> Dict[str, CrimesColumns]:
+        """Fetch crimes of several primary types from crimes data backend with one query and cache them.
+        Primary types that are being fetched by other workers are not queried again, we wait for them
+        like `__fetch_crimes_once`.
+
+        Args:
+            primary_types: A list of primary types
+
+        Returns:
+             A dict that maps each primary type to a CrimesColumns object.
+
+        Raises:
+            CrimesDataBackend.QueryTimeoutError
+            CrimesDataBackend.QueryError
+        """
+
+        if len(primary_types) == 1:
+            return {primary_types[0]: CrimesDataManager.__fetch_crimes_once(primary_types[0])}
+
+        generation = CrimesDataManager.get_crimes_generation()
+        locks = {}
+        try:
+            for primary_type in primary_types:
+                lock = CacheManager.get_crimes_lock(primary_type, timeout=crimes_fetch_lock_timeout)
+                if lock.acquire(blocking=False):
+                    locks[primary_type] = lock
+        except Exception:
+            # redis is not ready, so we can not coordinate with other workers and fetch crimes by ourselves
+            logger.exception('Can not acquire crimes fetch locks, maybe redis is not ready')
+            CrimesDataManager.__release_crimes_locks(locks)
+            with ProfilingUtils.time_stage('backend'):
+                return CrimesDataBackend.get_backend().query_latest_crimes_columns_of_primary_types(primary_types)
+
+        try:
+            crimes_by_primary_types = {}
+            if locks:
+                # another worker may have fetched and cached crimes before we acquired the locks
+                cached_crimes = CacheManager.get_crimes_columns_by_primary_types_with_freshness(list(locks), generation)
+                crimes_by_primary_types = {
+                    primary_type: crimes for primary_type, (crimes, _) in cached_crimes.items() if crimes is not None
+                }
+                primary_types_to_fetch = [item for item in locks if item not in crimes_by_primary_types]
+                if primary_types_to_fetch:
+                    for primary_type in primary_types_to_fetch:
+                        CrimesDataManager.__record_crimes_backend_fetch(primary_type)
+                    with ProfilingUtils.time_stage('backend'):
+                        fetched_crimes = CrimesDataBackend.get_backend().query_latest_crimes_columns_of_primary_types(
+                            primary_types_to_fetch
+                        )
+                    # cache fetched data for crimes of primary types
+                    CacheManager.set_crimes_filtered_by_primary_types(fetched_crimes, generation)
+                    crimes_by_primary_types.update(fetched_crimes)
+        finally:
+            CrimesDataManager.__release_crimes_locks(locks)
+
+        # other workers are fetching remaining primary types, so we wait for them one by one
+        for primary_type in primary_types:
+            if primary_type not in crimes_by_primary_types:
+                crimes_by_primary_types[primary_type] = CrimesDataManager.__fetch_crimes_once(primary_type)
+        return crimes_by_primary_types
+
+    @staticmethod
+    def __release_crimes_locks(locks: Dict[str, redis.lock.Lock]):
+        """Release crimes fetch locks that are acquired by this worker
+
+        Args:
+            locks: A dict that maps primary types to their acquired locks
+        """
+        for lock in locks.values():
+            try:
+                lock.release()
+            except LockError:
+                # lock is expired and maybe another worker owns it now
+                pass
+
+    @staticmethod
+    def __fetch_crimes_once(primary_type: str) -> CrimesColumns:
+        """Fetch crimes of primary type from crimes data backend and cache them. Concurrent requests of all
+        workers for the same primary type are coalesced by a redis lock, so only one of them queries
+        the crimes data backend and the others wait for its result.
+
+        Args:
+            primary_type (str): A string that indicates primary type
+
+        Returns:
+             A CrimesColumns object.
+
+        Raises:
+            CrimesDataBackend.QueryTimeoutError
+            CrimesDataBackend.QueryError
+        """
+
+        generation = CrimesDataManager.get_crimes_generation()
+        lock = CacheManager.get_crimes_lock(primary_type, timeout=crimes_fetch_lock_timeout)
+        try:
+            # waiting for another worker that is fetching the same primary type is a stage of request too
+            with ProfilingUtils.time_stage('lock_wait'):
+                is_locked = lock.acquire(blocking_timeout=crimes_fetch_lock_timeout)
+        except Exception:
+            # redis is not ready, so we can not coordinate with other workers and fetch crimes by ourselves
+            logger.exception('Can not acquire crimes fetch lock, maybe redis is not ready')
+            with ProfilingUtils.time_stage('backend'):
+                return CrimesDataBackend.get_backend().query_crimes_columns_by_primary_type(primary_type)
+
+        if not is_locked:
+            # another worker is fetching crimes for too long, maybe it has cached them in the meantime
+            crimes_by_primary_type = CacheManager.get_crimes_columns_by_primary_type(primary_type, generation)
+            if crimes_by_primary_type is None:
+                raise CrimesDataBackend.QueryTimeoutError
+            return crimes_by_primary_type
+
+        try:
+            # another worker may have fetched and cached crimes while we were waiting for the lock
+            crimes_by_primary_type = CacheManager.get_crimes_columns_by_primary_type(primary_type, generation)
+            if crimes_by_primary_type is None:
+                CrimesDataManager.__record_crimes_backend_fetch(primary_type)
+                with ProfilingUtils.time_stage('backend'):
+                    crimes_by_primary_type = CrimesDataBackend.get_backend().query_crimes_columns_by_primary_type(
+                        primary_type
+                    )
+                # cache fetched data for crimes of primary type
+                CacheManager.set_crimes_filtered_by_primary_type(primary_type, crimes_by_primary_type, generation)
+            return crimes_by_primary_type
+        finally:
+            try:
+                lock.release()
+            except LockError:
+                # lock is expired and maybe another worker owns it now
+                pass
@@ -0,0 +1,371 @@
+import argparse
+import csv
+import json
+import os
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple, Union
+from urllib.parse import urlparse
+
+import numpy as np
+import requests
+
+from benchmarks.synthetic_crimes import SyntheticCrimes
+
+# root directory of repository, gunicorn is started here, so it finds "api.app" and "gunicorn.conf.py"
+REPOSITORY_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# share of each primary type in Chicago crimes dataset, dashboard users select popular types more often
+PRIMARY_TYPES_SHARES = {
+    'THEFT': 21.5, 'BATTERY': 18.3, 'CRIMINAL DAMAGE': 11.3, 'NARCOTICS': 9.5, 'ASSAULT': 6.7,
+    'OTHER OFFENSE': 6.2, 'BURGLARY': 5.4, 'MOTOR VEHICLE THEFT': 4.8, 'DECEPTIVE PRACTICE': 4.4, 'ROBBERY': 3.7,
+    'CRIMINAL TRESPASS': 2.7, 'WEAPONS VIOLATION': 1.3, 'PROSTITUTION': 0.9, 'OFFENSE INVOLVING CHILDREN': 0.7,
+    'PUBLIC PEACE VIOLATION': 0.7, 'SEX OFFENSE': 0.4, 'HOMICIDE': 0.2, 'ARSON': 0.2, 'KIDNAPPING': 0.1,
+    'STALKING': 0.05,
+}
+# share of each kind of request, dashboard downloads crimes as Arrow streams and other clients use JSON endpoints
+REQUESTS_SHARES = {
+    'crimes_arrow': 0.35, 'crimes_json': 0.15, 'crimes_date_range': 0.10, 'aggregate': 0.15, 'stats': 0.10,
+    'primary_types': 0.10, 'version': 0.05,
+}
+
+Sample = Tuple[str, Optional[str], bool, float]
+LoadTestResult = Dict[str, Union[int, float, Dict]]
+
+
+class RedisStandIn:
+    """Starts a local redis for API workers and cached crimes, a real `redis-server` is used if it is installed,
+    otherwise an in-memory fakeredis server is started in this process"""
+
+    def __init__(self, redis_url: Optional[str] = None):
+        """Start a local redis or use the given one
+
+        Args:
+            redis_url (str): url of a scratch redis, it is flushed before each configuration
+        """
+
+        self.process, self.server = None, None
+        if redis_url:
+            parsed_url = urlparse(redis_url)
+            self.host, self.port = parsed_url.hostname, parsed_url.port or 6379
+            return
+        self.host, self.port = '127.0.0.1', find_free_port()
+        if shutil.which('redis-server'):
+            self.process = subprocess.Popen(
+                ['redis-server', '--port', str(self.port), '--save', '', '--appendonly', 'no'],
+                stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+            )
+        else:
+            import fakeredis
+            self.server = fakeredis.TcpFakeServer((self.host, self.port))
+            threading.Thread(target=self.server.serve_forever, name='fake_redis', daemon=True).start()
+
+    def stop(self):
+        """Stop started redis"""
+        if self.process is not None:
+            self.process.terminate()
+            self.process.wait()
+        if self.server is not None:
+            self.server.shutdown()
+
+
+def find_free_port() -> int:
+    """Returns a free TCP port of localhost"""
+    with socket.socket() as free_socket:
+        free_socket.bind(('127.0.0.1', 0))
+        return free_socket.getsockname()[1]
+
+
+class CrimesLoadTest:
+    """A class to replay dashboard-like traffic against gunicorn API workers and measure latencies. Crimes of
+    the most popular primary types are cached before each configuration(warm), other primary types are only in
+    the local crimes database, so their requests are cache misses(cold) until one of them caches their crimes."""
+
+    def __init__(self, rows_per_type: int, warm_types: int, work_path: str):
+        """Generate synthetic crimes of all primary types and load them into a local crimes database
+
+        Args:
+            rows_per_type (int): number of crimes of each primary type
+            warm_types (int): number of the most popular primary types that are cached before traffic starts
+            work_path (str): a directory for local crimes database
+        """
+
+        self.primary_types = list(PRIMARY_TYPES_SHARES)
+        self.warm_types = set(self.primary_types[:warm_types])
+        # primary types that are cached, requests of other primary types are cache misses
+        self.cached_types = set(self.warm_types)
+        self.crimes = {
+            primary_type: SyntheticCrimes.generate_columns(rows_per_type, seed=index, years=2)
+            for index, primary_type in enumerate(self.primary_types)
+        }
+        self.first_day = min(int(crimes.days.min()) for crimes in self.crimes.values())
+        self.last_day = max(int(crimes.days.max()) for crimes in self.crimes.values())
+        self.db_path = os.path.join(work_path, 'load_test_crimes.sqlite3')
+        extract_path = os.path.join(work_path, 'load_test_crimes.csv')
+        with open(extract_path, 'w', newline='') as extract_file:
+            writer = csv.writer(extract_file)
+            writer.writerow(['primary_type', 'latitude', 'longitude', 'date'])
+            for primary_type, crimes in self.crimes.items():
+                writer.writerows(
+                    (primary_type, lat, lon, date)
+                    for lat, lon, date in zip(crimes.lat.tolist(), crimes.lon.tolist(), crimes.dates.tolist())
+                )
+
+        from big_query.local_crimes import LocalCrimesManager
+        LocalCrimesManager.load_extract(extract_path, self.db_path)
+
+    def seed_cache(self):
+        """Remove everything from redis and cache crimes of warm primary types in a new generation"""
+
+        from celery_app.cache_manager import CacheManager, RedisUtils
+        from celery_app.tasks import cache_crimes_of_primary_types
+
+        RedisUtils.get_redis_client().flushdb()
+        self.cached_types = set(self.warm_types)
+        CacheManager.set_crimes_primary_types(tuple(self.primary_types))
+        cache_crimes_of_primary_types(
+            {primary_type: self.crimes[primary_type] for primary_type in self.warm_types}, new_generation=True
+        )
+
+    def random_date_range(self, random_generator: random.Random) -> Dict[str, str]:
+        """Returns start_date and end_date query params of a random range of one week to one year"""
+
+        length = random_generator.randint(7, 365)
+        start_day = random_generator.randint(self.first_day, max(self.last_day - length, self.first_day))
+        return {
+            'start_date': str(np.datetime64(start_day, 'D')),
+            'end_date': str(np.datetime64(start_day + length, 'D')),
+        }
+
+    def random_request(self, random_generator: random.Random) -> Tuple[str, Optional[str], str, Dict, Dict]:
+        """Pick a random request like dashboard users
+
+        Returns:
+            A tuple of kind of request, primary type(or None), path, query params, and headers
+        """
+
+        kind = random_generator.choices(list(REQUESTS_SHARES), weights=list(REQUESTS_SHARES.values()))[0]
+        if kind == 'primary_types':
+            return kind, None, '/api/crimes/primary_types', {}, {}
+        if kind == 'version':
+            return kind, None, '/api/crimes/version', {}, {}
+        primary_type = random_generator.choices(self.primary_types, weights=list(PRIMARY_TYPES_SHARES.values()))[0]
+        params = {'primary_type': primary_type}
+        if kind == 'crimes_arrow':
+            return kind, primary_type, '/api/crimes/', params, {'Accept': 'application/vnd.apache.arrow.stream'}
+        if kind == 'crimes_json':
+            return kind, primary_type, '/api/crimes/', params, {'Accept-Encoding': 'gzip'}
+        if kind == 'crimes_date_range':
+            return kind, primary_type, '/api/crimes/', {**params, **self.random_date_range(random_generator)}, {}
+        # half of aggregate and statistics requests are filtered by a date range like dashboard date picker
+        if random_generator.random() < 0.5:
+            params.update(self.random_date_range(random_generator))
+        if kind == 'aggregate':
+            return kind, primary_type, '/api/crimes/aggregate', params, {}
+        return kind, primary_type, '/api/crimes/stats', {**params, 'period': 'weekly'}, {}
+
+    def run_client(self, base_url: str, deadline: float, seed: int, samples: List[Sample]):
+        """Send requests one after another until deadline, like one dashboard user without think time
+
+        Args:
+            base_url (str): base url of API
+            deadline (float): `time.monotonic()` time that client stops
+            seed (int): seed of random requests of this client
+            samples: A list that (kind, temperature, is error, seconds) of each request is appended to
+        """
+
+        random_generator = random.Random(seed)
+        session = requests.Session()
+        while time.monotonic() < deadline:
+            kind, primary_type, path, params, headers = self.random_request(random_generator)
+            # requests that are sent before crimes of primary type are cached wait for backend, so they are cold
+            temperature = None if primary_type is None else (
+                'warm' if primary_type in self.cached_types else 'cold'
+            )
+            start_time = time.perf_counter()
+            try:
+                response = session.get(f'{base_url}{path}', params=params, headers=headers, timeout=60)
+                is_error = response.status_code >= 400
+            except requests.RequestException:
+                is_error = True
+            if temperature == 'cold' and not is_error:
+                self.cached_types.add(primary_type)
+            samples.append((kind, temperature, is_error, time.perf_counter() - start_time))
+
+    @staticmethod
+    def start_api(workers: int, threads: int, port: int, env: Dict[str, str]) -> subprocess.Popen:
+        """Start gunicorn API workers and wait until they respond
+
+        Args:
+            workers (int): number of gunicorn worker processes
+            threads (int): number of threads of each worker
+            port (int): TCP port of API
+            env: environment variables of gunicorn
+
+        Returns:
+            gunicorn process
+        """
+
+        process = subprocess.Popen(
+            [
+                sys.executable, '-m', 'gunicorn', '--bind', f'127.0.0.1:{port}', f'--workers={workers}',
+                f'--threads={threads}', 'api.app:application'
+            ],
+            cwd=REPOSITORY_PATH, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        )
+        deadline = time.monotonic() + 60
+        while time.monotonic() < deadline:
+            if process.poll() is not None:
+                raise RuntimeError('gunicorn is exited, run it manually to see its errors')
+            try:
+                if requests.get(f'http://127.0.0.1:{port}/api/crimes/version', timeout=1).status_code == 200:
+                    return process
+            except requests.RequestException:
+                pass
+            time.sleep(0.2)
+        process.terminate()
+        raise RuntimeError('gunicorn does not respond')
+
+    @staticmethod
+    def summarize(samples: List[Sample], duration: float) -> Dict[str, Union[int, float, None]]:
+        """Calculate throughput and latency percentiles of samples
+
+        Args:
+            samples: A list of (kind, temperature, is error, seconds) of requests
+            duration (float): seconds that requests were sent
+
+        Returns:
+            A dict of number of requests and errors, requests per second, and latency percentiles in milliseconds
+        """
+
+        latencies = np.array([item[3] for item in samples]) * 1000
+        return {
+            'requests': len(samples),
+            'errors': sum(item[2] for item in samples),
+            'requests_per_second': round(len(samples) / duration, 2),
+            **{
+                name: round(float(np.percentile(latencies, percentile)), 3) if len(samples) else None
+                for name, percentile in (('p50_ms', 50), ('p95_ms', 95), ('p99_ms', 99), ('max_ms', 100))
+            },
+        }
+
+    def run(self, workers: int, threads: int, clients: int, duration: float, env: Dict[str, str]) -> LoadTestResult:
+        """Seed cache, start API with given configuration, and send requests of all clients for given duration
+
+        Args:
+            workers (int): number of gunicorn worker processes
+            threads (int): number of threads of each worker
+            clients (int): number of concurrent clients
+            duration (float): seconds that requests are sent
+            env: environment variables of gunicorn
+
+        Returns:
+            A dict of configuration and summary of all requests, each kind of request, and warm and cold requests
+        """
+
+        self.seed_cache()
+        port = find_free_port()
+        process = self.start_api(workers, threads, port, env)
+        try:
+            samples_of_clients = [[] for _ in range(clients)]
+            base_url, deadline = f'http://127.0.0.1:{port}', time.monotonic() + duration
+            client_threads = [
+                threading.Thread(target=self.run_client, args=(base_url, deadline, index, samples_of_clients[index]))
+                for index in range(clients)
+            ]
+            for client_thread in client_threads:
+                client_thread.start()
+            for client_thread in client_threads:
+                client_thread.join()
+        finally:
+            process.terminate()
+            process.wait(timeout=30)
+
+        samples = [item for client_samples in samples_of_clients for item in client_samples]
+        samples_of_kinds, samples_of_temperatures = defaultdict(list), defaultdict(list)
+        for item in samples:
+            samples_of_kinds[item[0]].append(item)
+            if item[1] is not None:
+                samples_of_temperatures[item[1]].append(item)
+        return {
+            'workers': workers,
+            'threads': threads,
+            'clients': clients,
+            'duration_seconds': duration,
+            **self.summarize(samples, duration),
+            'requests_kinds': {
+                kind: self.summarize(items, duration) for kind, items in sorted(samples_of_kinds.items())
+            },
+            'primary_types': {
+                temperature: self.summarize(items, duration) for temperature, items in samples_of_temperatures.items()
+            },
+        }
+
+
+def main(arguments: Optional[List[str]] = None) -> int:
+    """Run load test from command line, results are printed or saved as JSON
+
+    Args:
+        arguments: A list of command line arguments, None means `sys.argv`
+
+    Returns:
+        Exit code of process
+    """
+
+    parser = argparse.ArgumentParser(description='Measure throughput and latency of gunicorn API configurations')
+    parser.add_argument('--configs', default='1x1,2x2,4x2', help='comma separated gunicorn workers x threads')
+    parser.add_argument('--clients', type=int, default=16, help='number of concurrent clients')
+    parser.add_argument('--duration', type=float, default=20, help='seconds of traffic for each configuration')
+    parser.add_argument('--rows-per-type', type=int, default=2000, help='number of crimes of each primary type')
+    parser.add_argument('--warm-types', type=int, default=10, help='number of popular primary types that are cached')
+    parser.add_argument('--redis-url', default=None, help='url of a scratch redis, it is flushed before each run')
+    parser.add_argument('--output', default=None, help='path of JSON results, default is stdout')
+    arguments = parser.parse_args(arguments)
+
+    redis_stand_in = RedisStandIn(arguments.redis_url)
+    # cache manager connects to redis of these environment variables when it is imported
+    os.environ['REDIS_HOST'], os.environ['REDIS_PORT'] = redis_stand_in.host, str(redis_stand_in.port)
+    from benchmarks.run_benchmarks import CrimesBenchmarks
+    work_path = tempfile.mkdtemp(prefix='crimes_load_test_')
+    try:
+        load_test = CrimesLoadTest(arguments.rows_per_type, arguments.warm_types, work_path)
+        env = {
+            **os.environ, 'CRIMES_BACKEND': 'local', 'LOCAL_CRIMES_DB_PATH': load_test.db_path,
+            'FLASK_SECRET_KEY': os.environ.get('FLASK_SECRET_KEY', 'load-test'),
+        }
+        results = []
+        for config in arguments.configs.split(','):
+            workers, threads = (int(item) for item in config.split('x'))
+            result = load_test.run(workers, threads, arguments.clients, arguments.duration, env)
+            results.append(result)
+            print(
+                f'workers={workers} threads={threads}: {result["requests_per_second"]} req/s, '
+                f'p50 {result["p50_ms"]} ms, p95 {result["p95_ms"]} ms, p99 {result["p99_ms"]} ms, '
+                f'{result["errors"]} errors', file=sys.stderr
+            )
+    finally:
+        redis_stand_in.stop()
+        shutil.rmtree(work_path, ignore_errors=True)
+
+    report = {
+        **CrimesBenchmarks.get_environment(),
+        'cpu_count': os.cpu_count(),
+        'redis': 'redis-server' if redis_stand_in.process else 'fakeredis' if redis_stand_in.server else 'redis-url',
+        'results': results,
+    }
+    if arguments.output:
+        with open(arguments.output, 'w') as output_file:
+            json.dump(report, output_file, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
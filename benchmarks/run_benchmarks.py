@@ -0,0 +1,330 @@
+import argparse
+import datetime
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from typing import Callable, Dict, List, Optional, Union
+
+import pyarrow
+import redis
+
+from benchmarks.synthetic_crimes import SyntheticCrimes
+from celery_app.cache_manager import CacheManager, RedisUtils
+
+# primary type and generation of benchmark crimes in redis, a real redis must be a scratch database
+BENCHMARK_PRIMARY_TYPE = 'BENCHMARK'
+BENCHMARK_GENERATION = 1
+# environment variables that change results, they are saved with results
+BENCHMARK_CONFIG_VARIABLES = ('CRIMES_CACHE_COMPRESSION', 'CRIMES_CACHE_FLOAT_BITS')
+
+BenchmarkResult = Dict[str, Union[str, int, float, None]]
+
+
+class StubBigQueryClient:
+    """A BigQuery client whose query jobs return a given Arrow table instead of running queries, so conversion of
+    query results is measured without Google Cloud"""
+
+    class QueryJob:
+        """A finished query job of the stub client"""
+
+        cache_hit = False
+        total_bytes_processed = 0
+        total_bytes_billed = 0
+        error_result = None
+
+        def __init__(self, query_response: pyarrow.Table):
+            self.query_response = query_response
+
+        def result(self) -> 'StubBigQueryClient.QueryJob':
+            return self
+
+        # noinspection PyUnusedLocal
+        def to_arrow(self, create_bqstorage_client: bool = False) -> pyarrow.Table:
+            return self.query_response
+
+    def __init__(self, query_response: pyarrow.Table):
+        """Initialize a client that returns the given Arrow table
+
+        Args:
+            query_response: An Arrow table with latitude, longitude, and crime_date columns
+        """
+        self.query_response = query_response
+
+    # noinspection PyUnusedLocal
+    def query(self, query: str, **kwargs) -> QueryJob:
+        return StubBigQueryClient.QueryJob(self.query_response)
+
+
+class StubBigQueryManager:
+    """Creates a BigQuery backend with a stub client"""
+
+    @staticmethod
+    def create(query_response: pyarrow.Table):
+        """Create a BigQueryManager with a stub client, each query returns the given Arrow table
+
+        Args:
+            query_response: An Arrow table with latitude, longitude, and crime_date columns
+
+        Returns:
+            A BigQueryManager object
+        """
+
+        # google cloud packages are imported here, so other benchmarks run without them
+        from big_query.crimes import BigQueryManager
+        from big_query.query_cache import QueryResultCache
+
+        # results are not reused, so each run converts the query result of its own number of crimes
+        backend = BigQueryManager(client=StubBigQueryClient(query_response), query_results=QueryResultCache(0))
+        backend.crimes_limit = 0
+        return backend
+
+
+class CrimesBenchmarks:
+    """A class to measure hot paths of caching, serializing, and converting crimes data with synthetic crimes"""
+
+    @staticmethod
+    def use_redis(redis_url: Optional[str] = None):
+        """Make CacheManager use an in-memory fakeredis server or a real redis
+
+        Args:
+            redis_url (str): url of a scratch redis database, None means fakeredis
+        """
+
+        if redis_url:
+            redis_client = redis.StrictRedis.from_url(redis_url)
+        else:
+            import fakeredis
+            redis_client = fakeredis.FakeStrictRedis()
+        RedisUtils.set_redis_client(redis_client)
+
+    @staticmethod
+    def measure(function: Callable[[], object], repeat: int) -> List[float]:
+        """Run a function once to warm it up, then run it `repeat` times and measure each run
+
+        Args:
+            function: A function without arguments
+            repeat (int): number of measured runs
+
+        Returns:
+            A list of seconds of each run
+        """
+
+        function()
+        timings = []
+        for _ in range(repeat):
+            start_time = time.perf_counter()
+            function()
+            timings.append(time.perf_counter() - start_time)
+        return timings
+
+    @staticmethod
+    def get_benchmarks(rows: int) -> Dict[str, Optional[Callable[[], object]]]:
+        """Prepare synthetic crimes and create benchmark functions of them
+
+        Args:
+            rows (int): number of crimes
+
+        Returns:
+            A dict that maps each benchmark name to its function, or None if it can not run in this environment
+        """
+
+        from api.api_response import APIResponse
+        from api.app import application
+
+        crimes = SyntheticCrimes.generate_columns(rows)
+        crimes_records = crimes.to_records()
+        crimes_ipc = crimes.to_arrow_ipc()
+        CacheManager.set_crimes_filtered_by_primary_type(BENCHMARK_PRIMARY_TYPE, crimes, BENCHMARK_GENERATION)
+
+        def render_json_response() -> bytes:
+            with application.test_request_context():
+                return APIResponse.ok_response(data=crimes_records)[0].get_data()
+
+        def render_arrow_response() -> bytes:
+            with application.test_request_context():
+                return APIResponse.arrow_response(crimes).get_data()
+
+        benchmarks = {
+            'cache_set_crimes': lambda: CacheManager.set_crimes_filtered_by_primary_type(
+                BENCHMARK_PRIMARY_TYPE, crimes, BENCHMARK_GENERATION
+            ),
+            'cache_get_crimes_columns': lambda: CacheManager.get_crimes_columns_by_primary_type(
+                BENCHMARK_PRIMARY_TYPE, BENCHMARK_GENERATION
+            ),
+            'cache_get_crimes_records': lambda: CacheManager.get_crimes_by_primary_type(
+                BENCHMARK_PRIMARY_TYPE, BENCHMARK_GENERATION
+            ),
+            'backend_query_crimes_by_primary_type': None,
+            'backend_query_crimes_columns_by_primary_type': None,
+            'api_json_response': render_json_response,
+            'api_arrow_response': render_arrow_response,
+            'dashboard_load_crimes_of_type_into_df': None,
+            'dashboard_read_arrow_stream': lambda: pyarrow.ipc.open_stream(crimes_ipc).read_pandas(
+                date_as_object=False
+            ),
+        }
+        try:
+            backend = StubBigQueryManager.create(SyntheticCrimes.generate_arrow_table(rows))
+            benchmarks['backend_query_crimes_by_primary_type'] = lambda: backend.query_crimes_by_primary_type(
+                BENCHMARK_PRIMARY_TYPE
+            )
+            benchmarks['backend_query_crimes_columns_by_primary_type'] = (
+                lambda: backend.query_crimes_columns_by_primary_type(BENCHMARK_PRIMARY_TYPE)
+            )
+        except ImportError:
+            pass
+        try:
+            # dashboard reads flask base url when it is imported
+            os.environ.setdefault('FLASK_APP_BASE_URL', 'http://0.0.0.0:8000')
+            from streamlit_dashboard import StreamlitDashboardManager
+            benchmarks['dashboard_load_crimes_of_type_into_df'] = (
+                lambda: StreamlitDashboardManager.load_crimes_of_type_into_df(crimes_records)
+            )
+        except Exception:
+            # streamlit raises other errors than ImportError too, e.g. if protobuf version is not supported
+            pass
+        return benchmarks
+
+    @classmethod
+    def run(cls, rows_list: List[int], repeat: int, names: Optional[List[str]] = None) -> List[BenchmarkResult]:
+        """Run benchmarks for each number of crimes
+
+        Args:
+            rows_list: A list of number of crimes, e.g. [2000, 100000, 1000000]
+            repeat (int): number of measured runs of each benchmark
+            names: A list of benchmark names to run, None means all benchmarks
+
+        Returns:
+            A list of results that contains name, number of crimes, and timings of each benchmark in a dict
+        """
+
+        results = []
+        for rows in rows_list:
+            for name, function in cls.get_benchmarks(rows).items():
+                if names and name not in names:
+                    continue
+                if function is None:
+                    results.append({'name': name, 'rows': rows, 'skipped': 'dependency is not installed'})
+                    continue
+                timings = cls.measure(function, repeat)
+                results.append({
+                    'name': name,
+                    'rows': rows,
+                    'repeat': repeat,
+                    'min_seconds': min(timings),
+                    'median_seconds': statistics.median(timings),
+                    'mean_seconds': statistics.mean(timings),
+                    'rows_per_second': rows / min(timings) if min(timings) else None,
+                })
+                print(f'{name:<48}{rows:>10} rows {min(timings) * 1000:>12.3f} ms', file=sys.stderr)
+        return results
+
+    @staticmethod
+    def get_environment() -> Dict[str, Optional[Union[str, Dict[str, Optional[str]]]]]:
+        """Describe where results are measured, so results of different commits and machines can be told apart
+
+        Returns:
+            A dict of git commit, python version, platform, and benchmark config
+        """
+
+        try:
+            commit = subprocess.run(
+                ['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True
+            ).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            commit = None
+        return {
+            'created_at': datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds'),
+            'commit': commit,
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'config': {name: os.environ.get(name) for name in BENCHMARK_CONFIG_VARIABLES},
+        }
+
+    @staticmethod
+    def compare(
+            baseline: List[BenchmarkResult], results: List[BenchmarkResult], max_slowdown: float
+    ) -> List[BenchmarkResult]:
+        """Compare results with baseline results, e.g. results of the previous commit. Fastest runs are compared,
+        because they are the least affected by other processes of the machine.
+
+        Args:
+            baseline: A list of baseline results
+            results: A list of new results
+            max_slowdown (float): a benchmark is regressed if it is slower than this ratio, e.g. 0.2 is 20% slower
+
+        Returns:
+            A list of regressed benchmarks that contains name, number of crimes, and both timings in a dict
+        """
+
+        baseline_timings = {
+            (item['name'], item['rows']): item['min_seconds'] for item in baseline if 'min_seconds' in item
+        }
+        regressions = []
+        for item in results:
+            baseline_seconds = baseline_timings.get((item['name'], item['rows']))
+            if baseline_seconds is None or 'min_seconds' not in item:
+                continue
+            if item['min_seconds'] > baseline_seconds * (1 + max_slowdown):
+                regressions.append({
+                    'name': item['name'],
+                    'rows': item['rows'],
+                    'baseline_seconds': baseline_seconds,
+                    'min_seconds': item['min_seconds'],
+                    'slowdown': item['min_seconds'] / baseline_seconds - 1,
+                })
+        return regressions
+
+
+def main(arguments: Optional[List[str]] = None) -> int:
+    """Run benchmarks from command line, results are printed or saved as JSON
+
+    Args:
+        arguments: A list of command line arguments, None means `sys.argv`
+
+    Returns:
+        Exit code of process, 1 if a benchmark is regressed compared to baseline
+    """
+
+    parser = argparse.ArgumentParser(description='Measure caching, serializing, and converting crimes data')
+    parser.add_argument('--rows', default='2000,100000,1000000', help='comma separated numbers of crimes')
+    parser.add_argument('--repeat', type=int, default=5, help='number of measured runs of each benchmark')
+    parser.add_argument('--only', default=None, help='comma separated names of benchmarks to run')
+    parser.add_argument('--redis-url', default=None, help='url of a scratch redis database, default is fakeredis')
+    parser.add_argument('--output', default=None, help='path of JSON results, default is stdout')
+    parser.add_argument('--baseline', default=None, help='path of JSON results to compare with')
+    parser.add_argument('--max-slowdown', type=float, default=0.2, help='allowed slowdown ratio compared to baseline')
+    arguments = parser.parse_args(arguments)
+
+    CrimesBenchmarks.use_redis(arguments.redis_url)
+    results = CrimesBenchmarks.run(
+        [int(item) for item in arguments.rows.split(',')], arguments.repeat,
+        arguments.only.split(',') if arguments.only else None
+    )
+    report = {**CrimesBenchmarks.get_environment(), 'results': results}
+    if arguments.output:
+        with open(arguments.output, 'w') as output_file:
+            json.dump(report, output_file, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+
+    if arguments.baseline:
+        with open(arguments.baseline) as baseline_file:
+            regressions = CrimesBenchmarks.compare(
+                json.load(baseline_file)['results'], results, arguments.max_slowdown
+            )
+        for item in regressions:
+            print(
+                f'REGRESSION {item["name"]} {item["rows"]} rows: {item["baseline_seconds"] * 1000:.3f} ms -> '
+                f'{item["min_seconds"] * 1000:.3f} ms ({item["slowdown"]:+.0%})', file=sys.stderr
+            )
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
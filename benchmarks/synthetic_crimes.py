@@ -0,0 +1,80 @@
+import datetime
+from typing import Tuple
+
+import numpy as np
+import pyarrow
+
+from celery_app.crimes_codec import CrimesColumns
+
+
+class SyntheticCrimes:
+    """A class to generate random crimes that look like Chicago crimes dataset, crimes are clustered around
+    a few hotspots inside the city and sorted based on date in descending order like crimes data backends,
+    so benchmarks don't need BigQuery"""
+
+    # bounding box of Chicago city as (south, west, north, east)
+    city_bbox: Tuple[float, float, float, float] = (41.644, -87.940, 42.023, -87.524)
+    # (latitude, longitude, spread in degrees) of crime hotspots, e.g. the Loop, West Side, and South Side
+    __hotspots = (
+        (41.8781, -87.6298, 0.015),
+        (41.8810, -87.7200, 0.030),
+        (41.7800, -87.6400, 0.035),
+        (41.9650, -87.6700, 0.025),
+        (41.7100, -87.6200, 0.030),
+    )
+    # share of crimes that are not around a hotspot
+    __background_fraction = 0.2
+
+    @classmethod
+    def generate_columns(
+            cls, rows: int, seed: int = 0, years: int = 20, last_date: datetime.date = datetime.date(2023, 1, 1)
+    ) -> CrimesColumns:
+        """Generate random crimes
+
+        Args:
+            rows (int): number of crimes
+            seed (int): seed of random generator, the same seed generates the same crimes
+            years (int): crimes are spread over this many years before last date
+            last_date: date of the latest crime
+
+        Returns:
+            A CrimesColumns object, which is sorted based on crime date in descending order
+        """
+
+        random = np.random.default_rng(seed)
+        south, west, north, east = cls.city_bbox
+        hotspots = np.array(cls.__hotspots)
+        hotspot_indexes = random.integers(0, len(hotspots), size=rows)
+        lat = random.normal(hotspots[hotspot_indexes, 0], hotspots[hotspot_indexes, 2])
+        lon = random.normal(hotspots[hotspot_indexes, 1], hotspots[hotspot_indexes, 2])
+        is_background = random.random(rows) < cls.__background_fraction
+        lat[is_background] = random.uniform(south, north, size=int(is_background.sum()))
+        lon[is_background] = random.uniform(west, east, size=int(is_background.sum()))
+        # BigQuery returns locations with 9 decimal digits
+        lat = np.round(np.clip(lat, south, north), 9)
+        lon = np.round(np.clip(lon, west, east), 9)
+        last_day = CrimesColumns.to_day(last_date)
+        days = np.sort(random.integers(last_day - years * 365, last_day + 1, size=rows))[::-1].astype(np.int64)
+        return CrimesColumns(lat=lat, lon=lon, days=days)
+
+    @classmethod
+    def generate_arrow_table(cls, rows: int, seed: int = 0, null_fraction: float = 0.01) -> pyarrow.Table:
+        """Generate random crimes as an Arrow table with the same columns as BigQuery query result,
+        some crimes don't have location like BigQuery dataset
+
+        Args:
+            rows (int): number of crimes
+            seed (int): seed of random generator, the same seed generates the same crimes
+            null_fraction (float): share of crimes without latitude and longitude
+
+        Returns:
+            An Arrow table with latitude, longitude, and crime_date columns
+        """
+
+        crimes = cls.generate_columns(rows, seed)
+        is_null = np.random.default_rng(seed + 1).random(rows) < null_fraction
+        return pyarrow.table({
+            'latitude': pyarrow.array(crimes.lat, mask=is_null),
+            'longitude': pyarrow.array(crimes.lon, mask=is_null),
+            'crime_date': pyarrow.array(crimes.days.astype(np.int32)).cast(pyarrow.date32()),
+        })
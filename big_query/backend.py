@@ -0,0 +1,189 @@
+import os
+from abc import ABC, abstractmethod
+from typing import List, Dict, Tuple, Union, Iterable, Iterator, Optional
+
+from dotenv import load_dotenv
+
+from celery_app.crimes_codec import CrimesColumns
+
+# loading environment variables which are defined in .env file
+load_dotenv()
+crimes_backend_name = os.environ.get('CRIMES_BACKEND', 'bigquery')
+# number of latest crimes that are cached for each primary type, 0 means full history
+crimes_row_limit = int(os.environ.get('CRIMES_ROW_LIMIT', 2000))
+
+
+class CrimesDataBackend(ABC):
+    """An interface for classes that provide Chicago crimes data, every data source
+    (e.g. Google BigQuery or a local database) must implement this interface"""
+
+    class QueryError(Exception):
+        """An Exception class to raise when data source returns error on query"""
+        pass
+
+    class QueryTimeoutError(Exception):
+        """An Exception class to raise when data source doesn't response in given time"""
+        pass
+
+    # number of latest crimes that are fetched for each primary type, 0 means all crimes
+    crimes_limit = crimes_row_limit
+
+    @abstractmethod
+    def query_crimes_by_primary_type(self, primary_type: str) -> List[Dict[str, Union[float, str]]]:
+        """Fetches data for crime of given primary type.
+        Data is sorted based on crime date and limited to `crimes_limit` datapoints.
+
+        Args:
+            primary_type (str): Crime primary type
+
+        Returns:
+            A list of crimes that contains crime location and date in a dict.
+
+        Raises:
+            CrimesDataBackend.QueryError
+            CrimesDataBackend.QueryTimeoutError
+        """
+
+    def query_crimes_columns_by_primary_type(self, primary_type: str) -> CrimesColumns:
+        """Fetches data for crime of given primary type in the cache format.
+        Backends should override this method to convert query result to columns without creating row dicts,
+        by default it converts `query_crimes_by_primary_type` result.
+
+        Args:
+            primary_type (str): Crime primary type
+
+        Returns:
+            A CrimesColumns object, which is sorted based on crime date and limited to `crimes_limit` datapoints
+
+        Raises:
+            CrimesDataBackend.QueryError
+            CrimesDataBackend.QueryTimeoutError
+        """
+        return CrimesColumns.from_records(self.query_crimes_by_primary_type(primary_type))
+
+    def query_latest_crimes_columns_of_primary_types(self, primary_types: Iterable[str]) -> Dict[str, CrimesColumns]:
+        """Fetches latest crimes data of all given primary types in the cache format.
+        Backends should override this method to convert query result to columns without creating row dicts,
+        by default it converts `query_latest_crimes_of_primary_types` result.
+
+        Args:
+            primary_types: An iterable of crimes primary types
+
+        Returns:
+            A dict that maps each primary type to a CrimesColumns object of its crimes
+
+        Raises:
+            CrimesDataBackend.QueryError
+            CrimesDataBackend.QueryTimeoutError
+        """
+        return {
+            primary_type: CrimesColumns.from_records(crimes)
+            for primary_type, crimes in self.query_latest_crimes_of_primary_types(primary_types).items()
+        }
+
+    def iter_crimes_by_primary_type(
+            self, primary_type: str, chunk_size: int, limit: Optional[int] = None
+    ) -> Iterator[List[Dict[str, Union[float, str]]]]:
+        """Fetches crimes of given primary type chunk by chunk, so large results (e.g. full history of a type)
+        are never kept in memory at once. Backends should override this method to page through query results,
+        by default it fetches crimes with `query_crimes_by_primary_type` and splits them.
+
+        Args:
+            primary_type (str): Crime primary type
+            chunk_size (int): maximum number of crimes in each chunk
+            limit (int): maximum number of crimes, 0 means all crimes, default is `crimes_limit`
+
+        Returns:
+            An iterator of crimes lists, crimes are sorted based on crime date across chunks
+
+        Raises:
+            CrimesDataBackend.QueryError
+            CrimesDataBackend.QueryTimeoutError
+        """
+        crimes = self.query_crimes_by_primary_type(primary_type)
+        if limit:
+            crimes = crimes[:limit]
+        for index in range(0, len(crimes), chunk_size):
+            yield crimes[index:index + chunk_size]
+
+    def query_latest_crimes_of_primary_types(
+            self, primary_types: Iterable[str]
+    ) -> Dict[str, List[Dict[str, Union[float, str]]]]:
+        """Fetches latest crimes data of all given primary types.
+        Backends should override this method to fetch data of all primary types in one query,
+        by default it queries crimes data of primary types one by one.
+
+        Args:
+            primary_types: An iterable of crimes primary types
+
+        Returns:
+            A dict that maps each primary type to a list of its crimes, crimes are in the same format as
+            `query_crimes_by_primary_type` result
+
+        Raises:
+            CrimesDataBackend.QueryError
+            CrimesDataBackend.QueryTimeoutError
+        """
+        return {primary_type: self.query_crimes_by_primary_type(primary_type) for primary_type in primary_types}
+
+    def query_crimes_of_primary_types_since(
+            self, watermarks: Dict[str, str]
+    ) -> Dict[str, List[Dict[str, Union[float, str]]]]:
+        """Fetches crimes of given primary types that happened on or after the watermark date of their type.
+        Backends should override this method to scan only new crimes, by default it fetches latest crimes
+        of primary types and filters them.
+
+        Args:
+            watermarks: A dict that maps each primary type to its latest cached crime date, e.g. "2023-01-05"
+
+        Returns:
+            A dict that maps each primary type to a list of its new crimes, which is sorted based on crime date
+            and limited to 2000 datapoints
+
+        Raises:
+            CrimesDataBackend.QueryError
+            CrimesDataBackend.QueryTimeoutError
+        """
+        crimes_of_primary_types = self.query_latest_crimes_of_primary_types(watermarks.keys())
+        return {
+            primary_type: [item for item in crimes if item['date'] >= watermarks[primary_type]]
+            for primary_type, crimes in crimes_of_primary_types.items()
+        }
+
+    @abstractmethod
+    def query_crimes_primary_types(self) -> Tuple[str]:
+        """Returns a tuple of distinct crimes primary type
+
+        Returns:
+             A tuple containing distinct strings of primary types
+
+        Raises:
+            CrimesDataBackend.QueryError
+            CrimesDataBackend.QueryTimeoutError
+        """
+
+    def warm_up(self):
+        """Prepares connections of the backend when a worker process starts, so first query of the worker
+        doesn't wait for them. Backends that need a slow setup should override this method, by default it does nothing
+
+        Raises:
+            CrimesDataBackend.QueryError
+        """
+
+    @staticmethod
+    def get_backend() -> 'CrimesDataBackend':
+        """Instantiate the crimes data backend that is selected by `CRIMES_BACKEND` environment variable,
+        it can be "bigquery"(default) or "local".
+
+        Returns:
+            An object that implements CrimesDataBackend interface
+        """
+
+        # backends are imported here, so we don't import Google Cloud packages when we are using local backend
+        if crimes_backend_name == 'local':
+            from big_query.local_crimes import LocalCrimesManager
+            return LocalCrimesManager()
+        if crimes_backend_name == 'bigquery':
+            from big_query.crimes import BigQueryManager
+            return BigQueryManager()
+        raise ValueError(f'Unknown crimes backend: {crimes_backend_name}')
@@ -1,28 +1,196 @@
-from typing import List, Dict, Tuple, Set, Union
+import datetime
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import List, Dict, Tuple, Set, Union, Iterable, Iterator, Optional
 
+import numpy as np
+import pyarrow
+from dotenv import load_dotenv
+from google.api_core.exceptions import Conflict
 from google.cloud import bigquery
 from google.cloud.exceptions import GoogleCloudError, GatewayTimeout
 
+from big_query.backend import CrimesDataBackend
+from big_query.query_cache import QueryResultCache
+from celery_app.crimes_codec import CrimesColumns
+from utilities.metrics_utils import MetricsUtils
 
-class BigQueryManager:
+# loading environment variables which are defined in .env file
+load_dotenv()
+# query results are downloaded with BigQuery Storage Read API, "google-cloud-bigquery-storage" package is required
+bigquery_storage_api = os.environ.get('BIGQUERY_STORAGE_API', 'false').lower() == 'true'
+# identical queries share one BigQuery job and reuse its result for this many seconds, 0 disables reusing results
+bigquery_result_cache_seconds = int(os.environ.get('BIGQUERY_RESULT_CACHE_SECONDS', 60))
+# queries that would scan more bytes than this fail instead of being billed, 0 disables the limit
+bigquery_maximum_bytes_billed = int(os.environ.get('BIGQUERY_MAXIMUM_BYTES_BILLED', 10 * 1024 ** 3))
+
+QueryParameters = List[Union[bigquery.ScalarQueryParameter, bigquery.ArrayQueryParameter]]
+
+
+class BigQueryManager(CrimesDataBackend):
     """A manager class to query data from Google BigQuery dataset"""
 
-    class GoogleCloudQueryError(Exception):
+    class GoogleCloudQueryError(CrimesDataBackend.QueryError):
         """An Exception class to raise when Google returns error on query"""
         pass
 
-    class QueryTimeoutError(Exception):
-        """An Exception class to raise when Google doesn't response in given time"""
-        pass
+    # keeps the latest `crimes_limit` crimes of each primary type in queries that select several primary types
+    __latest_crimes_filter = 'QUALIFY ROW_NUMBER() OVER (PARTITION BY primary_type ORDER BY date DESC) <= @crimes_limit'
 
-    def __init__(self):
-        """Initialize BigQuery client and set timeout for it"""
-        self.client = bigquery.Client()
+    # one BigQuery client is shared by all managers of a process, creating a client loads credentials and
+    # creates an auth session, which is too slow to do on every task run or cache miss
+    __client: Optional[bigquery.Client] = None
+    # forked processes(gunicorn and celery workers) must not use client of their parent process
+    __client_pid: Optional[int] = None
+    __client_lock = threading.Lock()
+    __query_results = QueryResultCache(ttl_seconds=bigquery_result_cache_seconds)
+
+    def __init__(self, client: Optional[bigquery.Client] = None, query_results: Optional[QueryResultCache] = None):
+        """Use the shared BigQuery client of current process and set timeout for it
+
+        Args:
+            client: A BigQuery client that is used instead of the shared client, e.g. a stub client in benchmarks
+            query_results: A cache of query results that is used instead of the shared cache of current process
+        """
+        self.client = self.get_client() if client is None else client
+        self.query_results = self.__query_results if query_results is None else query_results
         self.query_timeout = 60
 
+    @classmethod
+    def get_client(cls) -> bigquery.Client:
+        """Returns BigQuery client of current process, the client is created once in each process
+
+        Returns:
+            A BigQuery client object
+        """
+
+        if cls.__client is None or cls.__client_pid != os.getpid():
+            with cls.__client_lock:
+                if cls.__client is None or cls.__client_pid != os.getpid():
+                    cls.__client = bigquery.Client()
+                    cls.__client_pid = os.getpid()
+        return cls.__client
+
+    def warm_up(self):
+        """Authenticates BigQuery client and opens its connection by reading crimes table metadata,
+        metadata requests are free, so first query of the process doesn't wait for them
+
+        Raises:
+            BigQueryManager.GoogleCloudQueryError
+        """
+        try:
+            self.client.get_table('bigquery-public-data.chicago_crime.crime', timeout=self.query_timeout)
+        except GoogleCloudError:
+            raise BigQueryManager.GoogleCloudQueryError
+
+    @staticmethod
+    def __job_config(query_parameters: QueryParameters) -> bigquery.QueryJobConfig:
+        """Create config of a query job, queries are limited by `BIGQUERY_MAXIMUM_BYTES_BILLED`"""
+        return bigquery.QueryJobConfig(
+            query_parameters=query_parameters, maximum_bytes_billed=bigquery_maximum_bytes_billed or None
+        )
+
+    @staticmethod
+    def __record_job_metrics(query_job: bigquery.QueryJob):
+        """Count a finished query job and bytes that it processed and billed"""
+        MetricsUtils.bigquery_jobs.labels(cache_hit=str(bool(query_job.cache_hit)).lower()).inc()
+        MetricsUtils.bigquery_bytes_processed.inc(query_job.total_bytes_processed or 0)
+        MetricsUtils.bigquery_bytes_billed.inc(query_job.total_bytes_billed or 0)
+
+    def __query_arrow(
+            self, query_expression: str, query_parameters: QueryParameters
+    ) -> pyarrow.Table:
+        """Runs a query and downloads its result as an Arrow table. Identical queries(same expression and
+        parameters) of this process share one job and reuse its result for `BIGQUERY_RESULT_CACHE_SECONDS`,
+        job id is derived from the query, so other processes reuse the same job in this time too.
+
+        Args:
+            query_expression (str): A query expression
+            query_parameters: A list of BigQuery query parameters
+
+        Returns:
+            An Arrow table of query result
+
+        Raises:
+            BigQueryManager.GoogleCloudQueryError
+            BigQueryManager.QueryTimeoutError
+        """
+
+        query_key = hashlib.blake2b(
+            json.dumps([query_expression, [item.to_api_repr() for item in query_parameters]], sort_keys=True).encode(),
+            digest_size=16
+        ).hexdigest()
+
+        def run_query() -> pyarrow.Table:
+            job_id = None
+            if bigquery_result_cache_seconds:
+                job_id = f'chicago_crimes_{query_key}_{int(time.time() // bigquery_result_cache_seconds)}'
+            start_time, outcome = time.perf_counter(), 'error'
+            try:
+                try:
+                    query_job = self.client.query(
+                        query=query_expression, timeout=self.query_timeout,
+                        job_config=self.__job_config(query_parameters), job_id=job_id
+                    )
+                except Conflict:
+                    # another process has already started the same query, so we wait for its job
+                    query_job = self.client.get_job(job_id, timeout=self.query_timeout)
+                    if query_job.error_result:
+                        # the existing job has failed, its id can't be reused, so the query runs again in a new job
+                        # with a random id, otherwise queries fail until the next `BIGQUERY_RESULT_CACHE_SECONDS`
+                        query_job = self.client.query(
+                            query=query_expression, timeout=self.query_timeout,
+                            job_config=self.__job_config(query_parameters), job_id_prefix=f'{job_id}_'
+                        )
+                query_response = query_job.result().to_arrow(create_bqstorage_client=bigquery_storage_api)
+                outcome = 'success'
+                self.__record_job_metrics(query_job)
+                return query_response
+            except GatewayTimeout:
+                outcome = 'timeout'
+                raise BigQueryManager.QueryTimeoutError
+            except GoogleCloudError:
+                raise BigQueryManager.GoogleCloudQueryError
+            finally:
+                MetricsUtils.bigquery_query_seconds.labels(outcome=outcome).observe(time.perf_counter() - start_time)
+
+        return self.query_results.get_or_run(query_key, run_query)
+
+    @staticmethod
+    def __split_crimes_by_primary_type(
+            query_response: pyarrow.Table, primary_types: Iterable[str]
+    ) -> Dict[str, CrimesColumns]:
+        """Split crimes of a query result that selects several primary types, rows of each primary type are
+        not sorted in query result, so we sort them like the single primary type query, then crimes of each
+        primary type are a slice of the sorted table
+
+        Args:
+            query_response: An Arrow table with primary_type, latitude, longitude, and crime_date columns
+            primary_types: An iterable of selected primary types
+
+        Returns:
+            A dict that maps each primary type to a CrimesColumns object of its crimes
+        """
+
+        query_response = query_response.sort_by([('primary_type', 'ascending'), ('crime_date', 'descending')])
+        result_primary_types = query_response.column('primary_type').to_numpy(zero_copy_only=False)
+        unique_primary_types, first_rows = np.unique(result_primary_types, return_index=True)
+        last_rows = [*first_rows[1:].tolist(), len(result_primary_types)]
+        crimes_of_primary_types = {
+            primary_type: CrimesColumns.from_arrow(query_response.slice(first_row, last_row - first_row))
+            for primary_type, first_row, last_row in zip(unique_primary_types.tolist(), first_rows.tolist(), last_rows)
+        }
+        return {
+            primary_type: crimes_of_primary_types.get(primary_type, CrimesColumns.from_records([]))
+            for primary_type in primary_types
+        }
+
     def query_crimes_by_primary_type(self, primary_type: str) -> List[Dict[str, Union[float, str]]]:
         """Fetches data for crime of given primary type.
-        Data is sorted based on crime date and limited to 2000 datapoints.
+        Data is sorted based on crime date and limited to `crimes_limit` datapoints.
 
         Args:
             primary_type (str): Crime primary type
@@ -30,13 +198,29 @@ class BigQueryManager:
         Returns:
             A list of crimes that contains crime location and date in a dict.
 
+        Raises:
+            BigQueryManager.GoogleCloudQueryError
+            BigQueryManager.QueryTimeoutError
+        """
+        return self.query_crimes_columns_by_primary_type(primary_type).to_records()
+
+    def query_crimes_columns_by_primary_type(self, primary_type: str) -> CrimesColumns:
+        """Fetches data for crime of given primary type, query result is downloaded as an Arrow table
+        and converted to the cache format without creating Python objects for each row.
+
+        Args:
+            primary_type (str): Crime primary type
+
+        Returns:
+            A CrimesColumns object, which is sorted based on crime date and limited to `crimes_limit` datapoints
+
         Raises:
             BigQueryManager.GoogleCloudQueryError
             BigQueryManager.QueryTimeoutError
         """
 
         # a query expression that selects distinct latitude, longitude, and crime date, which is ordered by crimes
-        # date and limited to 2000 datapoints.
+        # date and limited to `crimes_limit` datapoints.
         # IMPORTANT CHANGE: We shouldn't group data here, because we may lose some crimes data, so "GROUP BY"
         # here acts like "DISTINCT", so we must remove "GROUP BY" from the query
         query_expression = (
@@ -44,20 +228,58 @@ class BigQueryManager:
             f'FROM `bigquery-public-data.chicago_crime.crime` '
             f'WHERE primary_type=@primary_type '
             # f'GROUP BY latitude, longitude, crime_date '
-            f'ORDER BY crime_date DESC LIMIT 2000'
+            f'ORDER BY crime_date DESC'
         )
+        if self.crimes_limit:
+            query_expression += f' LIMIT {self.crimes_limit}'
+
+        # because of primary_type variable in query, we use query parameters to prevent SQL injection
+        query_parameters = [bigquery.ScalarQueryParameter("primary_type", "STRING", primary_type)]
+        # query the data from BigQuery public dataset
+        query_response = self.__query_arrow(query_expression, query_parameters)
+
+        # there some null datapoints in query result, they are skipped while converting the result
+        return CrimesColumns.from_arrow(query_response)
+
+    def iter_crimes_by_primary_type(
+            self, primary_type: str, chunk_size: int, limit: Optional[int] = None
+    ) -> Iterator[List[Dict[str, Union[float, str]]]]:
+        """Fetches crimes of given primary type page by page, each result page is yielded as a chunk,
+        so only one page of rows is kept in memory.
 
-        # because of primary_type variable in query, we use QueryJobConfig to prevent SQL injection
-        job_config = bigquery.QueryJobConfig(
-            query_parameters=[
-                bigquery.ScalarQueryParameter("primary_type", "STRING", primary_type)
-            ]
+        Args:
+            primary_type (str): Crime primary type
+            chunk_size (int): maximum number of crimes in each chunk, it is used as result page size
+            limit (int): maximum number of crimes, 0 means all crimes, default is `crimes_limit`
+
+        Returns:
+            An iterator of crimes lists, crimes are sorted based on crime date across chunks
+
+        Raises:
+            BigQueryManager.GoogleCloudQueryError
+            BigQueryManager.QueryTimeoutError
+        """
+
+        limit = self.crimes_limit if limit is None else limit
+        query_expression = (
+            'SELECT latitude, longitude, DATE(date) AS crime_date '
+            'FROM `bigquery-public-data.chicago_crime.crime` '
+            'WHERE primary_type=@primary_type AND latitude IS NOT NULL AND longitude IS NOT NULL '
+            'ORDER BY crime_date DESC'
         )
+        if limit:
+            query_expression += f' LIMIT {int(limit)}'
+        job_config = self.__job_config([bigquery.ScalarQueryParameter("primary_type", "STRING", primary_type)])
 
         try:
-            # query the data from BigQuery public dataset
             query_job = self.client.query(query=query_expression, timeout=self.query_timeout, job_config=job_config)
-            query_response = query_job.result()
+            # each page is downloaded only when the previous one is consumed
+            for page in query_job.result(page_size=chunk_size).pages:
+                yield [
+                    {'lat': item[0], 'lon': item[1], 'date': item[2].strftime('%Y-%m-%d')}
+                    for item in page if item[0] and item[1] and item[2]
+                ]
+            self.__record_job_metrics(query_job)
         except GoogleCloudError:
             raise BigQueryManager.GoogleCloudQueryError
         except GatewayTimeout:
@@ -65,17 +287,102 @@ class BigQueryManager:
         except Exception as ex:
             raise ex
 
-        # create a list of crimes that contains crime latitude, longitude, and crime date
-        # there some null datapoints in query result, we skip them when creating the crimes data
-        fetched_crimes_locations: List[Dict[str, float]] = [
-            {
-                'lat': item[0],
-                'lon': item[1],
-                'date': item[2].strftime('%Y-%m-%d')
-            } for item in query_response if item[0] and item[1] and item[2]
+    def query_latest_crimes_of_primary_types(
+            self, primary_types: Iterable[str]
+    ) -> Dict[str, List[Dict[str, Union[float, str]]]]:
+        """Fetches latest crimes data of all given primary types in one query.
+        Data of each primary type is sorted based on crime date and limited to `crimes_limit` datapoints.
+
+        Args:
+            primary_types: An iterable of crimes primary types
+
+        Returns:
+            A dict that maps each primary type to a list of its crimes
+
+        Raises:
+            BigQueryManager.GoogleCloudQueryError
+            BigQueryManager.QueryTimeoutError
+        """
+        return {
+            primary_type: crimes.to_records()
+            for primary_type, crimes in self.query_latest_crimes_columns_of_primary_types(primary_types).items()
+        }
+
+    def query_latest_crimes_columns_of_primary_types(self, primary_types: Iterable[str]) -> Dict[str, CrimesColumns]:
+        """Fetches latest crimes data of all given primary types in one query, query result is downloaded as
+        an Arrow table and split into primary types with array operations instead of a loop over rows.
+
+        Args:
+            primary_types: An iterable of crimes primary types
+
+        Returns:
+            A dict that maps each primary type to a CrimesColumns object of its crimes
+
+        Raises:
+            BigQueryManager.GoogleCloudQueryError
+            BigQueryManager.QueryTimeoutError
+        """
+
+        # instead of scanning the crimes table once for each primary type, we number crimes of each primary type
+        # based on their date and keep the latest ones, so the crimes table is scanned only one time
+        query_expression = (
+            'SELECT primary_type, latitude, longitude, DATE(date) AS crime_date '
+            'FROM `bigquery-public-data.chicago_crime.crime` '
+            'WHERE primary_type IN UNNEST(@primary_types) '
+        )
+        # when crimes are not limited, all crimes of primary types are selected
+        if self.crimes_limit:
+            query_expression += self.__latest_crimes_filter
+
+        primary_types = list(primary_types)
+        query_parameters = [
+            bigquery.ArrayQueryParameter('primary_types', 'STRING', primary_types),
+            bigquery.ScalarQueryParameter('crimes_limit', 'INT64', self.crimes_limit)
+        ]
+        query_response = self.__query_arrow(query_expression, query_parameters)
+        return self.__split_crimes_by_primary_type(query_response, primary_types)
+
+    def query_crimes_of_primary_types_since(
+            self, watermarks: Dict[str, str]
+    ) -> Dict[str, List[Dict[str, Union[float, str]]]]:
+        """Fetches crimes of given primary types that happened on or after the watermark date of their type,
+        all primary types are fetched with one query that only selects crimes after the oldest watermark.
+
+        Args:
+            watermarks: A dict that maps each primary type to its latest cached crime date, e.g. "2023-01-05"
+
+        Returns:
+            A dict that maps each primary type to a list of its new crimes, which is sorted based on crime date
+            and limited to `crimes_limit` datapoints
+
+        Raises:
+            BigQueryManager.GoogleCloudQueryError
+            BigQueryManager.QueryTimeoutError
+        """
+
+        query_expression = (
+            'SELECT primary_type, latitude, longitude, DATE(date) AS crime_date '
+            'FROM `bigquery-public-data.chicago_crime.crime` '
+            'WHERE primary_type IN UNNEST(@primary_types) AND date >= TIMESTAMP(@since_date) '
+        )
+        if self.crimes_limit:
+            query_expression += self.__latest_crimes_filter
+
+        query_parameters = [
+            bigquery.ArrayQueryParameter('primary_types', 'STRING', list(watermarks.keys())),
+            bigquery.ScalarQueryParameter('since_date', 'DATE', min(watermarks.values())),
+            bigquery.ScalarQueryParameter('crimes_limit', 'INT64', self.crimes_limit)
         ]
+        query_response = self.__query_arrow(query_expression, query_parameters)
 
-        return fetched_crimes_locations
+        crimes_of_primary_types = self.__split_crimes_by_primary_type(query_response, watermarks.keys())
+        # query is filtered by the oldest watermark, so each primary type must be filtered by its own one
+        return {
+            primary_type: crimes[
+                :crimes.date_range_indexes(start_date=datetime.date.fromisoformat(watermarks[primary_type]))[1]
+            ].to_records()
+            for primary_type, crimes in crimes_of_primary_types.items()
+        }
 
     def query_crimes_primary_types(self) -> Tuple[str]:
         """Returns a tuple of distinct crimes primary type
@@ -94,21 +401,15 @@ class BigQueryManager:
             'FROM `bigquery-public-data.chicago_crime.crime`'
         )
 
-        try:
-            # query the data from BigQuery public dataset
-            query_job = self.client.query(query=query_expression, timeout=60)
-            query_response = query_job.result()
-        except GoogleCloudError:
-            raise BigQueryManager.GoogleCloudQueryError
-        except GatewayTimeout:
-            raise BigQueryManager.QueryTimeoutError
-        except Exception as ex:
-            raise ex
+        # query the data from BigQuery public dataset
+        query_response = self.__query_arrow(query_expression, [])
 
         # there is some duplicate values like: "NON - CRIMINAL" and "NON-CRIMINAL"
         # We should omit "NON - CRIMINAL" because there is only a few data points for this type,
         # and also we want unique crimes type, so we clear the text then convert crimes type to a set
-        primary_types: Set[str] = set([item[0].replace(' - ', '-') for item in query_response])
+        primary_types: Set[str] = set(
+            [item.replace(' - ', '-') for item in query_response.column(0).to_pylist()]
+        )
 
         # convert crimes type to tuple because later we want to query crimes based on these types,
         # so they must not be mutable
@@ -0,0 +1,319 @@
+import csv
+import datetime
+import os
+import sqlite3
+import sys
+from collections import defaultdict
+from typing import List, Dict, Tuple, Set, Union, Iterator, Optional, Iterable
+
+from dotenv import load_dotenv
+
+from big_query.backend import CrimesDataBackend
+
+# loading environment variables which are defined in .env file
+load_dotenv()
+local_crimes_db_path = os.environ.get('LOCAL_CRIMES_DB_PATH', 'chicago_crimes.sqlite3')
+
+
+class LocalCrimesManager(CrimesDataBackend):
+    """A manager class to query data from a local SQLite database, which is loaded from
+    a Chicago crimes extract, so we can run and test the application without Google BigQuery"""
+
+    # column names of the crimes extract, the first one is used by Chicago data portal CSV export,
+    # and the second one is used by BigQuery public dataset export
+    __extract_columns = (
+        {'primary_type': 'Primary Type', 'latitude': 'Latitude', 'longitude': 'Longitude', 'date': 'Date'},
+        {'primary_type': 'primary_type', 'latitude': 'latitude', 'longitude': 'longitude', 'date': 'date'},
+    )
+    # date formats of the crimes extract, Chicago data portal uses the first one and BigQuery uses the second one
+    __extract_date_formats = (
+        '%m/%d/%Y %I:%M:%S %p', '%Y-%m-%d %H:%M:%S %Z', '%Y-%m-%d %H:%M:%S', '%Y-%m-%dT%H:%M:%S', '%Y-%m-%d'
+    )
+
+    def __init__(self, db_path: Optional[str] = None):
+        """Set local database path and timeout for queries
+
+        Args:
+            db_path (str): Path of SQLite database, default is `LOCAL_CRIMES_DB_PATH` environment variable
+        """
+        self.db_path = db_path or local_crimes_db_path
+        self.query_timeout = 60
+
+    def __connect(self) -> sqlite3.Connection:
+        """Open a read-only connection to the local database
+
+        Returns:
+            A SQLite connection object
+
+        Raises:
+            CrimesDataBackend.QueryError
+        """
+
+        try:
+            return sqlite3.connect(f'file:{self.db_path}?mode=ro', uri=True, timeout=self.query_timeout)
+        except sqlite3.Error:
+            raise CrimesDataBackend.QueryError
+
+    @property
+    def __sqlite_limit(self) -> int:
+        """Returns `crimes_limit` as a SQLite limit, a negative limit means all rows in SQLite"""
+        return self.crimes_limit or -1
+
+    def query_crimes_by_primary_type(self, primary_type: str) -> List[Dict[str, Union[float, str]]]:
+        """Fetches data for crime of given primary type.
+        Data is sorted based on crime date and limited to `crimes_limit` datapoints.
+
+        Args:
+            primary_type (str): Crime primary type
+
+        Returns:
+            A list of crimes that contains crime location and date in a dict.
+
+        Raises:
+            CrimesDataBackend.QueryError
+        """
+
+        # same query as BigQuery backend, null datapoints are skipped by the database itself
+        query_expression = (
+            'SELECT latitude, longitude, crime_date '
+            'FROM crimes '
+            'WHERE primary_type=? AND latitude IS NOT NULL AND longitude IS NOT NULL AND crime_date IS NOT NULL '
+            'ORDER BY crime_date DESC LIMIT ?'
+        )
+
+        connection = self.__connect()
+        try:
+            query_response = connection.execute(query_expression, (primary_type, self.__sqlite_limit)).fetchall()
+        except sqlite3.Error:
+            raise CrimesDataBackend.QueryError
+        finally:
+            connection.close()
+
+        # dates are stored as ISO strings, so there is no need to convert them
+        return [{'lat': item[0], 'lon': item[1], 'date': item[2]} for item in query_response if item[0] and item[1]]
+
+    def iter_crimes_by_primary_type(
+            self, primary_type: str, chunk_size: int, limit: Optional[int] = None
+    ) -> Iterator[List[Dict[str, Union[float, str]]]]:
+        """Fetches crimes of given primary type chunk by chunk with a database cursor,
+        so only one chunk of rows is kept in memory.
+
+        Args:
+            primary_type (str): Crime primary type
+            chunk_size (int): maximum number of crimes in each chunk
+            limit (int): maximum number of crimes, 0 means all crimes, default is `crimes_limit`
+
+        Returns:
+            An iterator of crimes lists, crimes are sorted based on crime date across chunks
+
+        Raises:
+            CrimesDataBackend.QueryError
+        """
+
+        limit = self.crimes_limit if limit is None else limit
+        query_expression = (
+            'SELECT latitude, longitude, crime_date '
+            'FROM crimes '
+            'WHERE primary_type=? AND latitude IS NOT NULL AND longitude IS NOT NULL AND crime_date IS NOT NULL '
+            'ORDER BY crime_date DESC LIMIT ?'
+        )
+
+        connection = self.__connect()
+        try:
+            # a negative limit means all rows in SQLite
+            cursor = connection.execute(query_expression, (primary_type, limit or -1))
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    break
+                yield [{'lat': item[0], 'lon': item[1], 'date': item[2]} for item in rows if item[0] and item[1]]
+        except sqlite3.Error:
+            raise CrimesDataBackend.QueryError
+        finally:
+            connection.close()
+
+    def query_latest_crimes_of_primary_types(
+            self, primary_types: Iterable[str]
+    ) -> Dict[str, List[Dict[str, Union[float, str]]]]:
+        """Fetches latest crimes data of all given primary types in one query.
+        Data of each primary type is sorted based on crime date and limited to `crimes_limit` datapoints.
+
+        Args:
+            primary_types: An iterable of crimes primary types
+
+        Returns:
+            A dict that maps each primary type to a list of its crimes
+
+        Raises:
+            CrimesDataBackend.QueryError
+        """
+
+        primary_types = list(primary_types)
+        # same windowed query as BigQuery backend, SQLite doesn't support "QUALIFY", so we use a subquery
+        query_expression = (
+            'SELECT primary_type, latitude, longitude, crime_date FROM ('
+            'SELECT primary_type, latitude, longitude, crime_date, '
+            'ROW_NUMBER() OVER (PARTITION BY primary_type ORDER BY crime_date DESC) AS crime_number '
+            'FROM crimes '
+            'WHERE latitude IS NOT NULL AND longitude IS NOT NULL AND crime_date IS NOT NULL '
+            f'AND primary_type IN ({", ".join("?" * len(primary_types))})'
+            ') WHERE crime_number <= ? OR ? < 0 '
+            'ORDER BY primary_type, crime_date DESC'
+        )
+
+        crimes_of_primary_types: Dict[str, List[Dict[str, Union[float, str]]]] = defaultdict(list)
+        connection = self.__connect()
+        try:
+            query_params = (*primary_types, self.__sqlite_limit, self.__sqlite_limit)
+            for item in connection.execute(query_expression, query_params):
+                if item[1] and item[2]:
+                    crimes_of_primary_types[item[0]].append({'lat': item[1], 'lon': item[2], 'date': item[3]})
+        except sqlite3.Error:
+            raise CrimesDataBackend.QueryError
+        finally:
+            connection.close()
+
+        return {primary_type: crimes_of_primary_types[primary_type] for primary_type in primary_types}
+
+    def query_crimes_of_primary_types_since(
+            self, watermarks: Dict[str, str]
+    ) -> Dict[str, List[Dict[str, Union[float, str]]]]:
+        """Fetches crimes of given primary types that happened on or after the watermark date of their type.
+
+        Args:
+            watermarks: A dict that maps each primary type to its latest cached crime date, e.g. "2023-01-05"
+
+        Returns:
+            A dict that maps each primary type to a list of its new crimes, which is sorted based on crime date
+            and limited to `crimes_limit` datapoints
+
+        Raises:
+            CrimesDataBackend.QueryError
+        """
+
+        # each primary type is filtered by its own watermark, "crimes_type_date" index makes it a range scan
+        query_expression = (
+            'SELECT latitude, longitude, crime_date '
+            'FROM crimes '
+            'WHERE primary_type=? AND crime_date>=? AND latitude IS NOT NULL AND longitude IS NOT NULL '
+            'ORDER BY crime_date DESC LIMIT ?'
+        )
+
+        crimes_of_primary_types: Dict[str, List[Dict[str, Union[float, str]]]] = {}
+        connection = self.__connect()
+        try:
+            for primary_type, watermark in watermarks.items():
+                query_response = connection.execute(query_expression, (primary_type, watermark, self.__sqlite_limit))
+                crimes_of_primary_types[primary_type] = [
+                    {'lat': item[0], 'lon': item[1], 'date': item[2]} for item in query_response if item[0] and item[1]
+                ]
+        except sqlite3.Error:
+            raise CrimesDataBackend.QueryError
+        finally:
+            connection.close()
+
+        return crimes_of_primary_types
+
+    def query_crimes_primary_types(self) -> Tuple[str]:
+        """Returns a tuple of distinct crimes primary type
+
+        Returns:
+             A tuple containing distinct strings of primary types
+
+        Raises:
+            CrimesDataBackend.QueryError
+        """
+
+        connection = self.__connect()
+        try:
+            query_response = connection.execute('SELECT DISTINCT(primary_type) FROM crimes').fetchall()
+        except sqlite3.Error:
+            raise CrimesDataBackend.QueryError
+        finally:
+            connection.close()
+
+        # same as BigQuery backend, we merge duplicate values like: "NON - CRIMINAL" and "NON-CRIMINAL"
+        primary_types: Set[str] = set([item[0].replace(' - ', '-') for item in query_response])
+        return tuple(primary_types)
+
+    @classmethod
+    def __parse_date(cls, value: str) -> Optional[str]:
+        """Convert a date of crimes extract to an ISO date string
+
+        Args:
+            value (str): crime date in one of the supported extract formats
+
+        Returns:
+            A string in "%Y-%m-%d" format or None if date is empty or unknown
+        """
+
+        for date_format in cls.__extract_date_formats:
+            try:
+                return datetime.datetime.strptime(value, date_format).strftime('%Y-%m-%d')
+            except ValueError:
+                continue
+        return
+
+    @classmethod
+    def __read_extract(cls, extract_path: str) -> Iterator[Tuple[str, Optional[float], Optional[float], str]]:
+        """Read crimes rows from a CSV extract of Chicago crimes
+
+        Args:
+            extract_path (str): path of the CSV file
+
+        Returns:
+            An iterator of (primary type, latitude, longitude, date) tuples
+        """
+
+        with open(extract_path, newline='') as extract_file:
+            reader = csv.DictReader(extract_file)
+            columns = next(
+                (item for item in cls.__extract_columns if set(item.values()).issubset(reader.fieldnames or [])),
+                None
+            )
+            if columns is None:
+                raise ValueError(f'Unknown crimes extract columns: {reader.fieldnames}')
+            for row in reader:
+                crime_date = cls.__parse_date(row[columns['date']])
+                if not row[columns['primary_type']] or crime_date is None:
+                    continue
+                yield (
+                    row[columns['primary_type']],
+                    float(row[columns['latitude']]) if row[columns['latitude']] else None,
+                    float(row[columns['longitude']]) if row[columns['longitude']] else None,
+                    crime_date
+                )
+
+    @classmethod
+    def load_extract(cls, extract_path: str, db_path: Optional[str] = None) -> int:
+        """Create (or replace) the local crimes database from a CSV extract of Chicago crimes
+
+        Args:
+            extract_path (str): path of the CSV file
+            db_path (str): Path of SQLite database, default is `LOCAL_CRIMES_DB_PATH` environment variable
+
+        Returns:
+            Number of loaded crimes
+        """
+
+        connection = sqlite3.connect(db_path or local_crimes_db_path)
+        try:
+            with connection:
+                connection.execute('DROP TABLE IF EXISTS crimes')
+                connection.execute(
+                    'CREATE TABLE crimes (primary_type TEXT, latitude REAL, longitude REAL, crime_date TEXT)'
+                )
+                connection.executemany('INSERT INTO crimes VALUES (?, ?, ?, ?)', cls.__read_extract(extract_path))
+                # this index lets us answer "latest crimes of a type" queries without scanning the table
+                connection.execute('CREATE INDEX crimes_type_date ON crimes (primary_type, crime_date DESC)')
+            return connection.execute('SELECT COUNT(*) FROM crimes').fetchone()[0]
+        finally:
+            connection.close()
+
+
+if __name__ == '__main__':
+    # usage: python -m big_query.local_crimes path/to/chicago_crimes.csv [path/to/database.sqlite3]
+    if len(sys.argv) < 2:
+        sys.exit('usage: python -m big_query.local_crimes <crimes_extract.csv> [database_path]')
+    loaded_crimes = LocalCrimesManager.load_extract(*sys.argv[1:3])
+    print(f'{loaded_crimes} crimes loaded into local database')
@@ -0,0 +1,71 @@
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Hashable, Tuple
+
+
+class QueryResultCache:
+    """A thread-safe cache of query results with a short expiry time. Concurrent callers of the same query
+    wait for the running query instead of sending it again, and callers in the next seconds reuse its result"""
+
+    def __init__(self, ttl_seconds: float):
+        """Initialize an empty cache
+
+        Args:
+            ttl_seconds (float): seconds that each result is reused after query is finished, 0 disables reusing
+                results, but concurrent callers still share a running query
+        """
+        self.ttl_seconds = ttl_seconds
+        self.__results: Dict[Hashable, Tuple[Any, float]] = {}
+        self.__running: Dict[Hashable, Future] = {}
+        self.__lock = threading.Lock()
+
+    def get_or_run(self, key: Hashable, run_query: Callable[[], Any]) -> Any:
+        """Returns cached result of a query, or runs the query if it is not cached
+
+        Args:
+            key: A hashable key of the query, e.g. query expression and its parameters
+            run_query: A function that runs the query and returns its result
+
+        Returns:
+            Query result
+
+        Raises:
+            Any exception that is raised by `run_query`, it is raised for all concurrent callers
+        """
+
+        with self.__lock:
+            now = time.monotonic()
+            # expired results are dropped here, so the cache doesn't grow with old queries
+            for expired_key in [item for item, (_, expire_time) in self.__results.items() if expire_time < now]:
+                del self.__results[expired_key]
+            if key in self.__results:
+                return self.__results[key][0]
+            running_query = self.__running.get(key)
+            if running_query is None:
+                running_query = self.__running[key] = Future()
+                is_owner = True
+            else:
+                is_owner = False
+
+        if not is_owner:
+            return running_query.result()
+
+        try:
+            result = run_query()
+        except BaseException as ex:
+            with self.__lock:
+                del self.__running[key]
+            running_query.set_exception(ex)
+            raise
+        with self.__lock:
+            del self.__running[key]
+            if self.ttl_seconds:
+                self.__results[key] = (result, time.monotonic() + self.ttl_seconds)
+        running_query.set_result(result)
+        return result
+
+    def clear(self):
+        """Removes all cached results, running queries are not affected"""
+        with self.__lock:
+            self.__results.clear()
@@ -1,26 +1,84 @@
+import json
 import logging
 import os
 import pickle
-from typing import Optional, Tuple, List, Dict, Union
+import uuid
+from typing import Optional, Tuple, List, Dict, Set, Union
 
 import redis
+import redis.asyncio
+import redis.asyncio.client
+import redis.client
+import redis.lock
 from dotenv import load_dotenv
 
+from celery_app.crimes_codec import CrimesCodec, CrimesColumns
+from celery_app.prepared_responses import PreparedResponse
+from celery_app.spatial_index import CrimesSpatialIndex
 from utilities.log_utils import LogUtils
+from utilities.metrics_utils import MetricsUtils
+from utilities.profiling_utils import ProfilingUtils
 
 # loading environment variables which are defined in .env file
 load_dotenv()
 redis_host = os.environ.get('REDIS_HOST', 'localhost')
 redis_port = os.environ.get('REDIS_PORT', 6379)
 redis_db = os.environ.get('REDIS_DB', 0)
+# cached crimes are served as stale data after this many seconds, and they are refreshed in background
+crimes_cache_soft_ttl_seconds = int(os.environ.get('CRIMES_CACHE_SOFT_TTL_SECONDS', 90000))
+# old crimes chunks are kept for this many seconds after they are replaced, so running streams can finish
+crimes_chunks_retention_seconds = int(os.environ.get('CRIMES_CHUNKS_RETENTION_SECONDS', 3600))
+# old generations of cached crimes are kept for this many seconds after a new generation is published,
+# so running requests can finish reading them
+crimes_generation_retention_seconds = int(os.environ.get('CRIMES_GENERATION_RETENTION_SECONDS', 600))
+# cached crimes of cold primary types, which don't fit in memory budget, expire after this many seconds
+crimes_cold_ttl_seconds = int(os.environ.get('CRIMES_COLD_TTL_SECONDS', 21600))
 
 logger = LogUtils.get_logger(logger_name='cache_manager', level=logging.ERROR)
 
 
+class InstrumentedPipeline(redis.client.Pipeline):
+    """A redis pipeline that measures duration of sending its commands and reading their responses"""
+
+    def execute(self, raise_on_error: bool = True) -> list:
+        with ProfilingUtils.time_stage('redis', MetricsUtils.redis_command_seconds.labels(command='PIPELINE')):
+            return super().execute(raise_on_error)
+
+
+class InstrumentedRedis(redis.StrictRedis):
+    """A redis client that measures duration of each command, durations are exposed as Prometheus metrics"""
+
+    def execute_command(self, *args, **options):
+        with ProfilingUtils.time_stage('redis', MetricsUtils.redis_command_seconds.labels(command=args[0])):
+            return super().execute_command(*args, **options)
+
+    def pipeline(self, transaction: bool = True, shard_hint: Optional[str] = None) -> InstrumentedPipeline:
+        return InstrumentedPipeline(self.connection_pool, self.response_callbacks, transaction, shard_hint)
+
+
+class InstrumentedAsyncPipeline(redis.asyncio.client.Pipeline):
+    """An asyncio redis pipeline that measures duration of sending its commands and reading their responses"""
+
+    async def execute(self, raise_on_error: bool = True) -> list:
+        with ProfilingUtils.time_stage('redis', MetricsUtils.redis_command_seconds.labels(command='PIPELINE')):
+            return await super().execute(raise_on_error)
+
+
+class InstrumentedAsyncRedis(redis.asyncio.StrictRedis):
+    """An asyncio redis client that measures duration of each command like `InstrumentedRedis`"""
+
+    async def execute_command(self, *args, **options):
+        with ProfilingUtils.time_stage('redis', MetricsUtils.redis_command_seconds.labels(command=args[0])):
+            return await super().execute_command(*args, **options)
+
+    def pipeline(self, transaction: bool = True, shard_hint: Optional[str] = None) -> InstrumentedAsyncPipeline:
+        return InstrumentedAsyncPipeline(self.connection_pool, self.response_callbacks, transaction, shard_hint)
+
+
 class RedisUtils:
     """A class that instantiate a redis object to communicate with redis"""
 
-    __redis_client = redis.StrictRedis(
+    __redis_client = InstrumentedRedis(
         host=redis_host, port=redis_port, db=redis_db
     )
 
@@ -33,18 +91,83 @@ class RedisUtils:
         """
         return RedisUtils.__redis_client
 
+    @classmethod
+    def set_redis_client(cls, redis_client: redis.StrictRedis):
+        """Replaces redis object that all caches use, e.g. with a fakeredis object in tests and benchmarks
+
+        Args:
+            redis_client: An object to communicate(set and get) with redis
+        """
+        cls.__redis_client = redis_client
+
+
+class AsyncRedisUtils:
+    """A class that instantiate an asyncio redis object, it is used by ASGI application to read cache
+    without blocking its event loop"""
+
+    __redis_client = InstrumentedAsyncRedis(
+        host=redis_host, port=redis_port, db=redis_db
+    )
+
+    @staticmethod
+    def get_redis_client() -> redis.asyncio.StrictRedis:
+        """Returns instantiated asyncio redis objects
+
+        Returns:
+            An object to communicate(set and get) with redis in coroutines
+        """
+        return AsyncRedisUtils.__redis_client
+
+    @classmethod
+    def set_redis_client(cls, redis_client: redis.asyncio.StrictRedis):
+        """Replaces asyncio redis object that ASGI application uses, e.g. with a fakeredis object in tests
+
+        Args:
+            redis_client: An object to communicate(set and get) with redis in coroutines
+        """
+        cls.__redis_client = redis_client
+
 
 class CacheManager:
     """A class that simplify setting and getting data in/from redis"""
 
-    __crimes_primary_type_key = 'CrimesPrimaryType'
+    crimes_primary_type_key = 'CrimesPrimaryType'
+    __crimes_dataset_version_key = 'CrimesDatasetVersion'
+    # points to the generation of cached crimes data that is read by API workers
+    crimes_generation_pointer_key = 'CrimesCurrentGeneration'
+    __crimes_generation_counter_key = 'CrimesGenerationCounter'
+    __crimes_generation_prefix = 'CrimesGeneration_'
+    # keys of generations up to this one are already expired
+    __crimes_expired_generation_key = 'CrimesExpiredGeneration'
+    # sorted sets of number of requests and cache misses of each primary type
+    __crimes_requests_key = 'CrimesRequests'
+    __crimes_misses_key = 'CrimesMisses'
+    # decayed counters below this are removed, so primary types that are not requested anymore don't stay forever
+    __crimes_popularity_min_score = 0.01
+    # API workers subscribe to this channel to know when cached crimes data is refreshed
+    crimes_invalidation_channel = 'CrimesCacheInvalidation'
 
     @staticmethod
-    def crimes_by_primary_type_key_generator(primary_type: str) -> str:
+    def crimes_generation_key_generator(generation: int) -> str:
+        """Generates the namespace of a generation of cached crimes data, each full refresh writes crimes
+        of all primary types into a new generation
+
+        Args:
+            generation (int): A generation of cached crimes data
+
+        Returns:
+            A string that is unique to the generation
+        """
+        return f'{CacheManager.__crimes_generation_prefix}{generation}'
+
+    @staticmethod
+    def crimes_by_primary_type_key_generator(primary_type: str, generation: Optional[int] = None) -> str:
         """Generates a unique key based on given primary type
 
         Args:
             primary_type (str): A string of crime primary type
+            generation (int): A generation of cached crimes data, None generates a key that is shared by
+                all generations, e.g. for locks
 
         Returns:
             A string that is unique to crime primary type
@@ -52,7 +175,305 @@ class CacheManager:
 
         # remove spaces and replace dashes with underline to be a meaningful key
         primary_type = primary_type.replace(' ', '').replace('-', '_')
-        return f'CrimesByType_{primary_type}'
+        key = f'CrimesByType_{primary_type}'
+        # generation 0 is the cache of releases before generations, e.g. pickled crimes, its keys are not namespaced,
+        # so they are read until the first generation is published, then they expire like other old generations
+        if not generation:
+            return key
+        return f'{CacheManager.crimes_generation_key_generator(generation)}:{key}'
+
+    @staticmethod
+    def crimes_freshness_key_generator(primary_type: str, generation: int) -> str:
+        """Generates a key that exists while cached crimes of primary type are fresh
+
+        Args:
+            primary_type (str): A string of crime primary type
+            generation (int): A generation of cached crimes data
+
+        Returns:
+            A string that is unique to crime primary type
+        """
+        return f'{CacheManager.crimes_by_primary_type_key_generator(primary_type, generation)}:fresh'
+
+    @staticmethod
+    def crimes_aggregates_key_generator(primary_type: str, generation: int) -> str:
+        """Generates a key for aggregated crimes of primary type
+
+        Args:
+            primary_type (str): A string of crime primary type
+            generation (int): A generation of cached crimes data
+
+        Returns:
+            A string that is unique to crime primary type
+        """
+        return f'{CacheManager.crimes_by_primary_type_key_generator(primary_type, generation)}:aggregates'
+
+    @staticmethod
+    def crimes_statistics_key_generator(primary_type: str, generation: int) -> str:
+        """Generates a key for time series and summary statistics of crimes of primary type
+
+        Args:
+            primary_type (str): A string of crime primary type
+            generation (int): A generation of cached crimes data
+
+        Returns:
+            A string that is unique to crime primary type
+        """
+        return f'{CacheManager.crimes_by_primary_type_key_generator(primary_type, generation)}:statistics'
+
+    @staticmethod
+    def crimes_spatial_index_key_generator(primary_type: str, generation: int) -> str:
+        """Generates a key for spatial index of crimes of primary type
+
+        Args:
+            primary_type (str): A string of crime primary type
+            generation (int): A generation of cached crimes data
+
+        Returns:
+            A string that is unique to crime primary type
+        """
+        return f'{CacheManager.crimes_by_primary_type_key_generator(primary_type, generation)}:spatial_index'
+
+    @staticmethod
+    def crimes_response_key_generator(primary_type: str, generation: int) -> str:
+        """Generates a key for prepared API response of crimes of primary type
+
+        Args:
+            primary_type (str): A string of crime primary type
+            generation (int): A generation of cached crimes data
+
+        Returns:
+            A string that is unique to crime primary type
+        """
+        return f'{CacheManager.crimes_by_primary_type_key_generator(primary_type, generation)}:response'
+
+    @staticmethod
+    def __crimes_keys_of_primary_type(primary_type: str, generation: int) -> Tuple[str, ...]:
+        """Generates keys of cached crimes of primary type and data that is derived from them in a generation
+
+        Args:
+            primary_type (str): A string of crime primary type
+            generation (int): A generation of cached crimes data
+
+        Returns:
+            A tuple of keys
+        """
+        return (
+            CacheManager.crimes_by_primary_type_key_generator(primary_type, generation),
+            CacheManager.crimes_freshness_key_generator(primary_type, generation),
+            CacheManager.crimes_aggregates_key_generator(primary_type, generation),
+            CacheManager.crimes_statistics_key_generator(primary_type, generation),
+            CacheManager.crimes_spatial_index_key_generator(primary_type, generation),
+            CacheManager.crimes_response_key_generator(primary_type, generation)
+        )
+
+    @staticmethod
+    def crimes_watermarks_key_generator(generation: int) -> str:
+        """Generates a key for latest crime dates of primary types
+
+        Args:
+            generation (int): A generation of cached crimes data
+
+        Returns:
+            A string that is unique to the generation
+        """
+        return f'{CacheManager.crimes_generation_key_generator(generation)}:CrimesWatermarks'
+
+    @staticmethod
+    def crimes_primary_types_of_generation_key_generator(generation: int) -> str:
+        """Generates a key for the set of primary types whose crimes are written into a generation, so keys of
+        the generation are known when it expires
+
+        Args:
+            generation (int): A generation of cached crimes data
+
+        Returns:
+            A string that is unique to the generation
+        """
+        return f'{CacheManager.crimes_generation_key_generator(generation)}:CrimesPrimaryTypes'
+
+    @staticmethod
+    def crimes_chunks_key_generator(primary_type: str) -> str:
+        """Generates a key that points to the list of cached crimes chunks of primary type
+
+        Args:
+            primary_type (str): A string of crime primary type
+
+        Returns:
+            A string that is unique to crime primary type
+        """
+        return f'{CacheManager.crimes_by_primary_type_key_generator(primary_type)}:chunks'
+
+    @staticmethod
+    def new_crimes_chunks_key_generator(primary_type: str) -> str:
+        """Generates a new key for a list of crimes chunks of primary type, chunks are written to a new list
+        in each refresh, and the list is published when all chunks are written
+
+        Args:
+            primary_type (str): A string of crime primary type
+
+        Returns:
+            A string that is unique to crime primary type and the refresh
+        """
+        return f'{CacheManager.crimes_chunks_key_generator(primary_type)}:{uuid.uuid4().hex}'
+
+    @staticmethod
+    def crimes_cold_primary_types_key_generator(generation: int) -> str:
+        """Generates a key for the set of cold primary types of a generation, which don't fit in memory budget
+
+        Args:
+            generation (int): A generation of cached crimes data
+
+        Returns:
+            A string that is unique to the generation
+        """
+        return f'{CacheManager.crimes_generation_key_generator(generation)}:CrimesColdPrimaryTypes'
+
+    @staticmethod
+    def crimes_warm_up_status_key_generator(generation: int) -> str:
+        """Generates a key for status of the warm-up that writes crimes of all primary types into a generation
+
+        Args:
+            generation (int): A generation of cached crimes data
+
+        Returns:
+            A string that is unique to the generation
+        """
+        return f'{CacheManager.crimes_generation_key_generator(generation)}:CrimesWarmUpStatus'
+
+    @staticmethod
+    def __resolve_crimes_generation(redis_client: redis.StrictRedis, generation: Optional[int]) -> int:
+        """Returns given generation, or reads current generation of cached crimes data if it is None
+
+        Args:
+            redis_client: An object to communicate with redis
+            generation (int): A generation of cached crimes data or None
+
+        Returns:
+            A generation of cached crimes data, 0 if no generation is published yet
+        """
+        if generation is not None:
+            return generation
+        return int(redis_client.get(name=CacheManager.crimes_generation_pointer_key) or 0)
+
+    @staticmethod
+    def __get_crimes_cold_primary_types(redis_client: redis.StrictRedis, generation: int) -> Set[str]:
+        """Returns cold primary types of a generation, crimes of these primary types and data derived from them
+        are written with expiry time, so refreshing them in place doesn't make them persistent
+
+        Args:
+            redis_client: An object to communicate with redis
+            generation (int): A generation of cached crimes data
+
+        Returns:
+            A set of cold primary types, empty if cache policy has not run on the generation yet
+        """
+        cold_primary_types_key = CacheManager.crimes_cold_primary_types_key_generator(generation)
+        return {primary_type.decode() for primary_type in redis_client.smembers(name=cold_primary_types_key)}
+
+    @staticmethod
+    def get_crimes_generation() -> Optional[int]:
+        """Gets and returns the generation of cached crimes data that API workers read,
+        requests resolve it once and read all crimes data from that generation
+
+        Returns:
+            A generation of cached crimes data, 0 if no generation is published yet, or None if redis is not ready
+        """
+
+        try:
+            return CacheManager.__resolve_crimes_generation(RedisUtils.get_redis_client(), None)
+        except Exception:
+            logger.exception('Can not get crimes generation from cache, maybe redis is not ready')
+        return
+
+    @staticmethod
+    def new_crimes_generation() -> Optional[int]:
+        """Creates a new generation for a full refresh of cached crimes data, the refresh writes crimes
+        of all primary types into it, and publishes it by `set_crimes_generation` when all of them are written
+
+        Returns:
+            A new generation of cached crimes data, or None if redis is not ready
+        """
+
+        try:
+            redis_client = RedisUtils.get_redis_client()
+            return redis_client.incr(name=CacheManager.__crimes_generation_counter_key)
+        except Exception:
+            logger.exception('Can not create crimes generation, maybe redis is not ready')
+        return
+
+    @staticmethod
+    def set_crimes_generation(generation: int) -> bool:
+        """Publishes a generation of cached crimes data, so API workers read it from now on and drop their
+        local copies of old data. Old generations are removed after `CRIMES_GENERATION_RETENTION_SECONDS`.
+        A generation is not published if a newer one is already published, e.g. by a faster refresh.
+
+        Args:
+            generation (int): A generation that is created by `new_crimes_generation`
+
+        Returns:
+            A boolean value that shows generation is published or not
+        """
+
+        def set_generation(pipeline: redis.client.Pipeline):
+            # pointer is watched, so it is set only if no other refresh has changed it since we read it
+            if generation <= CacheManager.__resolve_crimes_generation(pipeline, None):
+                return
+            pipeline.multi()
+            pipeline.set(name=CacheManager.crimes_generation_pointer_key, value=generation)
+            pipeline.incr(name=CacheManager.__crimes_dataset_version_key)
+
+        try:
+            redis_client = RedisUtils.get_redis_client()
+            results = redis_client.transaction(set_generation, CacheManager.crimes_generation_pointer_key)
+            if results:
+                redis_client.publish(channel=CacheManager.crimes_invalidation_channel, message=results[1])
+            else:
+                logger.error(f'Crimes generation {generation} is not published, a newer generation is published')
+            CacheManager.__expire_old_crimes_generations(redis_client)
+            return bool(results)
+        except Exception:
+            logger.exception('Can not publish crimes generation, maybe redis is not ready')
+            return False
+
+    @staticmethod
+    def __expire_old_crimes_generations(redis_client: redis.StrictRedis):
+        """Sets expiry time of keys of generations that are older than current generation, including
+        generations of failed refreshes, their expiry time is not increased if it is already set.
+        Each generation is expired once, by the first publish of a newer generation.
+
+        Args:
+            redis_client: An object to communicate with redis
+        """
+
+        current_generation = CacheManager.__resolve_crimes_generation(redis_client, None)
+        expired_generation = int(redis_client.get(name=CacheManager.__crimes_expired_generation_key) or -1)
+        if expired_generation >= current_generation - 1:
+            return
+        # keys are generated from primary types of each generation instead of scanning the whole keyspace,
+        # generation 0 doesn't track its primary types, so cached primary types are expired too
+        crimes_primary_types = set(CacheManager.get_crimes_primary_types() or ())
+        pipeline = redis_client.pipeline(transaction=False)
+        for generation in range(expired_generation + 1, current_generation):
+            primary_types_key = CacheManager.crimes_primary_types_of_generation_key_generator(generation)
+            primary_types = crimes_primary_types.union(
+                primary_type.decode() for primary_type in redis_client.smembers(name=primary_types_key)
+            )
+            keys = [
+                key for primary_type in primary_types
+                for key in CacheManager.__crimes_keys_of_primary_type(primary_type, generation)
+            ]
+            keys.extend((
+                CacheManager.crimes_watermarks_key_generator(generation),
+                CacheManager.crimes_cold_primary_types_key_generator(generation),
+                CacheManager.crimes_warm_up_status_key_generator(generation),
+                primary_types_key
+            ))
+            for key in keys:
+                # keys of cold primary types may already expire later, their expiry time is only decreased
+                pipeline.expire(name=key, time=crimes_generation_retention_seconds, lt=True)
+        pipeline.set(name=CacheManager.__crimes_expired_generation_key, value=current_generation - 1)
+        pipeline.execute()
 
     @staticmethod
     def set_crimes_primary_types(value: Tuple[str]) -> bool:
@@ -67,7 +488,7 @@ class CacheManager:
 
         try:
             redis_client = RedisUtils.get_redis_client()
-            redis_client.set(name=CacheManager.__crimes_primary_type_key, value=pickle.dumps(value))
+            redis_client.set(name=CacheManager.crimes_primary_type_key, value=pickle.dumps(value))
             return True
         except Exception:
             logger.exception('Can not save primary types data to cache, maybe redis is not ready')
@@ -84,7 +505,7 @@ class CacheManager:
 
         try:
             redis_client = RedisUtils.get_redis_client()
-            crimes_primary_types = redis_client.get(name=CacheManager.__crimes_primary_type_key)
+            crimes_primary_types = redis_client.get(name=CacheManager.crimes_primary_type_key)
             if crimes_primary_types:
                 return pickle.loads(crimes_primary_types)
         except Exception:
@@ -92,46 +513,905 @@ class CacheManager:
         return
 
     @staticmethod
-    def set_crimes_filtered_by_primary_type(primary_type: str, value: List[Dict[str, Union[float, str]]]) -> bool:
-        """Pickles and sets crimes data to redis
+    def set_crimes_filtered_by_primary_type(
+            primary_type: str, value: Union[List[Dict[str, Union[float, str]]], CrimesColumns],
+            generation: Optional[int] = None
+    ) -> bool:
+        """Encodes and sets crimes data to redis
 
         Args:
-            value: A list of crimes that contains crime location and date in a dict.
+            value: A list of crimes that contains crime location and date in a dict, or a CrimesColumns object.
             primary_type (str): A string of crime primary type
+            generation (int): A generation of cached crimes data, None means current generation
+
+        Returns:
+            A boolean value that shows data cached successfully or not
+        """
+
+        return CacheManager.set_crimes_filtered_by_primary_types({primary_type: value}, generation)
+
+    @staticmethod
+    def set_crimes_filtered_by_primary_types(
+            values: Dict[str, Union[List[Dict[str, Union[float, str]]], CrimesColumns]],
+            generation: Optional[int] = None
+    ) -> bool:
+        """Encodes and sets crimes data of several primary types to redis in one round trip,
+        the latest crime date of each primary type is saved as its watermark for incremental refreshes
+
+        Args:
+            values: A dict that maps each primary type to a list of its crimes or a CrimesColumns object
+            generation (int): A generation of cached crimes data, None means current generation
 
         Returns:
             A boolean value that shows data cached successfully or not
         """
 
-        # generate a key to cache crimes data, we will use this key to fetch cached data
-        key = CacheManager.crimes_by_primary_type_key_generator(primary_type)
         try:
             redis_client = RedisUtils.get_redis_client()
-            redis_client.set(name=key, value=pickle.dumps(value))
+            generation = CacheManager.__resolve_crimes_generation(redis_client, generation)
+            watermarks_key = CacheManager.crimes_watermarks_key_generator(generation)
+            cold_primary_types = CacheManager.__get_crimes_cold_primary_types(redis_client, generation)
+            # all keys are sent to redis in one pipeline instead of one request per primary type
+            pipeline = redis_client.pipeline(transaction=False)
+            if values:
+                pipeline.sadd(CacheManager.crimes_primary_types_of_generation_key_generator(generation), *values)
+            for primary_type, value in values.items():
+                if not isinstance(value, CrimesColumns):
+                    value = CrimesColumns.from_records(value)
+                # generate a key to cache crimes data, we will use this key to fetch cached data
+                key = CacheManager.crimes_by_primary_type_key_generator(primary_type, generation)
+                # crimes of cold primary types expire, otherwise a refresh would keep them out of memory budget
+                pipeline.set(
+                    name=key, value=CrimesCodec.encode(value),
+                    ex=crimes_cold_ttl_seconds if primary_type in cold_primary_types else None
+                )
+                # cached crimes of other primary types never expire, but they are considered stale
+                # when freshness key expires
+                pipeline.set(
+                    name=CacheManager.crimes_freshness_key_generator(primary_type, generation), value=1,
+                    ex=crimes_cache_soft_ttl_seconds
+                )
+                # aggregates, statistics, spatial index, and prepared response of old crimes are not valid anymore
+                pipeline.delete(
+                    CacheManager.crimes_aggregates_key_generator(primary_type, generation),
+                    CacheManager.crimes_statistics_key_generator(primary_type, generation),
+                    CacheManager.crimes_spatial_index_key_generator(primary_type, generation),
+                    CacheManager.crimes_response_key_generator(primary_type, generation)
+                )
+                # crimes are sorted based on date, so the first one is the latest crime
+                if len(value):
+                    pipeline.hset(name=watermarks_key, key=primary_type, value=value.dates[0])
+                else:
+                    pipeline.hdel(watermarks_key, primary_type)
+            pipeline.execute()
             return True
         except Exception:
             logger.exception('Can not save crimes data to cache, maybe redis is not ready')
             return False
 
     @staticmethod
-    def get_crimes_by_primary_type(primary_type: str) -> Optional[List[Dict[str, Union[float, str]]]]:
+    def get_crimes_by_primary_type(
+            primary_type: str, generation: Optional[int] = None
+    ) -> Optional[List[Dict[str, Union[float, str]]]]:
         """Gets and returns cached crimes data of given primary type,
         and returns None if cache is empty.
 
         Args:
               primary_type (str): A string of crime primary type.
+              generation (int): A generation of cached crimes data, None means current generation.
 
         Returns:
               A list of crimes that contains crime location and date in a dict or None.
         """
 
-        # we used this function to generate a key when we were caching crime data, so now we use it to fetch data
-        key = CacheManager.crimes_by_primary_type_key_generator(primary_type)
         try:
             redis_client = RedisUtils.get_redis_client()
+            generation = CacheManager.__resolve_crimes_generation(redis_client, generation)
+            # we used this function to generate a key when we were caching crime data, so now we use it to fetch data
+            key = CacheManager.crimes_by_primary_type_key_generator(primary_type, generation)
+            crimes_by_primary_type = redis_client.get(name=key)
+            if crimes_by_primary_type:
+                # old cached data may still be pickled, the codec handles both formats
+                with ProfilingUtils.time_stage('decode', MetricsUtils.crimes_decode_seconds.labels(format='records')):
+                    return CrimesCodec.decode_records(crimes_by_primary_type)
+        except Exception:
+            logger.exception('Can not get crimes data from cache, maybe redis is not ready')
+        return
+
+    @staticmethod
+    def get_crimes_columns_by_primary_type_with_freshness(
+            primary_type: str, generation: Optional[int] = None
+    ) -> Tuple[Optional[CrimesColumns], bool]:
+        """Gets and returns cached crimes data of given primary type as columns and whether they are fresh
+        or stale, both are fetched in one round trip.
+
+        Args:
+              primary_type (str): A string of crime primary type.
+              generation (int): A generation of cached crimes data, None means current generation.
+
+        Returns:
+              A tuple of CrimesColumns object (or None if cache is empty) and a boolean that shows crimes are fresh.
+        """
+        return CacheManager.get_crimes_columns_by_primary_types_with_freshness([primary_type], generation)[primary_type]
+
+    @staticmethod
+    def get_crimes_columns_by_primary_types_with_freshness(
+            primary_types: List[str], generation: Optional[int] = None
+    ) -> Dict[str, Tuple[Optional[CrimesColumns], bool]]:
+        """Gets and returns cached crimes data of given primary types as columns and whether they are fresh
+        or stale, data and freshness of all primary types are fetched with one MGET.
+
+        Args:
+              primary_types: A list of crime primary types.
+              generation (int): A generation of cached crimes data, None means current generation.
+
+        Returns:
+              A dict that maps each primary type to a tuple of CrimesColumns object (or None if cache is empty)
+              and a boolean that shows crimes are fresh.
+        """
+
+        try:
+            redis_client = RedisUtils.get_redis_client()
+            generation = CacheManager.__resolve_crimes_generation(redis_client, generation)
+            keys = [CacheManager.crimes_by_primary_type_key_generator(item, generation) for item in primary_types]
+            freshness_keys = [CacheManager.crimes_freshness_key_generator(item, generation) for item in primary_types]
+            values = redis_client.mget(keys + freshness_keys)
+            with ProfilingUtils.time_stage('decode', MetricsUtils.crimes_decode_seconds.labels(format='columns')):
+                return {
+                    primary_type: (
+                        CrimesCodec.decode_columns(crimes) if crimes else None,
+                        crimes is not None and is_fresh is not None
+                    )
+                    for primary_type, crimes, is_fresh in zip(primary_types, values, values[len(primary_types):])
+                }
+        except Exception:
+            logger.exception('Can not get crimes data from cache, maybe redis is not ready')
+        return {primary_type: (None, False) for primary_type in primary_types}
+
+    @staticmethod
+    def get_crimes_lock(primary_type: str, timeout: float) -> redis.lock.Lock:
+        """Returns a distributed lock for fetching crimes of given primary type, all API workers
+        share this lock, so only one of them fetches crimes from crimes data backend at a time
+
+        Args:
+            primary_type (str): A string of crime primary type.
+            timeout (float): seconds that lock is released automatically, if its owner doesn't release it
+
+        Returns:
+            A redis lock object
+        """
+
+        key = f'{CacheManager.crimes_by_primary_type_key_generator(primary_type)}:lock'
+        return RedisUtils.get_redis_client().lock(name=key, timeout=timeout)
+
+    @staticmethod
+    def claim_crimes_refresh(primary_type: str, timeout: float, refresh_name: str = 'refreshing') -> bool:
+        """Claims background refresh of stale crimes of given primary type, so only one refresh is requested
+
+        Args:
+            primary_type (str): A string of crime primary type.
+            timeout (float): seconds that claim is kept, another refresh can be claimed after that
+            refresh_name (str): name of the refresh, so different refreshes of a primary type are claimed separately
+
+        Returns:
+            A boolean value that shows refresh is claimed by caller or not
+        """
+
+        key = f'{CacheManager.crimes_by_primary_type_key_generator(primary_type)}:{refresh_name}'
+        try:
+            redis_client = RedisUtils.get_redis_client()
+            return bool(redis_client.set(name=key, value=1, ex=int(timeout), nx=True))
+        except Exception:
+            logger.exception('Can not claim crimes refresh, maybe redis is not ready')
+        return False
+
+    @staticmethod
+    def get_crimes_columns_by_primary_type(
+            primary_type: str, generation: Optional[int] = None
+    ) -> Optional[CrimesColumns]:
+        """Gets and returns cached crimes data of given primary type as columns,
+        and returns None if cache is empty.
+
+        Args:
+              primary_type (str): A string of crime primary type.
+              generation (int): A generation of cached crimes data, None means current generation.
+
+        Returns:
+              A CrimesColumns object or None.
+        """
+
+        try:
+            redis_client = RedisUtils.get_redis_client()
+            generation = CacheManager.__resolve_crimes_generation(redis_client, generation)
+            key = CacheManager.crimes_by_primary_type_key_generator(primary_type, generation)
             crimes_by_primary_type = redis_client.get(name=key)
             if crimes_by_primary_type:
-                return pickle.loads(crimes_by_primary_type)
+                with ProfilingUtils.time_stage('decode', MetricsUtils.crimes_decode_seconds.labels(format='columns')):
+                    return CrimesCodec.decode_columns(crimes_by_primary_type)
         except Exception:
             logger.exception('Can not get crimes data from cache, maybe redis is not ready')
         return
+
+    @staticmethod
+    def get_crimes_watermarks(generation: Optional[int] = None) -> Dict[str, str]:
+        """Gets and returns latest cached crime date of each primary type,
+        and returns an empty dict if cache is empty.
+
+        Args:
+            generation (int): A generation of cached crimes data, None means current generation.
+
+        Returns:
+            A dict that maps each primary type to its latest cached crime date, e.g. "2023-01-05"
+        """
+
+        try:
+            redis_client = RedisUtils.get_redis_client()
+            generation = CacheManager.__resolve_crimes_generation(redis_client, generation)
+            watermarks = redis_client.hgetall(name=CacheManager.crimes_watermarks_key_generator(generation))
+            return {key.decode(): value.decode() for key, value in watermarks.items()}
+        except Exception:
+            logger.exception('Can not get crimes watermarks from cache, maybe redis is not ready')
+        return {}
+
+    @staticmethod
+    def get_crimes_dataset_version() -> int:
+        """Gets and returns version of cached crimes data, version is increased after each refresh
+
+        Returns:
+            An integer that shows version of cached crimes data, 0 if data is never refreshed
+        """
+
+        try:
+            redis_client = RedisUtils.get_redis_client()
+            return int(redis_client.get(name=CacheManager.__crimes_dataset_version_key) or 0)
+        except Exception:
+            logger.exception('Can not get crimes dataset version from cache, maybe redis is not ready')
+        return 0
+
+    @staticmethod
+    def publish_crimes_dataset_version(primary_types: Optional[List[str]] = None) -> Optional[int]:
+        """Increases version of cached crimes data and publishes it to API workers,
+        so they can invalidate their local caches
+
+        Args:
+            primary_types: A list of refreshed crime primary types, API workers only invalidate their local data
+                of these primary types. None invalidates all local data.
+
+        Returns:
+            The new version of cached crimes data or None if publishing failed
+        """
+
+        try:
+            redis_client = RedisUtils.get_redis_client()
+            dataset_version = redis_client.incr(name=CacheManager.__crimes_dataset_version_key)
+            message = dataset_version if primary_types is None else json.dumps(
+                {'dataset_version': dataset_version, 'primary_types': list(primary_types)}
+            )
+            redis_client.publish(channel=CacheManager.crimes_invalidation_channel, message=message)
+            return dataset_version
+        except Exception:
+            logger.exception('Can not publish crimes dataset version, maybe redis is not ready')
+        return
+
+    @staticmethod
+    def record_crimes_requests(requests: Dict[str, int], misses: Dict[str, int]) -> bool:
+        """Adds number of requests and cache misses of primary types to their counters in one round trip,
+        only cached primary types are counted, so sorted sets don't grow by names that clients send
+
+        Args:
+            requests: A dict that maps each primary type to its number of requests
+            misses: A dict that maps each primary type to its number of cache misses
+
+        Returns:
+            A boolean value that shows counters are saved successfully or not
+        """
+
+        try:
+            redis_client = RedisUtils.get_redis_client()
+            crimes_primary_types = set(CacheManager.get_crimes_primary_types() or ())
+            pipeline = redis_client.pipeline(transaction=False)
+            for primary_type, count in requests.items():
+                if primary_type in crimes_primary_types:
+                    pipeline.zincrby(name=CacheManager.__crimes_requests_key, amount=count, value=primary_type)
+            for primary_type, count in misses.items():
+                if primary_type in crimes_primary_types:
+                    pipeline.zincrby(name=CacheManager.__crimes_misses_key, amount=count, value=primary_type)
+            pipeline.execute()
+            return True
+        except Exception:
+            logger.exception('Can not save crimes requests counters to cache, maybe redis is not ready')
+            return False
+
+    @staticmethod
+    def get_crimes_popularity() -> Dict[str, Tuple[float, float]]:
+        """Gets and returns number of requests and cache misses of primary types, and returns an empty dict
+        if no request is recorded.
+
+        Returns:
+            A dict that maps each primary type to a tuple of its number of requests and cache misses
+        """
+
+        try:
+            redis_client = RedisUtils.get_redis_client()
+            pipeline = redis_client.pipeline(transaction=False)
+            pipeline.zrange(name=CacheManager.__crimes_requests_key, start=0, end=-1, withscores=True)
+            pipeline.zrange(name=CacheManager.__crimes_misses_key, start=0, end=-1, withscores=True)
+            requests, misses = pipeline.execute()
+            misses = dict(misses)
+            return {
+                primary_type.decode(): (count, misses.get(primary_type, 0.0)) for primary_type, count in requests
+            }
+        except Exception:
+            logger.exception('Can not get crimes requests counters from cache, maybe redis is not ready')
+        return {}
+
+    @staticmethod
+    def decay_crimes_popularity(factor: float) -> bool:
+        """Multiplies requests and cache misses counters of all primary types by a factor, so popularity
+        follows recent requests, counters that are decayed to almost zero are removed
+
+        Args:
+            factor (float): A number between 0 and 1
+
+        Returns:
+            A boolean value that shows counters are updated successfully or not
+        """
+
+        try:
+            redis_client = RedisUtils.get_redis_client()
+            pipeline = redis_client.pipeline(transaction=False)
+            for key in (CacheManager.__crimes_requests_key, CacheManager.__crimes_misses_key):
+                pipeline.zunionstore(dest=key, keys={key: factor})
+                pipeline.zremrangebyscore(name=key, min='-inf', max=f'({CacheManager.__crimes_popularity_min_score}')
+            pipeline.execute()
+            return True
+        except Exception:
+            logger.exception('Can not decay crimes requests counters, maybe redis is not ready')
+            return False
+
+    @staticmethod
+    def get_crimes_sizes(primary_types: List[str], generation: Optional[int] = None) -> Dict[str, int]:
+        """Gets and returns size of cached crimes, spatial index, and prepared responses of primary types
+        in bytes, sizes of all primary types are fetched in one round trip
+
+        Args:
+            primary_types: A list of crime primary types.
+            generation (int): A generation of cached crimes data, None means current generation.
+
+        Returns:
+            A dict that maps each primary type to its cached data size, 0 if it is not cached
+        """
+
+        try:
+            redis_client = RedisUtils.get_redis_client()
+            generation = CacheManager.__resolve_crimes_generation(redis_client, generation)
+            pipeline = redis_client.pipeline(transaction=False)
+            for primary_type in primary_types:
+                pipeline.strlen(name=CacheManager.crimes_by_primary_type_key_generator(primary_type, generation))
+                pipeline.strlen(name=CacheManager.crimes_spatial_index_key_generator(primary_type, generation))
+                for encoding in PreparedResponse.encodings:
+                    pipeline.hstrlen(
+                        name=CacheManager.crimes_response_key_generator(primary_type, generation), key=encoding
+                    )
+            sizes = pipeline.execute()
+            sizes_count = 2 + len(PreparedResponse.encodings)
+            return {
+                primary_type: sum(sizes[index * sizes_count:(index + 1) * sizes_count])
+                for index, primary_type in enumerate(primary_types)
+            }
+        except Exception:
+            logger.exception('Can not get crimes sizes from cache, maybe redis is not ready')
+        return {primary_type: 0 for primary_type in primary_types}
+
+    @staticmethod
+    def expire_crimes_of_primary_types(primary_types: List[str], generation: Optional[int] = None) -> bool:
+        """Sets expiry time of cached crimes of cold primary types and their aggregates, statistics, spatial indexes,
+        and prepared responses to `CRIMES_COLD_TTL_SECONDS`, so they are removed if they are not refreshed.
+        These keys can be evicted by redis before they expire, if redis memory is full and its memory policy
+        is "volatile-lfu". Cold primary types replace the ones of the last call, and later writes of their
+        crimes in the generation set the same expiry time.
+
+        Args:
+            primary_types: A list of crime primary types.
+            generation (int): A generation of cached crimes data, None means current generation.
+
+        Returns:
+            A boolean value that shows expiry times are set successfully or not
+        """
+
+        try:
+            redis_client = RedisUtils.get_redis_client()
+            generation = CacheManager.__resolve_crimes_generation(redis_client, generation)
+            pipeline = redis_client.pipeline(transaction=False)
+            cold_primary_types_key = CacheManager.crimes_cold_primary_types_key_generator(generation)
+            pipeline.delete(cold_primary_types_key)
+            if primary_types:
+                pipeline.sadd(cold_primary_types_key, *primary_types)
+            for primary_type in primary_types:
+                for key in (
+                        CacheManager.crimes_by_primary_type_key_generator(primary_type, generation),
+                        CacheManager.crimes_aggregates_key_generator(primary_type, generation),
+                        CacheManager.crimes_statistics_key_generator(primary_type, generation),
+                        CacheManager.crimes_spatial_index_key_generator(primary_type, generation),
+                        CacheManager.crimes_response_key_generator(primary_type, generation)
+                ):
+                    pipeline.expire(name=key, time=crimes_cold_ttl_seconds)
+            pipeline.execute()
+            return True
+        except Exception:
+            logger.exception('Can not set expiry time of crimes data, maybe redis is not ready')
+            return False
+
+    @staticmethod
+    def set_crimes_warm_up_status(generation: int, values: Dict[str, Union[str, int, float]]) -> bool:
+        """Sets fields of status of the warm-up of a generation, e.g. its timing and result of each primary type,
+        status is removed with the generation when it is replaced by a newer one
+
+        Args:
+            generation (int): A generation of cached crimes data
+            values: A dict of status fields and their values
+
+        Returns:
+            A boolean value that shows status is saved successfully or not
+        """
+
+        try:
+            redis_client = RedisUtils.get_redis_client()
+            redis_client.hset(name=CacheManager.crimes_warm_up_status_key_generator(generation), mapping=values)
+            return True
+        except Exception:
+            logger.exception('Can not save crimes warm-up status to cache, maybe redis is not ready')
+            return False
+
+    @staticmethod
+    def get_crimes_warm_up_status(generation: Optional[int] = None) -> Dict[str, str]:
+        """Gets and returns status of the warm-up of a generation, and returns an empty dict if it is not saved.
+
+        Args:
+            generation (int): A generation of cached crimes data, None means current generation.
+
+        Returns:
+            A dict of status fields and their values
+        """
+
+        try:
+            redis_client = RedisUtils.get_redis_client()
+            generation = CacheManager.__resolve_crimes_generation(redis_client, generation)
+            status = redis_client.hgetall(name=CacheManager.crimes_warm_up_status_key_generator(generation))
+            return {key.decode(): value.decode() for key, value in status.items()}
+        except Exception:
+            logger.exception('Can not get crimes warm-up status from cache, maybe redis is not ready')
+        return {}
+
+    @staticmethod
+    def set_crimes_aggregates(
+            values: Dict[str, Dict[int, List[Dict[str, Union[float, int]]]]], generation: Optional[int] = None
+    ) -> bool:
+        """Serializes and sets aggregated crimes of several primary types to redis in one round trip
+
+        Args:
+            values: A dict that maps each primary type to a dict of its aggregated crimes in each resolution
+            generation (int): A generation of cached crimes data, None means current generation
+
+        Returns:
+            A boolean value that shows data cached successfully or not
+        """
+
+        try:
+            redis_client = RedisUtils.get_redis_client()
+            generation = CacheManager.__resolve_crimes_generation(redis_client, generation)
+            pipeline = redis_client.pipeline(transaction=False)
+            cold_primary_types = CacheManager.__get_crimes_cold_primary_types(redis_client, generation)
+            for primary_type, aggregates in values.items():
+                key = CacheManager.crimes_aggregates_key_generator(primary_type, generation)
+                pipeline.hset(
+                    name=key, mapping={resolution: json.dumps(cells) for resolution, cells in aggregates.items()}
+                )
+                if primary_type in cold_primary_types:
+                    pipeline.expire(name=key, time=crimes_cold_ttl_seconds)
+            pipeline.execute()
+            return True
+        except Exception:
+            logger.exception('Can not save crimes aggregates to cache, maybe redis is not ready')
+            return False
+
+    @staticmethod
+    def get_crimes_aggregate(
+            primary_type: str, resolution: int, generation: Optional[int] = None
+    ) -> Optional[List[Dict[str, Union[float, int]]]]:
+        """Gets and returns cached aggregated crimes of given primary type and resolution,
+        and returns None if cache is empty.
+
+        Args:
+            primary_type (str): A string of crime primary type.
+            resolution (int): size of grid cells in meters.
+            generation (int): A generation of cached crimes data, None means current generation.
+
+        Returns:
+            A list of occupied cells that contains cell center location and number of its crimes in a dict or None.
+        """
+
+        try:
+            redis_client = RedisUtils.get_redis_client()
+            generation = CacheManager.__resolve_crimes_generation(redis_client, generation)
+            aggregate = redis_client.hget(
+                name=CacheManager.crimes_aggregates_key_generator(primary_type, generation), key=resolution
+            )
+            if aggregate:
+                return json.loads(aggregate)
+        except Exception:
+            logger.exception('Can not get crimes aggregates from cache, maybe redis is not ready')
+        return
+
+    @staticmethod
+    def set_crimes_statistics(
+            values: Dict[str, Dict[str, Union[list, dict]]], generation: Optional[int] = None
+    ) -> bool:
+        """Serializes and sets time series and summary statistics of crimes of several primary types
+        to redis in one round trip
+
+        Args:
+            values: A dict that maps each primary type to its statistics, which are computed by `CrimesStatistics`
+            generation (int): A generation of cached crimes data, None means current generation
+
+        Returns:
+            A boolean value that shows data cached successfully or not
+        """
+
+        try:
+            redis_client = RedisUtils.get_redis_client()
+            generation = CacheManager.__resolve_crimes_generation(redis_client, generation)
+            pipeline = redis_client.pipeline(transaction=False)
+            cold_primary_types = CacheManager.__get_crimes_cold_primary_types(redis_client, generation)
+            for primary_type, statistics in values.items():
+                key = CacheManager.crimes_statistics_key_generator(primary_type, generation)
+                pipeline.hset(name=key, mapping={name: json.dumps(value) for name, value in statistics.items()})
+                if primary_type in cold_primary_types:
+                    pipeline.expire(name=key, time=crimes_cold_ttl_seconds)
+            pipeline.execute()
+            return True
+        except Exception:
+            logger.exception('Can not save crimes statistics to cache, maybe redis is not ready')
+            return False
+
+    @staticmethod
+    def get_crimes_statistics(
+            primary_type: str, period: str, generation: Optional[int] = None
+    ) -> Optional[Dict[str, Union[list, dict]]]:
+        """Gets and returns cached counts of crimes of given primary type in a period and summary of them,
+        and returns None if cache is empty.
+
+        Args:
+            primary_type (str): A string of crime primary type.
+            period (str): One of `crimes_statistics_periods`, e.g. "weekly".
+            generation (int): A generation of cached crimes data, None means current generation.
+
+        Returns:
+            A dict of "counts", a list of counts in each period, and "summary" of crimes or None.
+        """
+
+        try:
+            redis_client = RedisUtils.get_redis_client()
+            generation = CacheManager.__resolve_crimes_generation(redis_client, generation)
+            counts, summary = redis_client.hmget(
+                CacheManager.crimes_statistics_key_generator(primary_type, generation), period, 'summary'
+            )
+            if counts and summary:
+                return {'counts': json.loads(counts), 'summary': json.loads(summary)}
+        except Exception:
+            logger.exception('Can not get crimes statistics from cache, maybe redis is not ready')
+        return
+
+    @staticmethod
+    def set_crimes_spatial_indexes(values: Dict[str, CrimesSpatialIndex], generation: Optional[int] = None) -> bool:
+        """Encodes and sets spatial indexes of crimes of several primary types to redis in one round trip
+
+        Args:
+            values: A dict that maps each primary type to spatial index of its crimes
+            generation (int): A generation of cached crimes data, None means current generation
+
+        Returns:
+            A boolean value that shows data cached successfully or not
+        """
+
+        try:
+            redis_client = RedisUtils.get_redis_client()
+            generation = CacheManager.__resolve_crimes_generation(redis_client, generation)
+            pipeline = redis_client.pipeline(transaction=False)
+            cold_primary_types = CacheManager.__get_crimes_cold_primary_types(redis_client, generation)
+            for primary_type, spatial_index in values.items():
+                key = CacheManager.crimes_spatial_index_key_generator(primary_type, generation)
+                pipeline.set(
+                    name=key, value=spatial_index.encode(),
+                    ex=crimes_cold_ttl_seconds if primary_type in cold_primary_types else None
+                )
+            pipeline.execute()
+            return True
+        except Exception:
+            logger.exception('Can not save crimes spatial indexes to cache, maybe redis is not ready')
+            return False
+
+    @staticmethod
+    def get_crimes_spatial_index(primary_type: str, generation: Optional[int] = None) -> Optional[CrimesSpatialIndex]:
+        """Gets and returns cached spatial index of crimes of given primary type,
+        and returns None if cache is empty.
+
+        Args:
+            primary_type (str): A string of crime primary type.
+            generation (int): A generation of cached crimes data, None means current generation.
+
+        Returns:
+            A CrimesSpatialIndex object or None.
+        """
+
+        try:
+            redis_client = RedisUtils.get_redis_client()
+            generation = CacheManager.__resolve_crimes_generation(redis_client, generation)
+            key = CacheManager.crimes_spatial_index_key_generator(primary_type, generation)
+            spatial_index = redis_client.get(name=key)
+            if spatial_index:
+                return CrimesSpatialIndex.decode(spatial_index)
+        except Exception:
+            logger.exception('Can not get crimes spatial index from cache, maybe redis is not ready')
+        return
+
+    @staticmethod
+    def set_crimes_prepared_responses(values: Dict[str, PreparedResponse], generation: Optional[int] = None) -> bool:
+        """Sets prepared API responses of crimes of several primary types to redis in one round trip
+
+        Args:
+            values: A dict that maps each primary type to prepared API response of its crimes
+            generation (int): A generation of cached crimes data, None means current generation
+
+        Returns:
+            A boolean value that shows data cached successfully or not
+        """
+
+        try:
+            redis_client = RedisUtils.get_redis_client()
+            generation = CacheManager.__resolve_crimes_generation(redis_client, generation)
+            pipeline = redis_client.pipeline(transaction=False)
+            cold_primary_types = CacheManager.__get_crimes_cold_primary_types(redis_client, generation)
+            for primary_type, prepared_response in values.items():
+                key = CacheManager.crimes_response_key_generator(primary_type, generation)
+                pipeline.hset(name=key, mapping=prepared_response.to_mapping())
+                if primary_type in cold_primary_types:
+                    pipeline.expire(name=key, time=crimes_cold_ttl_seconds)
+            pipeline.execute()
+            return True
+        except Exception:
+            logger.exception('Can not save crimes prepared responses to cache, maybe redis is not ready')
+            return False
+
+    @staticmethod
+    def get_crimes_prepared_response_with_freshness(
+            primary_type: str, generation: Optional[int] = None
+    ) -> Tuple[Optional[PreparedResponse], bool]:
+        """Gets and returns cached prepared API response of crimes of given primary type and whether crimes are
+        fresh or stale, both are fetched in one round trip.
+
+        Args:
+            primary_type (str): A string of crime primary type.
+            generation (int): A generation of cached crimes data, None means current generation.
+
+        Returns:
+            A tuple of PreparedResponse object (or None if cache is empty) and a boolean that shows crimes are fresh.
+        """
+
+        try:
+            redis_client = RedisUtils.get_redis_client()
+            generation = CacheManager.__resolve_crimes_generation(redis_client, generation)
+            pipeline = redis_client.pipeline(transaction=False)
+            pipeline.hgetall(name=CacheManager.crimes_response_key_generator(primary_type, generation))
+            pipeline.exists(CacheManager.crimes_freshness_key_generator(primary_type, generation))
+            prepared_response, is_fresh = pipeline.execute()
+            if prepared_response:
+                return PreparedResponse.from_mapping(prepared_response), bool(is_fresh)
+        except Exception:
+            logger.exception('Can not get crimes prepared response from cache, maybe redis is not ready')
+        return None, False
+
+    @staticmethod
+    def append_crimes_chunk(chunks_key: str, value: CrimesColumns) -> bool:
+        """Encodes and appends a chunk of crimes to a list of crimes chunks, the list expires if it is not
+        published, so chunks of a failed refresh are removed
+
+        Args:
+            chunks_key (str): A key that is generated by `new_crimes_chunks_key_generator`
+            value: A chunk of crimes as a CrimesColumns object
+
+        Returns:
+            A boolean value that shows data cached successfully or not
+        """
+
+        try:
+            redis_client = RedisUtils.get_redis_client()
+            pipeline = redis_client.pipeline(transaction=False)
+            pipeline.rpush(chunks_key, CrimesCodec.encode(value))
+            pipeline.expire(chunks_key, crimes_chunks_retention_seconds)
+            pipeline.execute()
+            return True
+        except Exception:
+            logger.exception('Can not save crimes chunk to cache, maybe redis is not ready')
+            return False
+
+    @staticmethod
+    def set_crimes_chunks_key(primary_type: str, chunks_key: str) -> bool:
+        """Publishes a list of crimes chunks of primary type, so API workers stream it from now on,
+        the old list is removed after `CRIMES_CHUNKS_RETENTION_SECONDS`
+
+        Args:
+            primary_type (str): A string of crime primary type
+            chunks_key (str): A key that is generated by `new_crimes_chunks_key_generator`
+
+        Returns:
+            A boolean value that shows data cached successfully or not
+        """
+
+        key = CacheManager.crimes_chunks_key_generator(primary_type)
+        try:
+            redis_client = RedisUtils.get_redis_client()
+            old_chunks_key = redis_client.getset(name=key, value=chunks_key)
+            pipeline = redis_client.pipeline(transaction=False)
+            pipeline.persist(chunks_key)
+            pipeline.set(name=f'{key}:fresh', value=1, ex=crimes_cache_soft_ttl_seconds)
+            if old_chunks_key:
+                pipeline.expire(old_chunks_key, crimes_chunks_retention_seconds)
+            pipeline.execute()
+            return True
+        except Exception:
+            logger.exception('Can not save crimes chunks key to cache, maybe redis is not ready')
+            return False
+
+    @staticmethod
+    def get_crimes_chunks_key(primary_type: str) -> Tuple[Optional[str], bool]:
+        """Gets and returns key of the list of cached crimes chunks of primary type and whether chunks are fresh,
+        both are fetched in one round trip.
+
+        Args:
+            primary_type (str): A string of crime primary type.
+
+        Returns:
+            A tuple of chunks key (or None if cache is empty) and a boolean that shows chunks are fresh.
+        """
+
+        key = CacheManager.crimes_chunks_key_generator(primary_type)
+        try:
+            redis_client = RedisUtils.get_redis_client()
+            chunks_key, is_fresh = redis_client.mget(key, f'{key}:fresh')
+            if chunks_key:
+                return chunks_key.decode(), is_fresh is not None
+        except Exception:
+            logger.exception('Can not get crimes chunks key from cache, maybe redis is not ready')
+        return None, False
+
+    @staticmethod
+    def get_crimes_chunks_count(chunks_key: str) -> Optional[int]:
+        """Gets and returns number of chunks in a list of cached crimes chunks, published lists have at least
+        one chunk, so 0 means the list is expired
+
+        Args:
+            chunks_key (str): A key that is returned by `get_crimes_chunks_key`
+
+        Returns:
+            Number of chunks, or None if redis is not ready
+        """
+
+        try:
+            redis_client = RedisUtils.get_redis_client()
+            return redis_client.llen(name=chunks_key)
+        except Exception:
+            logger.exception('Can not get number of crimes chunks from cache, maybe redis is not ready')
+        return
+
+    @staticmethod
+    def get_crimes_chunk(chunks_key: str, index: int) -> Optional[CrimesColumns]:
+        """Gets and returns a chunk of cached crimes, and returns None if there is no such chunk.
+
+        Args:
+            chunks_key (str): A key that is returned by `get_crimes_chunks_key`
+            index (int): index of the chunk in the list
+
+        Returns:
+            A CrimesColumns object or None.
+        """
+
+        try:
+            redis_client = RedisUtils.get_redis_client()
+            crimes_chunk = redis_client.lindex(name=chunks_key, index=index)
+            if crimes_chunk:
+                return CrimesCodec.decode(crimes_chunk)
+        except Exception:
+            logger.exception('Can not get crimes chunk from cache, maybe redis is not ready')
+        return
+
+
+class AsyncCacheManager:
+    """A class that simplify getting cached crimes data from redis in coroutines, only data that is ready to be
+    sent is read here, cache misses and stale data are handled by `CacheManager` users"""
+
+    @staticmethod
+    async def get_crimes_primary_types() -> Optional[Tuple[str]]:
+        """Gets and returns cached crimes primary types, and
+        returns None if cache is empty
+
+        Returns:
+            A tuple containing distinct strings of primary types or None
+        """
+
+        try:
+            redis_client = AsyncRedisUtils.get_redis_client()
+            crimes_primary_types = await redis_client.get(name=CacheManager.crimes_primary_type_key)
+            if crimes_primary_types:
+                return pickle.loads(crimes_primary_types)
+        except Exception:
+            logger.exception('Can not get primary types data from cache, maybe redis is not ready')
+        return
+
+    @staticmethod
+    async def get_crimes_generation() -> Optional[int]:
+        """Gets and returns the generation of cached crimes data that API workers read
+
+        Returns:
+            A generation of cached crimes data, 0 if no generation is published yet, or None if redis is not ready
+        """
+
+        try:
+            redis_client = AsyncRedisUtils.get_redis_client()
+            return int(await redis_client.get(name=CacheManager.crimes_generation_pointer_key) or 0)
+        except Exception:
+            logger.exception('Can not get crimes generation from cache, maybe redis is not ready')
+        return
+
+    @staticmethod
+    async def get_fresh_crimes_prepared_response(primary_type: str, generation: int) -> Optional[PreparedResponse]:
+        """Gets and returns cached prepared API response of crimes of given primary type if crimes are fresh,
+        and returns None if cache is empty or crimes are stale.
+
+        Args:
+            primary_type (str): A string of crime primary type.
+            generation (int): A generation of cached crimes data.
+
+        Returns:
+            A PreparedResponse object or None.
+        """
+
+        try:
+            redis_client = AsyncRedisUtils.get_redis_client()
+            pipeline = redis_client.pipeline(transaction=False)
+            pipeline.hgetall(name=CacheManager.crimes_response_key_generator(primary_type, generation))
+            pipeline.exists(CacheManager.crimes_freshness_key_generator(primary_type, generation))
+            prepared_response, is_fresh = await pipeline.execute()
+            if prepared_response and is_fresh:
+                return PreparedResponse.from_mapping(prepared_response)
+        except Exception:
+            logger.exception('Can not get crimes prepared response from cache, maybe redis is not ready')
+        return
+
+    @staticmethod
+    async def get_fresh_crimes_aggregate(
+            primary_type: str, resolution: int, generation: int
+    ) -> Optional[List[Dict[str, Union[float, int]]]]:
+        """Gets and returns cached aggregated crimes of given primary type and resolution if crimes are fresh,
+        and returns None if cache is empty or crimes are stale.
+
+        Args:
+            primary_type (str): A string of crime primary type.
+            resolution (int): size of grid cells in meters.
+            generation (int): A generation of cached crimes data.
+
+        Returns:
+            A list of occupied cells that contains cell center location and number of its crimes in a dict or None.
+        """
+
+        try:
+            redis_client = AsyncRedisUtils.get_redis_client()
+            pipeline = redis_client.pipeline(transaction=False)
+            pipeline.hget(name=CacheManager.crimes_aggregates_key_generator(primary_type, generation), key=resolution)
+            pipeline.exists(CacheManager.crimes_freshness_key_generator(primary_type, generation))
+            aggregate, is_fresh = await pipeline.execute()
+            if aggregate and is_fresh:
+                return json.loads(aggregate)
+        except Exception:
+            logger.exception('Can not get crimes aggregates from cache, maybe redis is not ready')
+        return
@@ -0,0 +1,66 @@
+import math
+import os
+from typing import List, Dict, Tuple, Union
+
+import numpy as np
+from dotenv import load_dotenv
+
+from celery_app.crimes_codec import CrimesColumns
+
+# loading environment variables which are defined in .env file
+load_dotenv()
+# size of grid cells in meters that crimes are aggregated into, aggregates of these resolutions are cached
+crimes_aggregate_resolutions: Tuple[int] = tuple(
+    int(item) for item in os.environ.get('CRIMES_AGGREGATE_RESOLUTIONS', '100,250,500,1000').split(',')
+)
+
+
+class CrimesAggregator:
+    """A class to count crimes in grid cells of a given size, so map clients receive one point per
+    occupied cell instead of all crimes"""
+
+    # grid cells have the same size in meters around Chicago city center
+    __reference_latitude = 41.8781
+    __meters_per_latitude_degree = 111320
+
+    @classmethod
+    def cell_size(cls, resolution: int) -> Tuple[float, float]:
+        """Calculate size of grid cells in degrees
+
+        Args:
+            resolution (int): size of grid cells in meters
+
+        Returns:
+            A tuple of cell height(latitude degrees) and cell width(longitude degrees)
+        """
+        latitude_step = resolution / cls.__meters_per_latitude_degree
+        longitude_step = latitude_step / math.cos(math.radians(cls.__reference_latitude))
+        return latitude_step, longitude_step
+
+    @classmethod
+    def aggregate(cls, crimes: CrimesColumns, resolution: int) -> List[Dict[str, Union[float, int]]]:
+        """Count crimes in each grid cell
+
+        Args:
+            crimes: crimes data as a CrimesColumns object
+            resolution (int): size of grid cells in meters
+
+        Returns:
+            A list of occupied cells that contains cell center location and number of its crimes in a dict
+        """
+
+        if not len(crimes):
+            return []
+        latitude_step, longitude_step = cls.cell_size(resolution)
+        rows = np.floor(np.asarray(crimes.lat, dtype=np.float64) / latitude_step).astype(np.int64)
+        columns = np.floor(np.asarray(crimes.lon, dtype=np.float64) / longitude_step).astype(np.int64)
+        # each cell is counted once by grouping crimes on their (row, column) pair
+        cells, counts = np.unique(np.stack((rows, columns), axis=1), axis=0, return_counts=True)
+        return [
+            {'lat': lat, 'lon': lon, 'count': count}
+            for lat, lon, count in zip(
+                ((cells[:, 0] + 0.5) * latitude_step).tolist(),
+                ((cells[:, 1] + 0.5) * longitude_step).tolist(),
+                counts.tolist()
+            )
+        ]
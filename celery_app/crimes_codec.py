@@ -0,0 +1,354 @@
+import datetime
+import hashlib
+import os
+import pickle
+import struct
+import zlib
+from typing import List, Dict, Union, Iterable, Tuple, Optional
+
+import numpy as np
+from dotenv import load_dotenv
+
+# zstd and lz4 compressions are optional, they are used only if their packages are installed
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+try:
+    import lz4.frame
+except ImportError:
+    lz4 = None
+# pyarrow is optional, crimes are sent as Arrow IPC streams only if it is installed
+try:
+    import pyarrow
+    import pyarrow.compute
+except ImportError:
+    pyarrow = None
+
+# loading environment variables which are defined in .env file
+load_dotenv()
+# compression of cached crimes data, it can be "none", "zlib", "zstd", or "lz4"
+crimes_cache_compression = os.environ.get('CRIMES_CACHE_COMPRESSION', 'none')
+# crimes latitude and longitude are saved as 64 or 32 bit floats, 32 bit floats are accurate to about one meter
+crimes_cache_float_bits = int(os.environ.get('CRIMES_CACHE_FLOAT_BITS', 64))
+
+
+class CrimesColumns:
+    """A columnar representation of crimes data, each crime is a row of latitude, longitude, and date columns,
+    dates are saved as number of days since 1970-01-01. Like crimes data backends, rows are sorted based on
+    crime date in descending order"""
+
+    def __init__(self, lat: np.ndarray, lon: np.ndarray, days: np.ndarray):
+        """Initialize crimes columns, all columns must have the same length
+
+        Args:
+            lat: An array of crimes latitudes
+            lon: An array of crimes longitudes
+            days: An array of crimes dates as number of days since 1970-01-01
+        """
+        self.lat = lat
+        self.lon = lon
+        self.days = days
+        self.__fingerprint = None
+
+    def __len__(self) -> int:
+        return len(self.days)
+
+    def __getitem__(self, rows: Union[slice, np.ndarray]) -> 'CrimesColumns':
+        """Returns a slice of crimes rows or crimes of given row numbers, columns of a slice are views of
+        these columns"""
+        return CrimesColumns(lat=self.lat[rows], lon=self.lon[rows], days=self.days[rows])
+
+    @property
+    def fingerprint(self) -> int:
+        """A hash of crimes rows, data that is derived from crimes, e.g. spatial index, saves it to be checked
+        against crimes that it is used with. Locations are hashed as 32 bit floats, so crimes that are cached with
+        `CRIMES_CACHE_FLOAT_BITS=32` have the same fingerprint as the original crimes. It is computed once."""
+
+        if self.__fingerprint is None:
+            crimes_hash = hashlib.blake2b(digest_size=8)
+            for column, dtype in ((self.lat, np.float32), (self.lon, np.float32), (self.days, np.int64)):
+                crimes_hash.update(np.ascontiguousarray(column, dtype=dtype).tobytes())
+            self.__fingerprint = int.from_bytes(crimes_hash.digest(), 'little')
+        return self.__fingerprint
+
+    @staticmethod
+    def to_day(date: datetime.date) -> int:
+        """Convert a date to number of days since 1970-01-01"""
+        return (date - datetime.date(1970, 1, 1)).days
+
+    def date_range_indexes(
+            self, start_date: Optional[datetime.date] = None, end_date: Optional[datetime.date] = None
+    ) -> Tuple[int, int]:
+        """Find rows of crimes that happened between two dates with binary search over crimes dates
+
+        Args:
+            start_date: first date of the range, it is included in the range, None means no start limit
+            end_date: last date of the range, it is included in the range, None means no end limit
+
+        Returns:
+            A tuple of (first row index, last row index + 1) of crimes that happened between given dates
+        """
+
+        # rows are sorted in descending order, so we search over a reversed view of dates, which is ascending
+        ascending_days = self.days[::-1]
+        start_index = 0 if start_date is None else int(
+            np.searchsorted(ascending_days, self.to_day(start_date), side='left')
+        )
+        end_index = len(self) if end_date is None else int(
+            np.searchsorted(ascending_days, self.to_day(end_date), side='right')
+        )
+        return len(self) - end_index, len(self) - start_index
+
+    @property
+    def dates(self) -> np.ndarray:
+        """Crimes dates as an array of "%Y-%m-%d" strings"""
+        return self.days.astype('datetime64[D]').astype(str)
+
+    @classmethod
+    def from_records(cls, records: Iterable[Dict[str, Union[float, str]]]) -> 'CrimesColumns':
+        """Create crimes columns from a list of crimes that contains crime location and date in a dict
+
+        Args:
+            records: A list of crimes that contains crime location and date in a dict.
+
+        Returns:
+            A CrimesColumns object
+        """
+        records = list(records)
+        return cls(
+            lat=np.array([item['lat'] for item in records], dtype=np.float64),
+            lon=np.array([item['lon'] for item in records], dtype=np.float64),
+            days=np.array([item['date'] for item in records], dtype='datetime64[D]').astype(np.int64)
+        )
+
+    @classmethod
+    def concatenate(cls, *crimes: 'CrimesColumns') -> 'CrimesColumns':
+        """Concatenate rows of crimes columns, e.g. new crimes and older cached crimes, in given order
+
+        Args:
+            *crimes: CrimesColumns objects
+
+        Returns:
+            A CrimesColumns object
+        """
+        return cls(
+            lat=np.concatenate([item.lat for item in crimes]), lon=np.concatenate([item.lon for item in crimes]),
+            days=np.concatenate([item.days for item in crimes])
+        )
+
+    @classmethod
+    def from_arrow(
+            cls, table: 'pyarrow.Table', lat_column: str = 'latitude', lon_column: str = 'longitude',
+            date_column: str = 'crime_date'
+    ) -> 'CrimesColumns':
+        """Create crimes columns from an Arrow table, e.g. a BigQuery query result, without converting rows
+        to Python objects. Like row by row conversion, crimes without location or date are skipped.
+
+        Args:
+            table: An Arrow table of crimes, which is sorted based on crime date in descending order
+            lat_column (str), lon_column (str): names of latitude and longitude columns
+            date_column (str): name of crime date column, it can be a date or a timestamp column
+
+        Returns:
+            A CrimesColumns object
+
+        Raises:
+            RuntimeError: if pyarrow is not installed
+        """
+
+        if pyarrow is None:
+            raise RuntimeError('pyarrow is not installed')
+        lat, lon, dates = table.column(lat_column), table.column(lon_column), table.column(date_column)
+        if dates.type != pyarrow.date32():
+            dates = pyarrow.compute.cast(dates, pyarrow.date32())
+        is_valid = pyarrow.compute.and_(
+            pyarrow.compute.and_(pyarrow.compute.is_valid(lat), pyarrow.compute.is_valid(lon)),
+            pyarrow.compute.is_valid(dates)
+        )
+        lat = pyarrow.compute.filter(lat, is_valid).to_numpy().astype(np.float64, copy=False)
+        lon = pyarrow.compute.filter(lon, is_valid).to_numpy().astype(np.float64, copy=False)
+        # date32 values are number of days since 1970-01-01, the same as our dates
+        days = pyarrow.compute.filter(dates, is_valid).cast(pyarrow.int32()).to_numpy().astype(np.int64)
+        # zero coordinates are not valid locations, row by row conversion skips them too
+        has_location = (lat != 0) & (lon != 0)
+        return cls(lat=lat[has_location], lon=lon[has_location], days=days[has_location])
+
+    def to_records(self) -> List[Dict[str, Union[float, str]]]:
+        """Convert crimes columns to a list of crimes that contains crime location and date in a dict
+
+        Returns:
+            A list of crimes that contains crime location and date in a dict.
+        """
+        # there are only a few distinct dates, so each of them is converted to string only once
+        unique_days, date_indexes = np.unique(self.days, return_inverse=True)
+        unique_dates = unique_days.astype('datetime64[D]').astype(str).tolist()
+        return [
+            {'lat': lat, 'lon': lon, 'date': unique_dates[date_index]}
+            for lat, lon, date_index in zip(self.lat.tolist(), self.lon.tolist(), date_indexes.tolist())
+        ]
+
+    def to_arrow_ipc(self) -> bytes:
+        """Serialize crimes columns to an Arrow IPC stream, dates are saved as Arrow date32 values which are
+        number of days since 1970-01-01 too, so columns are copied into the stream without any conversion
+
+        Returns:
+            Arrow IPC stream bytes of a table with "lat", "lon", and "date" columns
+
+        Raises:
+            RuntimeError: if pyarrow is not installed
+        """
+
+        if pyarrow is None:
+            raise RuntimeError('pyarrow is not installed')
+        table = pyarrow.table({
+            'lat': pyarrow.array(np.asarray(self.lat, dtype=np.float64)),
+            'lon': pyarrow.array(np.asarray(self.lon, dtype=np.float64)),
+            'date': pyarrow.array(self.days.astype(np.int32)).cast(pyarrow.date32()),
+        })
+        sink = pyarrow.BufferOutputStream()
+        with pyarrow.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+        return sink.getvalue().to_pybytes()
+
+
+class CrimesCodec:
+    """A class to encode crimes data to a compact binary format and decode it, encoded data starts with a header,
+    then latitudes, longitudes and dates of crimes are saved as contiguous arrays, dates are saved as
+    offsets from the oldest crime date, so each date fits into two bytes"""
+
+    class DecodeError(Exception):
+        """An Exception class to raise when encoded crimes data is not valid"""
+        pass
+
+    magic = b'CRMS'
+    version = 1
+    # magic, version, float bits, compression, number of crimes, base day(oldest crime date)
+    __header = struct.Struct('<4sBBBIi')
+    __compressions = {'none': 0, 'zlib': 1, 'zstd': 2, 'lz4': 3}
+
+    @classmethod
+    def __compress(cls, compression: int, data: bytes) -> bytes:
+        """Compress data with given compression code"""
+        if compression == cls.__compressions['zlib']:
+            return zlib.compress(data)
+        if compression == cls.__compressions['zstd']:
+            return zstandard.ZstdCompressor().compress(data)
+        if compression == cls.__compressions['lz4']:
+            return lz4.frame.compress(data)
+        return data
+
+    @classmethod
+    def __decompress(cls, compression: int, data: bytes) -> bytes:
+        """Decompress data with given compression code"""
+        if compression == cls.__compressions['zlib']:
+            return zlib.decompress(data)
+        if compression == cls.__compressions['zstd']:
+            return zstandard.ZstdDecompressor().decompress(data)
+        if compression == cls.__compressions['lz4']:
+            return lz4.frame.decompress(data)
+        return data
+
+    @classmethod
+    def encode(cls, crimes: CrimesColumns, compression: str = None, float_bits: int = None) -> bytes:
+        """Encode crimes columns to bytes
+
+        Args:
+            crimes: crimes data as a CrimesColumns object
+            compression (str): "none", "zlib", "zstd", or "lz4", default is `CRIMES_CACHE_COMPRESSION`
+            float_bits (int): 32 or 64, default is `CRIMES_CACHE_FLOAT_BITS`
+
+        Returns:
+            Encoded crimes data
+        """
+
+        compression = cls.__compressions[compression or crimes_cache_compression]
+        float_bits = float_bits or crimes_cache_float_bits
+        # fall back to zlib if optional compression package is not installed
+        if (compression == cls.__compressions['zstd'] and zstandard is None) or \
+                (compression == cls.__compressions['lz4'] and lz4 is None):
+            compression = cls.__compressions['zlib']
+
+        base_day = int(crimes.days.min()) if len(crimes) else 0
+        day_offsets = crimes.days - base_day
+        if len(crimes) and day_offsets.max() > np.iinfo(np.uint16).max:
+            raise ValueError('Crimes dates range is too wide to be encoded')
+
+        float_type = np.float32 if float_bits == 32 else np.float64
+        payload = b''.join((
+            np.ascontiguousarray(crimes.lat, dtype=float_type).tobytes(),
+            np.ascontiguousarray(crimes.lon, dtype=float_type).tobytes(),
+            np.ascontiguousarray(day_offsets, dtype=np.uint16).tobytes(),
+        ))
+        header = cls.__header.pack(cls.magic, cls.version, float_bits, compression, len(crimes), base_day)
+        return header + cls.__compress(compression, payload)
+
+    @classmethod
+    def decode(cls, data: bytes) -> CrimesColumns:
+        """Decode encoded crimes data to crimes columns
+
+        Args:
+            data (bytes): encoded crimes data
+
+        Returns:
+            A CrimesColumns object
+
+        Raises:
+            CrimesCodec.DecodeError
+        """
+
+        try:
+            magic, version, float_bits, compression, count, base_day = cls.__header.unpack_from(data)
+        except struct.error:
+            raise CrimesCodec.DecodeError
+        if magic != cls.magic or version != cls.version:
+            raise CrimesCodec.DecodeError
+
+        payload = cls.__decompress(compression, memoryview(data)[cls.__header.size:])
+        float_type = np.float32 if float_bits == 32 else np.float64
+        float_size = np.dtype(float_type).itemsize
+        # arrays are created on top of payload bytes, so no data is copied
+        lat = np.frombuffer(payload, dtype=float_type, count=count)
+        lon = np.frombuffer(payload, dtype=float_type, count=count, offset=count * float_size)
+        day_offsets = np.frombuffer(payload, dtype=np.uint16, count=count, offset=2 * count * float_size)
+        return CrimesColumns(lat=lat, lon=lon, days=day_offsets.astype(np.int64) + base_day)
+
+    @classmethod
+    def is_encoded(cls, data: bytes) -> bool:
+        """Check whether given data is encoded by this codec or it is an old pickled data
+
+        Args:
+            data (bytes): cached crimes data
+
+        Returns:
+            A boolean value that shows data is encoded by this codec or not
+        """
+        return data[:len(cls.magic)] == cls.magic
+
+    @classmethod
+    def decode_records(cls, data: bytes) -> List[Dict[str, Union[float, str]]]:
+        """Decode cached crimes data to a list of crimes, old pickled data is also supported
+
+        Args:
+            data (bytes): cached crimes data
+
+        Returns:
+            A list of crimes that contains crime location and date in a dict.
+        """
+        if cls.is_encoded(data):
+            return cls.decode(data).to_records()
+        return pickle.loads(data)
+
+    @classmethod
+    def decode_columns(cls, data: bytes) -> CrimesColumns:
+        """Decode cached crimes data to crimes columns, old pickled data is also supported
+
+        Args:
+            data (bytes): cached crimes data
+
+        Returns:
+            A CrimesColumns object
+        """
+        if cls.is_encoded(data):
+            return cls.decode(data)
+        return CrimesColumns.from_records(pickle.loads(data))
@@ -0,0 +1,112 @@
+from typing import Dict, List, Tuple, Union
+
+import numpy as np
+
+from celery_app.crimes_codec import CrimesColumns
+
+# periods that number of crimes are counted in, counts of all periods are cached
+crimes_statistics_periods: Tuple[str] = ('daily', 'weekly', 'monthly')
+
+
+class CrimesStatistics:
+    """A class to count crimes in each day, week, and month and summarize them, so trend charts receive
+    a few counts instead of all crimes"""
+
+    @staticmethod
+    def __count_periods(period_starts: np.ndarray) -> List[Dict[str, Union[str, int]]]:
+        """Count crimes that have the same period start
+
+        Args:
+            period_starts: An array of start date of the period of each crime as numpy datetime64 values
+
+        Returns:
+            A list of periods that contains start date of period and number of its crimes in a dict,
+            sorted based on date
+        """
+        periods, counts = np.unique(period_starts, return_counts=True)
+        return [
+            {'date': date, 'count': count}
+            for date, count in zip(periods.astype('datetime64[D]').astype(str).tolist(), counts.tolist())
+        ]
+
+    @classmethod
+    def count(cls, crimes: CrimesColumns) -> Dict[str, List[Dict[str, Union[str, int]]]]:
+        """Count crimes in each day, week(starts on Monday), and month
+
+        Args:
+            crimes: crimes data as a CrimesColumns object
+
+        Returns:
+            A dict that maps each period of `crimes_statistics_periods` to a list of its counts
+        """
+
+        days = np.asarray(crimes.days, dtype='datetime64[D]')
+        # 1970-01-01 was a Thursday, so weekday of each date is found by shifting days by 3 days
+        weekdays = (np.asarray(crimes.days, dtype=np.int64) + 3) % 7
+        return {
+            'daily': cls.__count_periods(days),
+            'weekly': cls.__count_periods(days - weekdays.astype('timedelta64[D]')),
+            'monthly': cls.__count_periods(days.astype('datetime64[M]')),
+        }
+
+    @staticmethod
+    def summarize(crimes: CrimesColumns) -> Dict[str, Union[str, int, float, List[int], None]]:
+        """Summarize number of crimes in days
+
+        Args:
+            crimes: crimes data as a CrimesColumns object
+
+        Returns:
+            A dict of total count, first and last date, average and maximum number of crimes per day,
+            and number of crimes in each weekday(Monday first)
+        """
+
+        if not len(crimes):
+            return {
+                'count': 0, 'first_date': None, 'last_date': None, 'mean_per_day': 0.0, 'max_per_day': 0,
+                'max_date': None, 'weekdays': [0] * 7, 'truncated_before': None
+            }
+        days = np.asarray(crimes.days, dtype=np.int64)
+        unique_days, counts = np.unique(days, return_counts=True)
+        max_index = int(np.argmax(counts))
+        # days without crimes are counted in average too
+        days_count = int(unique_days[-1] - unique_days[0]) + 1
+        return {
+            'count': len(crimes),
+            'first_date': str(unique_days[0].astype('datetime64[D]')),
+            'last_date': str(unique_days[-1].astype('datetime64[D]')),
+            'mean_per_day': round(len(crimes) / days_count, 3),
+            'max_per_day': int(counts[max_index]),
+            'max_date': str(unique_days[max_index].astype('datetime64[D]')),
+            'weekdays': np.bincount((days + 3) % 7, minlength=7).tolist(),
+            'truncated_before': None,
+        }
+
+    @classmethod
+    def compute(cls, crimes: CrimesColumns, is_truncated: bool = False) -> Dict[str, Union[list, dict]]:
+        """Count crimes in all periods and summarize them. If crimes are truncated, e.g. they are limited to
+        the latest `CRIMES_ROW_LIMIT` crimes, some crimes of their oldest day are missing, so the oldest day
+        is not counted, and periods that start before the next day are dropped, because they are partial.
+        The first counted day is saved as "truncated_before" in summary.
+
+        Args:
+            crimes: crimes data as a CrimesColumns object, which is sorted based on crime date in descending order
+            is_truncated (bool): older crimes than the given ones may exist
+
+        Returns:
+            A dict that maps each period of `crimes_statistics_periods` to a list of its counts,
+            and "summary" to the summary of crimes
+        """
+
+        if not is_truncated or not len(crimes):
+            return {**cls.count(crimes), 'summary': cls.summarize(crimes)}
+
+        # crimes are sorted based on date, so the last one is on the oldest day
+        truncated_before = int(crimes.days[-1]) + 1
+        crimes = crimes[np.asarray(crimes.days) >= truncated_before]
+        truncated_before = str(np.datetime64(truncated_before, 'D'))
+        counts = {
+            period: [item for item in period_counts if item['date'] >= truncated_before]
+            for period, period_counts in cls.count(crimes).items()
+        }
+        return {**counts, 'summary': {**cls.summarize(crimes), 'truncated_before': truncated_before}}
@@ -0,0 +1,86 @@
+import gzip
+import hashlib
+import json
+from http import HTTPStatus
+from typing import Dict, Any
+
+# orjson and brotli are optional, standard json and gzip are used if they are not installed
+try:
+    import orjson
+except ImportError:
+    orjson = None
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+class PreparedResponse:
+    """A successful API response that is serialized and compressed once, e.g. by refresh tasks,
+    so API workers can send its bytes for every request without serializing data again"""
+
+    # content encodings in order of preference, "identity" means not compressed
+    encodings = ('br', 'gzip', 'identity')
+
+    def __init__(self, bodies: Dict[str, bytes], etag: str):
+        """Initialize a prepared response
+
+        Args:
+            bodies: A dict that maps each content encoding to response body in that encoding
+            etag (str): A hash of response body, it changes whenever data changes
+        """
+        self.bodies = bodies
+        self.etag = etag
+
+    @staticmethod
+    def dumps(value: Any) -> bytes:
+        """Serialize a value to JSON bytes, orjson is used if it is installed
+
+        Args:
+            value: any JSON serializable value
+
+        Returns:
+            JSON bytes
+        """
+        if orjson is not None:
+            return orjson.dumps(value)
+        return json.dumps(value, separators=(',', ':')).encode()
+
+    @classmethod
+    def build(cls, data: Any) -> 'PreparedResponse':
+        """Serialize data in the same format as `APIResponse.ok_response` and compress it
+
+        Args:
+            data: any JSON serializable data.
+
+        Returns:
+            A PreparedResponse object
+        """
+
+        body = cls.dumps({'code': HTTPStatus.OK.value, 'data': data, 'message': HTTPStatus.OK.description})
+        bodies = {'identity': body, 'gzip': gzip.compress(body, compresslevel=6)}
+        if brotli is not None:
+            bodies['br'] = brotli.compress(body, quality=5)
+        return cls(bodies=bodies, etag=hashlib.blake2b(body, digest_size=16).hexdigest())
+
+    def to_mapping(self) -> Dict[str, bytes]:
+        """Convert prepared response to a dict, so it can be saved in a redis hash
+
+        Returns:
+            A dict of response bodies and etag
+        """
+        return {**self.bodies, 'etag': self.etag.encode()}
+
+    @classmethod
+    def from_mapping(cls, mapping: Dict[bytes, bytes]) -> 'PreparedResponse':
+        """Create prepared response from a redis hash
+
+        Args:
+            mapping: A dict of response bodies and etag, which is created by `to_mapping`
+
+        Returns:
+            A PreparedResponse object
+        """
+        mapping = {key.decode(): value for key, value in mapping.items()}
+        etag = mapping.pop('etag').decode()
+        return cls(bodies=mapping, etag=etag)
@@ -0,0 +1,191 @@
+import math
+import struct
+from typing import Tuple
+
+import numpy as np
+
+from celery_app.crimes_aggregation import CrimesAggregator
+from celery_app.crimes_codec import CrimesColumns
+
+
+class CrimesSpatialIndex:
+    """A uniform grid index over crimes locations. Crimes row numbers are sorted by their grid cell, and
+    an offsets array shows where rows of each cell start, so crimes of a map area are found by reading
+    only the cells that overlap the area instead of scanning all crimes"""
+
+    class DecodeError(Exception):
+        """An Exception class to raise when encoded spatial index is not valid"""
+        pass
+
+    magic = b'CRSI'
+    version = 2
+    # grid cells size in meters, cells are bigger than map aggregate cells because each query reads a few of them
+    default_resolution = 500
+    __earth_radius_meters = 6371008.8
+    # magic, version, resolution, number of crimes, fingerprint of crimes, first grid row, first grid column,
+    # grid rows, grid columns
+    __header = struct.Struct('<4sBIIQiiII')
+
+    def __init__(
+            self, resolution: int, count: int, fingerprint: int, first_row: int, first_column: int, rows: int,
+            columns: int, offsets: np.ndarray, order: np.ndarray
+    ):
+        """Initialize spatial index, use `build` or `decode` to create an index
+
+        Args:
+            resolution (int): size of grid cells in meters
+            count (int): number of indexed crimes
+            fingerprint (int): fingerprint of indexed crimes, the index is valid only for crimes with this fingerprint
+            first_row (int), first_column (int): grid position of the first cell
+            rows (int), columns (int): grid size
+            offsets: An array that shows where rows of each cell start in `order`
+            order: An array of crimes row numbers that is sorted based on their grid cell
+        """
+        self.resolution = resolution
+        self.count = count
+        self.fingerprint = fingerprint
+        self.first_row = first_row
+        self.first_column = first_column
+        self.rows = rows
+        self.columns = columns
+        self.offsets = offsets
+        self.order = order
+        self.latitude_step, self.longitude_step = CrimesAggregator.cell_size(resolution)
+
+    def __cell_positions(self, lat: np.ndarray, lon: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Returns grid row and column of given locations"""
+        rows = np.floor(lat / self.latitude_step).astype(np.int64) - self.first_row
+        columns = np.floor(lon / self.longitude_step).astype(np.int64) - self.first_column
+        return rows, columns
+
+    @classmethod
+    def build(cls, crimes: CrimesColumns, resolution: int = None) -> 'CrimesSpatialIndex':
+        """Build spatial index of crimes
+
+        Args:
+            crimes: crimes data as a CrimesColumns object
+            resolution (int): size of grid cells in meters, default is `default_resolution`
+
+        Returns:
+            A CrimesSpatialIndex object
+        """
+
+        resolution = resolution or cls.default_resolution
+        latitude_step, longitude_step = CrimesAggregator.cell_size(resolution)
+        rows = np.floor(np.asarray(crimes.lat, dtype=np.float64) / latitude_step).astype(np.int64)
+        columns = np.floor(np.asarray(crimes.lon, dtype=np.float64) / longitude_step).astype(np.int64)
+        if not len(crimes):
+            return cls(
+                resolution, 0, crimes.fingerprint, 0, 0, 0, 0,
+                np.zeros(1, dtype=np.uint32), np.zeros(0, dtype=np.uint32)
+            )
+
+        first_row, first_column = int(rows.min()), int(columns.min())
+        grid_rows, grid_columns = int(rows.max()) - first_row + 1, int(columns.max()) - first_column + 1
+        cells = (rows - first_row) * grid_columns + (columns - first_column)
+        # stable sort keeps rows of each cell in date order
+        order = np.argsort(cells, kind='stable').astype(np.uint32)
+        offsets = np.searchsorted(cells[order], np.arange(grid_rows * grid_columns + 1)).astype(np.uint32)
+        return cls(
+            resolution, len(crimes), crimes.fingerprint, first_row, first_column, grid_rows, grid_columns,
+            offsets, order
+        )
+
+    def encode(self) -> bytes:
+        """Encode spatial index to bytes, so it can be cached next to crimes data
+
+        Returns:
+            Encoded spatial index
+        """
+        header = self.__header.pack(
+            self.magic, self.version, self.resolution, self.count, self.fingerprint,
+            self.first_row, self.first_column, self.rows, self.columns
+        )
+        return header + self.offsets.astype(np.uint32).tobytes() + self.order.astype(np.uint32).tobytes()
+
+    @classmethod
+    def decode(cls, data: bytes) -> 'CrimesSpatialIndex':
+        """Decode encoded spatial index
+
+        Args:
+            data (bytes): encoded spatial index
+
+        Returns:
+            A CrimesSpatialIndex object
+
+        Raises:
+            CrimesSpatialIndex.DecodeError
+        """
+
+        try:
+            magic, version, resolution, count, fingerprint, first_row, first_column, rows, columns = (
+                cls.__header.unpack_from(data)
+            )
+        except struct.error:
+            raise CrimesSpatialIndex.DecodeError
+        if magic != cls.magic or version != cls.version:
+            raise CrimesSpatialIndex.DecodeError
+
+        offsets_count = rows * columns + 1 if count else 1
+        offsets = np.frombuffer(data, dtype=np.uint32, count=offsets_count, offset=cls.__header.size)
+        order = np.frombuffer(data, dtype=np.uint32, count=count, offset=cls.__header.size + offsets.nbytes)
+        return cls(resolution, count, fingerprint, first_row, first_column, rows, columns, offsets, order)
+
+    def query_bbox(
+            self, crimes: CrimesColumns, min_lat: float, min_lon: float, max_lat: float, max_lon: float
+    ) -> np.ndarray:
+        """Find crimes inside a bounding box
+
+        Args:
+            crimes: indexed crimes data as a CrimesColumns object
+            min_lat (float), min_lon (float): south-west corner of the box
+            max_lat (float), max_lon (float): north-east corner of the box
+
+        Returns:
+            A sorted array of row numbers of crimes inside the box, so crimes keep their date order
+        """
+
+        if not self.count:
+            return np.zeros(0, dtype=np.int64)
+        (first_row, last_row), (first_column, last_column) = self.__cell_positions(
+            np.array([min_lat, max_lat]), np.array([min_lon, max_lon])
+        )
+        first_row, first_column = max(int(first_row), 0), max(int(first_column), 0)
+        last_row, last_column = min(int(last_row), self.rows - 1), min(int(last_column), self.columns - 1)
+        if first_row > last_row or first_column > last_column:
+            return np.zeros(0, dtype=np.int64)
+
+        # cells of each grid row that overlap the box are adjacent, so they are read with one slice
+        first_cells = np.arange(first_row, last_row + 1) * self.columns + first_column
+        candidates = np.concatenate([
+            self.order[self.offsets[first_cell]:self.offsets[first_cell + last_column - first_column + 1]]
+            for first_cell in first_cells.tolist()
+        ]).astype(np.int64)
+        # border cells are partly outside of the box, so candidates are checked with exact coordinates
+        lat, lon = crimes.lat[candidates], crimes.lon[candidates]
+        inside = (lat >= min_lat) & (lat <= max_lat) & (lon >= min_lon) & (lon <= max_lon)
+        return np.sort(candidates[inside])
+
+    def query_radius(self, crimes: CrimesColumns, lat: float, lon: float, radius: float) -> np.ndarray:
+        """Find crimes within a distance of a location, distances are calculated by haversine formula
+
+        Args:
+            crimes: indexed crimes data as a CrimesColumns object
+            lat (float), lon (float): the center location
+            radius (float): maximum distance in meters
+
+        Returns:
+            A sorted array of row numbers of crimes near the location, so crimes keep their date order
+        """
+
+        latitude_delta = math.degrees(radius / self.__earth_radius_meters)
+        longitude_delta = latitude_delta / max(math.cos(math.radians(lat)), 1e-6)
+        candidates = self.query_bbox(
+            crimes, lat - latitude_delta, lon - longitude_delta, lat + latitude_delta, lon + longitude_delta
+        )
+
+        lat1, lon1 = math.radians(lat), math.radians(lon)
+        lat2, lon2 = np.radians(crimes.lat[candidates]), np.radians(crimes.lon[candidates])
+        haversine = np.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+        distances = 2 * self.__earth_radius_meters * np.arcsin(np.sqrt(haversine))
+        return candidates[distances <= radius]
@@ -1,21 +1,52 @@
+import datetime
 import logging
 import os
 import time
+from typing import Tuple, List, Dict, Union, Optional
 
-from celery import Celery
+from celery import Celery, chain, chord, group
 from celery.schedules import crontab
-from celery.signals import worker_ready
+from celery.signals import (
+    task_postrun, task_prerun, worker_init, worker_process_init, worker_process_shutdown, worker_ready
+)
 from dotenv import load_dotenv
 
-from big_query.crimes import BigQueryManager
+from big_query.backend import CrimesDataBackend
 from celery_app.cache_manager import CacheManager
+from celery_app.crimes_aggregation import CrimesAggregator, crimes_aggregate_resolutions
+from celery_app.crimes_codec import CrimesColumns
+from celery_app.crimes_statistics import CrimesStatistics
+from celery_app.prepared_responses import PreparedResponse
+from celery_app.spatial_index import CrimesSpatialIndex
 from utilities.log_utils import LogUtils
+from utilities.metrics_utils import MetricsUtils
 
 # loading environment variables which are defined in .env file
 load_dotenv()
 
 redis_host = os.environ.get('REDIS_HOST', 'localhost')
 redis_port = os.environ.get('REDIS_PORT', 6379)
+# "bulk" refresh fetches crimes of all primary types in one query, "per_type" creates one task for each primary type
+crimes_refresh_mode = os.environ.get('CRIMES_REFRESH_MODE', 'bulk')
+# interval of incremental refreshes in minutes, 0 disables incremental refreshes
+crimes_incremental_refresh_minutes = int(os.environ.get('CRIMES_INCREMENTAL_REFRESH_MINUTES', 60))
+# number of crimes of each primary type that are cached for streaming, 0 means full history
+crimes_stream_row_limit = int(os.environ.get('CRIMES_STREAM_ROW_LIMIT', 0))
+# streamed crimes are fetched and cached in chunks of this many crimes
+crimes_stream_chunk_rows = int(os.environ.get('CRIMES_STREAM_CHUNK_ROWS', 10000))
+# maximum number of primary types that "per_type" refresh fetches from crimes data backend at the same time
+crimes_warm_up_concurrency = max(int(os.environ.get('CRIMES_WARM_UP_CONCURRENCY', 4)), 1)
+# a failed fetch of a primary type is retried this many times, n-th retry waits 2^(n-1) times backoff seconds
+crimes_warm_up_max_retries = int(os.environ.get('CRIMES_WARM_UP_MAX_RETRIES', 3))
+crimes_warm_up_retry_backoff_seconds = float(os.environ.get('CRIMES_WARM_UP_RETRY_BACKOFF_SECONDS', 10))
+# crimes of the most requested primary types are cached without expiry time until their size reaches this many bytes,
+# crimes of other primary types expire after `CRIMES_COLD_TTL_SECONDS`, 0 means no limit. It must be below redis
+# maxmemory, otherwise redis with "volatile-lfu" policy has no expiring keys to evict when its memory is full
+crimes_cache_memory_budget_bytes = int(os.environ.get('CRIMES_CACHE_MEMORY_BUDGET_BYTES', 512 * 1024 ** 2))
+# requests counters of primary types are multiplied by this factor after each refresh, so old requests fade out
+crimes_popularity_decay = float(os.environ.get('CRIMES_POPULARITY_DECAY', 0.9))
+# Prometheus metrics of all worker processes are exposed on this port, 0 disables metrics server
+celery_metrics_port = int(os.environ.get('CELERY_METRICS_PORT', 9808))
 
 # create celery broker and backend from redis host that we retrieved from environment variables
 celery_broker = f'redis://{redis_host}:{redis_port}'
@@ -32,9 +63,132 @@ celery = Celery(
 )
 
 
+def cache_crimes_of_primary_types(
+        crimes_of_primary_types: Dict[str, Union[List[Dict[str, Union[float, str]]], CrimesColumns]],
+        new_generation: bool = False
+) -> bool:
+    """Caches crimes data of primary types and publishes a new dataset version,
+    so API workers drop their local copies of old data.
+
+    Args:
+        crimes_of_primary_types: A dict that maps each primary type to a list of its crimes or a CrimesColumns object.
+        new_generation (bool): If it is True, crimes are written into a new generation of cached crimes data, which
+            is published only when all of them are written, so API workers never read a mix of old and new data.
+            Other primary types are not in the new generation, so it is used by refreshes of all primary types.
+            Otherwise, crimes are written into current generation.
+
+    Returns:
+        A boolean value that shows data cached successfully or not.
+    """
+
+    crimes_of_primary_types = {
+        primary_type: crimes if isinstance(crimes, CrimesColumns) else CrimesColumns.from_records(crimes)
+        for primary_type, crimes in crimes_of_primary_types.items()
+    }
+    generation = CacheManager.new_crimes_generation() if new_generation else CacheManager.get_crimes_generation()
+    if generation is None:
+        return False
+    is_cached = write_crimes_of_primary_types(crimes_of_primary_types, generation)
+
+    if new_generation:
+        # a partially written generation is never published, API workers keep reading the current one
+        if not is_cached:
+            return False
+        apply_crimes_cache_policy(list(crimes_of_primary_types), generation)
+        return CacheManager.set_crimes_generation(generation)
+    # crimes may be partially written into current generation, so local copies of old data are dropped anyway,
+    # local copies of other primary types are kept
+    CacheManager.publish_crimes_dataset_version(list(crimes_of_primary_types))
+    return is_cached
+
+
+def order_primary_types_by_popularity(primary_types: List[str]) -> List[str]:
+    """Sorts primary types based on their number of requests, the most requested one is the first one.
+
+    Args:
+        primary_types: A list of crimes primary types.
+
+    Returns:
+        A list of crimes primary types.
+    """
+    popularity = CacheManager.get_crimes_popularity()
+    return sorted(primary_types, key=lambda item: popularity.get(item, (0.0, 0.0))[0], reverse=True)
+
+
+def apply_crimes_cache_policy(primary_types: List[str], generation: int) -> List[str]:
+    """Keeps crimes of the most requested primary types that fit in `CRIMES_CACHE_MEMORY_BUDGET_BYTES` without
+    expiry time, and sets expiry time of crimes of other primary types in given generation. Requests counters
+    are decayed once here, because it runs once per refresh of all primary types.
+
+    Args:
+        primary_types: A list of crimes primary types that are cached in the generation.
+        generation (int): A generation of cached crimes data.
+
+    Returns:
+        A list of cold primary types, which expire.
+    """
+
+    primary_types = order_primary_types_by_popularity(primary_types)
+    CacheManager.decay_crimes_popularity(crimes_popularity_decay)
+    if not crimes_cache_memory_budget_bytes:
+        return []
+
+    crimes_sizes = CacheManager.get_crimes_sizes(primary_types, generation)
+    used_bytes, cold_primary_types = 0, []
+    for primary_type in primary_types:
+        if used_bytes + crimes_sizes[primary_type] <= crimes_cache_memory_budget_bytes:
+            used_bytes += crimes_sizes[primary_type]
+        else:
+            cold_primary_types.append(primary_type)
+    CacheManager.expire_crimes_of_primary_types(cold_primary_types, generation)
+    logger.info(f'{used_bytes} bytes of crimes are cached without expiry time, cold types: {cold_primary_types}')
+    return cold_primary_types
+
+
+def write_crimes_of_primary_types(crimes_of_primary_types: Dict[str, CrimesColumns], generation: int) -> bool:
+    """Caches crimes data of primary types and their aggregates, statistics, spatial indexes, and prepared responses
+    in given generation, nothing is published to API workers.
+
+    Args:
+        crimes_of_primary_types: A dict that maps each primary type to a CrimesColumns object.
+        generation (int): A generation of cached crimes data.
+
+    Returns:
+        A boolean value that shows data cached successfully or not.
+    """
+
+    if not CacheManager.set_crimes_filtered_by_primary_types(crimes_of_primary_types, generation):
+        return False
+    # map aggregates of each primary type are precomputed for all resolutions
+    is_cached = CacheManager.set_crimes_aggregates({
+        primary_type: {
+            resolution: CrimesAggregator.aggregate(crimes, resolution) for resolution in crimes_aggregate_resolutions
+        }
+        for primary_type, crimes in crimes_of_primary_types.items()
+    }, generation)
+    # daily, weekly, and monthly counts are precomputed, so trend charts don't download all crimes,
+    # crimes that reach the row limit may miss older crimes of their oldest periods
+    is_cached &= CacheManager.set_crimes_statistics({
+        primary_type: CrimesStatistics.compute(
+            crimes, is_truncated=0 < CrimesDataBackend.crimes_limit <= len(crimes)
+        )
+        for primary_type, crimes in crimes_of_primary_types.items()
+    }, generation)
+    # spatial indexes are built once per refresh, so nearby and bounding box queries don't scan all crimes
+    is_cached &= CacheManager.set_crimes_spatial_indexes({
+        primary_type: CrimesSpatialIndex.build(crimes) for primary_type, crimes in crimes_of_primary_types.items()
+    }, generation)
+    # API responses are serialized and compressed once here instead of once per request
+    is_cached &= CacheManager.set_crimes_prepared_responses({
+        primary_type: PreparedResponse.build(crimes.to_records())
+        for primary_type, crimes in crimes_of_primary_types.items()
+    }, generation)
+    return is_cached
+
+
 @celery.task(name='get_crimes_by_primary_type_from_bigquery_and_cache')
 def get_crimes_by_primary_type_from_bigquery_and_cache(primary_type: str) -> bool:
-    """A celery task that fetch crimes data of given primary type and caches it.
+    """A celery task that fetch crimes data of given primary type from crimes data backend and caches it.
 
     Args:
         primary_type (str): A string that indicates primary type.
@@ -45,17 +199,55 @@ def get_crimes_by_primary_type_from_bigquery_and_cache(primary_type: str) -> boo
 
     logger.info(f'Getting and caching {primary_type} crimes data...')
     try:
-        crimes_by_primary_type = BigQueryManager().query_crimes_by_primary_type(primary_type)
-        return CacheManager.set_crimes_filtered_by_primary_type(primary_type, crimes_by_primary_type)
-    except BigQueryManager.QueryTimeoutError:
-        logger.error('BigQuery timeout error')
-    except BigQueryManager.GoogleCloudQueryError:
-        logger.error('BigQuery does not provide data, maybe credential is missing!')
+        crimes_by_primary_type = CrimesDataBackend.get_backend().query_crimes_columns_by_primary_type(primary_type)
+        return cache_crimes_of_primary_types({primary_type: crimes_by_primary_type})
+    except CrimesDataBackend.QueryTimeoutError:
+        logger.error('Crimes data backend timeout error')
+    except CrimesDataBackend.QueryError:
+        logger.error('Crimes data backend does not provide data, maybe credential is missing!')
     except Exception:
         logger.exception('Error while getting crimes of primary type')
     return False
 
 
+@celery.task(name='cache_crimes_chunks_of_primary_type')
+def cache_crimes_chunks_of_primary_type(primary_type: str) -> bool:
+    """A celery task that fetches crimes of given primary type for streaming, which may be its full history,
+    crimes are fetched and cached chunk by chunk, so the worker never keeps all of them in memory.
+
+    Args:
+        primary_type (str): A string that indicates primary type.
+
+    Returns:
+        A boolean value that shows task was successful or failed.
+    """
+
+    logger.info(f'Getting and caching {primary_type} crimes chunks...')
+    chunks_key = CacheManager.new_crimes_chunks_key_generator(primary_type)
+    try:
+        crimes_chunks = CrimesDataBackend.get_backend().iter_crimes_by_primary_type(
+            primary_type, chunk_size=crimes_stream_chunk_rows, limit=crimes_stream_row_limit
+        )
+        chunks_count = 0
+        for crimes_chunk in crimes_chunks:
+            if not CacheManager.append_crimes_chunk(chunks_key, CrimesColumns.from_records(crimes_chunk)):
+                return False
+            chunks_count += 1
+        # an empty list doesn't exist in redis, so a primary type without crimes has one empty chunk,
+        # then API workers know that a list without chunks is expired
+        if not chunks_count and not CacheManager.append_crimes_chunk(chunks_key, CrimesColumns.from_records([])):
+            return False
+        # chunks are published together, so API workers never stream a partially cached list
+        return CacheManager.set_crimes_chunks_key(primary_type, chunks_key)
+    except CrimesDataBackend.QueryTimeoutError:
+        logger.error('Crimes data backend timeout error')
+    except CrimesDataBackend.QueryError:
+        logger.error('Crimes data backend does not provide data, maybe credential is missing!')
+    except Exception:
+        logger.exception('Error while getting crimes chunks of primary type')
+    return False
+
+
 @celery.task(name='get_and_update_crimes_by_primary_type')
 def get_and_update_crimes_by_primary_type() -> bool:
     """This celery task gets all crimes primary types and
@@ -66,27 +258,244 @@ def get_and_update_crimes_by_primary_type() -> bool:
     """
 
     try:
-        primary_types = BigQueryManager().query_crimes_primary_types()
+        primary_types = CrimesDataBackend.get_backend().query_crimes_primary_types()
         # cache fetched crimes primary types
         CacheManager.set_crimes_primary_types(primary_types)
-    except BigQueryManager.QueryTimeoutError:
-        logger.error('BigQuery timeout error')
+    except CrimesDataBackend.QueryTimeoutError:
+        logger.error('Crimes data backend timeout error')
         return False
-    except BigQueryManager.GoogleCloudQueryError:
-        logger.error('BigQuery does not provide data, maybe credential is missing!')
+    except CrimesDataBackend.QueryError:
+        logger.error('Crimes data backend does not provide data, maybe credential is missing!')
         return False
     except Exception:
         logger.exception('Error while getting crimes of primary type')
         return False
 
     logger.info(f'Preparing to cache {str(primary_types)} crimes data...')
-    for primary_type in primary_types:
-        # creating tasks to fetch and cache crimes data
-        get_crimes_by_primary_type_from_bigquery_and_cache.apply_async(queue='crimes', args=(primary_type,))
+    if crimes_refresh_mode == 'bulk':
+        return get_and_update_crimes_of_primary_types_in_bulk(primary_types)
+    return warm_up_crimes_of_primary_types(primary_types)
+
+
+def warm_up_crimes_of_primary_types(primary_types: Tuple[str]) -> bool:
+    """Fetches and caches crimes of each primary type in a separate task and publishes them together.
+    Primary types are split into `CRIMES_WARM_UP_CONCURRENCY` chains of tasks that run in parallel, so at most that
+    many crimes data backend queries run at the same time, and warm-up takes as long as the slowest chain.
+    A chord publishes the new generation when all chains are finished.
 
+    Args:
+        primary_types: A tuple of crimes primary types.
+
+    Returns:
+        A boolean value that shows warm-up is started or not.
+    """
+
+    generation = CacheManager.new_crimes_generation()
+    if generation is None or not primary_types:
+        return False
+    CacheManager.set_crimes_warm_up_status(generation, {'status': 'running', 'started_at': time.time()})
+
+    # the most requested primary types are the first tasks of chains, so they are cached sooner
+    primary_types = order_primary_types_by_popularity(list(primary_types))
+    chains_count = min(crimes_warm_up_concurrency, len(primary_types))
+    warm_up_chains = group(
+        chain(
+            cache_crimes_of_primary_type_in_generation.si(primary_type, generation).set(queue='crimes')
+            for primary_type in primary_types[chain_index::chains_count]
+        )
+        for chain_index in range(chains_count)
+    )
+    chord(warm_up_chains)(publish_crimes_warm_up.si(generation, primary_types).set(queue='crimes'))
     return True
 
 
+@celery.task(name='cache_crimes_of_primary_type_in_generation', bind=True, max_retries=crimes_warm_up_max_retries)
+def cache_crimes_of_primary_type_in_generation(self, primary_type: str, generation: int) -> bool:
+    """A celery task of warm-up that fetches crimes data of given primary type and caches it in given generation.
+    Failed fetches are retried with exponential backoff. Result of the task is saved in warm-up status instead of
+    raising errors, so the next tasks of its chain run anyway.
+
+    Args:
+        primary_type (str): A string that indicates primary type.
+        generation (int): A generation that is created by the warm-up.
+
+    Returns:
+        A boolean value that shows task was successful or failed.
+    """
+
+    logger.info(f'Getting and caching {primary_type} crimes data in generation {generation}...')
+    started_at = time.monotonic()
+    try:
+        crimes_by_primary_type = CrimesDataBackend.get_backend().query_crimes_columns_by_primary_type(primary_type)
+        is_cached = write_crimes_of_primary_types({primary_type: crimes_by_primary_type}, generation)
+    except (CrimesDataBackend.QueryTimeoutError, CrimesDataBackend.QueryError) as ex:
+        if self.request.retries < self.max_retries:
+            countdown = crimes_warm_up_retry_backoff_seconds * 2 ** self.request.retries
+            logger.error(f'Crimes data backend failed for {primary_type}, retrying in {countdown} seconds')
+            raise self.retry(exc=ex, countdown=countdown)
+        logger.error(f'Crimes data backend failed for {primary_type} after {self.request.retries} retries')
+        is_cached = False
+    except Exception:
+        logger.exception('Error while getting crimes of primary type')
+        is_cached = False
+
+    CacheManager.set_crimes_warm_up_status(generation, {
+        f'primary_type:{primary_type}': 'succeeded' if is_cached else 'failed',
+        f'seconds:{primary_type}': round(time.monotonic() - started_at, 3)
+    })
+    return is_cached
+
+
+@celery.task(name='publish_crimes_warm_up')
+def publish_crimes_warm_up(generation: int, primary_types: List[str]) -> bool:
+    """A celery task that runs when all tasks of a warm-up are finished, it publishes the generation if crimes
+    of all primary types are cached and saves completion time and duration of the warm-up in its status.
+
+    Args:
+        generation (int): A generation that is created by the warm-up.
+        primary_types: A list of crimes primary types of the warm-up.
+
+    Returns:
+        A boolean value that shows generation is published or not.
+    """
+
+    warm_up_status = CacheManager.get_crimes_warm_up_status(generation)
+    failed_primary_types = [
+        primary_type for primary_type in primary_types
+        if warm_up_status.get(f'primary_type:{primary_type}') != 'succeeded'
+    ]
+    is_published = False
+    if not failed_primary_types:
+        apply_crimes_cache_policy(primary_types, generation)
+        is_published = CacheManager.set_crimes_generation(generation)
+
+    finished_at = time.time()
+    duration = finished_at - float(warm_up_status.get('started_at', finished_at))
+    CacheManager.set_crimes_warm_up_status(generation, {
+        'status': 'succeeded' if is_published else 'failed', 'finished_at': finished_at,
+        'duration_seconds': round(duration, 3), 'failed_primary_types': ','.join(failed_primary_types)
+    })
+    logger.info(
+        f'Warm-up of generation {generation} is {"published" if is_published else "failed"} after '
+        f'{duration:.1f} seconds, failed primary types: {failed_primary_types}'
+    )
+    return is_published
+
+
+def get_and_update_crimes_of_primary_types_in_bulk(primary_types: Tuple[str]) -> bool:
+    """Fetches crimes data of all given primary types with one query and caches them together.
+
+    Args:
+        primary_types: A tuple of crimes primary types.
+
+    Returns:
+        A boolean value that shows refresh was successful or failed.
+    """
+
+    try:
+        backend = CrimesDataBackend.get_backend()
+        crimes_of_primary_types = backend.query_latest_crimes_columns_of_primary_types(primary_types)
+    except CrimesDataBackend.QueryTimeoutError:
+        logger.error('Crimes data backend timeout error')
+        return False
+    except CrimesDataBackend.QueryError:
+        logger.error('Crimes data backend does not provide data, maybe credential is missing!')
+        return False
+    except Exception:
+        logger.exception('Error while getting crimes of primary types')
+        return False
+    return cache_crimes_of_primary_types(crimes_of_primary_types, new_generation=True)
+
+
+def merge_new_crimes(cached_crimes: CrimesColumns, new_crimes: CrimesColumns, watermark: str) -> CrimesColumns:
+    """Merge new crimes into cached crimes and drop the oldest crimes to keep number of crimes limited.
+
+    Args:
+        cached_crimes: Cached crimes columns, which are sorted based on crime date.
+        new_crimes: Columns of crimes that happened on or after watermark, which are sorted based on crime date.
+        watermark (str): The latest crime date of cached crimes, e.g. "2023-01-05".
+
+    Returns:
+        Crimes columns that are sorted based on crime date.
+    """
+
+    # new crimes contain all crimes of the watermark day, so cached crimes of that day are replaced by them
+    older_index, _ = cached_crimes.date_range_indexes(
+        end_date=datetime.date.fromisoformat(watermark) - datetime.timedelta(days=1)
+    )
+    merged_crimes = CrimesColumns.concatenate(new_crimes, cached_crimes[older_index:])
+    return merged_crimes[:CrimesDataBackend.crimes_limit or None]
+
+
+@celery.task(name='update_crimes_by_primary_type_incrementally')
+def update_crimes_by_primary_type_incrementally() -> bool:
+    """This celery task fetches only crimes that happened after the cached crimes of each primary type
+    and merges them into current generation, primary types that are not cached yet are fully fetched.
+    Only primary types with new crimes are written again, so crimes, aggregates, statistics, spatial indexes,
+    and prepared responses of other primary types are not rebuilt.
+
+    Returns:
+        A boolean value that shows task was successful or failed.
+    """
+
+    primary_types = CacheManager.get_crimes_primary_types()
+    if primary_types is None:
+        # nothing is cached yet, so there is nothing to update incrementally
+        return get_and_update_crimes_by_primary_type()
+
+    # crimes are merged into the generation that they are read from, it may be replaced by a full refresh
+    # in the meantime, then the merged crimes expire with it
+    generation = CacheManager.get_crimes_generation()
+    if generation is None:
+        return False
+    watermarks = CacheManager.get_crimes_watermarks(generation)
+    incremental_watermarks = {
+        primary_type: watermarks[primary_type] for primary_type in primary_types if primary_type in watermarks
+    }
+    missing_primary_types = [item for item in primary_types if item not in incremental_watermarks]
+
+    logger.info(f'Incrementally updating {str(tuple(incremental_watermarks))} crimes data...')
+    try:
+        backend = CrimesDataBackend.get_backend()
+        new_crimes, missing_crimes = {}, {}
+        if incremental_watermarks:
+            new_crimes = backend.query_crimes_of_primary_types_since(incremental_watermarks)
+        if missing_primary_types:
+            missing_crimes = backend.query_latest_crimes_columns_of_primary_types(missing_primary_types)
+    except CrimesDataBackend.QueryTimeoutError:
+        logger.error('Crimes data backend timeout error')
+        return False
+    except CrimesDataBackend.QueryError:
+        logger.error('Crimes data backend does not provide data, maybe credential is missing!')
+        return False
+    except Exception:
+        logger.exception('Error while getting new crimes of primary types')
+        return False
+
+    crimes_of_primary_types = dict(missing_crimes)
+    for primary_type, watermark in incremental_watermarks.items():
+        if not new_crimes.get(primary_type):
+            continue
+        cached_crimes = CacheManager.get_crimes_columns_by_primary_type(primary_type, generation)
+        # crimes of cold primary types may be expired, they are fetched again when they are requested
+        if cached_crimes is None:
+            continue
+        merged_crimes = merge_new_crimes(
+            cached_crimes, CrimesColumns.from_records(new_crimes[primary_type]), watermark
+        )
+        # new crimes may only be the cached crimes of the watermark day
+        if merged_crimes.fingerprint != cached_crimes.fingerprint:
+            crimes_of_primary_types[primary_type] = merged_crimes
+
+    logger.info(f'{str(tuple(crimes_of_primary_types))} crimes data are changed')
+    if not crimes_of_primary_types:
+        return True
+    is_cached = write_crimes_of_primary_types(crimes_of_primary_types, generation)
+    # crimes may be partially written, so local copies of old data of changed primary types are dropped anyway
+    CacheManager.publish_crimes_dataset_version(list(crimes_of_primary_types))
+    return is_cached
+
+
 # noinspection PyUnusedLocal
 @worker_ready.connect
 def at_start(sender, **kwargs):
@@ -100,6 +509,63 @@ def at_start(sender, **kwargs):
             sender.app.send_task('get_and_update_crimes_by_primary_type', connection=con, queue='crimes')
 
 
+# noinspection PyUnusedLocal
+@worker_process_init.connect
+def warm_up_crimes_backend(**kwargs):
+    """this function will be called in every celery worker process to create its crimes data backend client,
+    so the first task of the process doesn't wait for it"""
+
+    try:
+        CrimesDataBackend.get_backend().warm_up()
+    except Exception:
+        logger.exception('Can not warm up crimes data backend, it will be connected on the first task')
+
+
+# start time of running tasks of this process, it is used to measure duration of tasks
+tasks_start_times: Dict[str, float] = {}
+
+
+# noinspection PyUnusedLocal
+@worker_init.connect
+def start_metrics_server(**kwargs):
+    """this function will be called once in the main process of celery worker to expose metrics of all
+    worker processes, metrics of processes are collected from `PROMETHEUS_MULTIPROC_DIR`"""
+
+    if not celery_metrics_port:
+        return
+    try:
+        MetricsUtils.start_metrics_server(celery_metrics_port)
+    except Exception:
+        logger.exception('Can not start metrics server of celery worker')
+
+
+# noinspection PyUnusedLocal
+@worker_process_shutdown.connect
+def mark_metrics_process_dead(**kwargs):
+    """this function will be called when a celery worker process exits, so its live metrics are removed"""
+    MetricsUtils.mark_process_dead(os.getpid())
+
+
+# noinspection PyUnusedLocal
+@task_prerun.connect
+def start_task_timer(task_id: str, **kwargs):
+    """this function will be called before each task to save its start time"""
+    tasks_start_times[task_id] = time.perf_counter()
+
+
+# noinspection PyUnusedLocal
+@task_postrun.connect
+def observe_task_duration(task_id: str, task, state: Optional[str] = None, **kwargs):
+    """this function will be called after each task to measure its duration, outcome is the state of task,
+    e.g. SUCCESS, FAILURE, or RETRY"""
+
+    start_time = tasks_start_times.pop(task_id, None)
+    if start_time is not None:
+        MetricsUtils.celery_task_seconds.labels(task=task.name, outcome=state or 'UNKNOWN').observe(
+            time.perf_counter() - start_time
+        )
+
+
 # noinspection PyUnusedLocal
 @celery.on_after_finalize.connect
 def setup_periodic_tasks(sender, **kwargs):
@@ -114,3 +580,12 @@ def setup_periodic_tasks(sender, **kwargs):
         name='get_and_update_crimes_primary_types_in_cache',
         queue='crimes'
     )
+
+    # between full refreshes, only new crimes are fetched and merged into cache
+    if crimes_incremental_refresh_minutes:
+        sender.add_periodic_task(
+            crimes_incremental_refresh_minutes * 60,
+            update_crimes_by_primary_type_incrementally.s(),
+            name='update_crimes_by_primary_type_incrementally_in_cache',
+            queue='crimes'
+        )
@@ -0,0 +1,26 @@
+import logging
+
+from utilities.log_utils import LogUtils
+
+logger = LogUtils.get_logger(logger_name='gunicorn_hooks', level=logging.ERROR)
+
+
+# noinspection PyUnusedLocal
+def post_fork(server, worker):
+    """gunicorn calls this function in every worker process after it is forked, so we create crimes data backend
+    client of the worker here instead of on the first cache miss of a request"""
+
+    from big_query.backend import CrimesDataBackend
+    try:
+        CrimesDataBackend.get_backend().warm_up()
+    except Exception:
+        logger.exception('Can not warm up crimes data backend, it will be connected on the first cache miss')
+
+
+# noinspection PyUnusedLocal
+def child_exit(server, worker):
+    """gunicorn calls this function in the master process after a worker exits, so live metrics of the worker
+    are removed from `PROMETHEUS_MULTIPROC_DIR`"""
+
+    from utilities.metrics_utils import MetricsUtils
+    MetricsUtils.mark_process_dead(worker.pid)
@@ -1,9 +1,15 @@
 import datetime
+import json
 import logging
+import math
 import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
 from typing import Union, Dict, List, Tuple
 
+import numpy as np
 import pandas as pd
+import pyarrow as pa
 import requests
 import streamlit as st
 import pydeck as pdk
@@ -16,6 +22,22 @@ load_dotenv()
 
 # get the flask base url from environment variables
 FLASK_BASE_URL = os.environ['FLASK_APP_BASE_URL']
+# crimes are received as Arrow IPC streams which are loaded into DataFrames without parsing
+ARROW_MIMETYPE = 'application/vnd.apache.arrow.stream'
+# size of map cells in meters
+MAP_CELL_RESOLUTION = int(os.environ.get('MAP_CELL_RESOLUTION', 100))
+# API requests are timed out after these seconds for connecting and for reading the response
+DASHBOARD_REQUEST_TIMEOUT = (
+    float(os.environ.get('DASHBOARD_CONNECT_TIMEOUT_SECONDS', 3.05)),
+    float(os.environ.get('DASHBOARD_READ_TIMEOUT_SECONDS', 60)),
+)
+# crimes dataset version is asked from API at most once in this many seconds, crimes data of a version is
+# kept in memory of dashboard until API returns a new version
+DASHBOARD_VERSION_TTL_SECONDS = float(os.environ.get('DASHBOARD_VERSION_TTL_SECONDS', 30))
+# maximum number of crimes data, map cells, and trends that are kept in memory of dashboard
+DASHBOARD_MEMO_MAX_ENTRIES = int(os.environ.get('DASHBOARD_MEMO_MAX_ENTRIES', 32))
+# crimes of this many next primary types of dropdown menu are fetched in background, 0 disables prefetch
+DASHBOARD_PREFETCH_PRIMARY_TYPES = int(os.environ.get('DASHBOARD_PREFETCH_PRIMARY_TYPES', 2))
 
 logger = LogUtils.get_logger(logger_name='streamlit_dashboard', level=logging.ERROR)
 
@@ -23,18 +45,76 @@ logger = LogUtils.get_logger(logger_name='streamlit_dashboard', level=logging.ER
 class StreamlitDashboardManager:
     """A class to manage Streamlit dashboard"""
 
+    # Streamlit runs this script again on each user interaction, so everything that must be kept between runs
+    # is cached by Streamlit memo and singleton caches, they are shared between all sessions of dashboard
+
+    @staticmethod
+    @st.experimental_singleton(show_spinner=False)
+    def get_http_session() -> requests.Session:
+        """Returns a requests session that keeps connections to flask API alive between runs of dashboard
+
+        Returns:
+            A requests Session
+        """
+
+        session = requests.Session()
+        # prefetch threads use the pool too, so it has a connection for each of them
+        adapter = requests.adapters.HTTPAdapter(pool_maxsize=DASHBOARD_PREFETCH_PRIMARY_TYPES + 10)
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        return session
+
+    @classmethod
+    def call_api(cls, path: str, **kwargs) -> requests.Response:
+        """Send a GET request to internal flask API with keep-alive session and timeouts
+
+        Args:
+            path (str): path of API endpoint, e.g. "/api/crimes/"
+            **kwargs: keyword arguments of `requests.Session.get`, e.g. params
+
+        Returns:
+            A requests Response
+        """
+        return cls.get_http_session().get(f'{FLASK_BASE_URL}{path}', timeout=DASHBOARD_REQUEST_TIMEOUT, **kwargs)
+
+    @staticmethod
+    @st.experimental_memo(ttl=DASHBOARD_VERSION_TTL_SECONDS, show_spinner=False)
+    def get_dataset_version() -> int:
+        """This method calls internal flask API to get version of cached crimes data,
+        all data of dashboard is cached with this version, so it is fetched again after crimes are refreshed.
+
+        Returns:
+            An integer that shows version of cached crimes data
+        """
+
+        response = StreamlitDashboardManager.call_api('/api/crimes/version').json()
+        if response['code'] != 200:
+            raise Exception(response['message'])
+        return response['data']
+
     @classmethod
     def get_primary_types(cls) -> List[str]:
+        """Returns crimes primary types of current crimes dataset version
+
+        Returns:
+            A list of crimes primary types.
+        """
+        return cls.__load_primary_types(cls.get_dataset_version())
+
+    @staticmethod
+    @st.experimental_memo(show_spinner=False, max_entries=DASHBOARD_MEMO_MAX_ENTRIES)
+    def __load_primary_types(dataset_version: int) -> List[str]:
         """This method calls internal flask API to get primary types,
         it checks the status code, then decides to return data or raise exception.
 
+        Args:
+            dataset_version (int): version of cached crimes data, it is only used as key of Streamlit cache
+
         Returns:
             A list of crimes primary types.
         """
 
-        # we can also use a Streamlit cache to decrease API calls to get primary types on page changes
-        url = f'{FLASK_BASE_URL}/api/crimes/primary_types'
-        response = requests.get(url).json()
+        response = StreamlitDashboardManager.call_api('/api/crimes/primary_types').json()
         # check if API returns correct data, otherwise raise an exception
         if response['code'] != 200:
             raise Exception(response['message'])
@@ -42,24 +122,205 @@ class StreamlitDashboardManager:
         primary_types = sorted(response['data'], key=lambda x: x)
         return primary_types
 
-    @classmethod
-    def get_crimes_of_primary_type(cls, primary_type: str) -> List[Dict[str, Union[float, str]]]:
-        """This method calls internal flask API to get crimes data,
+    @staticmethod
+    @st.experimental_memo(show_spinner=False, max_entries=DASHBOARD_MEMO_MAX_ENTRIES)
+    def __load_crimes_payload(primary_type: str, dataset_version: int) -> Tuple[str, bytes]:
+        """This method calls internal flask API to get crimes data as an Arrow IPC stream,
         it checks the status code, then decides to return data or raise exception.
 
         Args:
             primary_type (str): A string to get crimes data
+            dataset_version (int): version of cached crimes data, it is only used as key of Streamlit cache
 
         Returns:
-            A list of crimes that contains crime location and date in a dict.
+            A tuple of content type and body of response
         """
 
-        url = f'{FLASK_BASE_URL}/api/crimes/?primary_type={primary_type}'
-        response = requests.get(url).json()
+        # Arrow columns are loaded into DataFrame without parsing, JSON is only used if API doesn't support Arrow
+        response = StreamlitDashboardManager.call_api(
+            '/api/crimes/', params={'primary_type': primary_type},
+            headers={'Accept': f'{ARROW_MIMETYPE}, application/json;q=0.5'}
+        )
+        if response.status_code == 200 and response.headers.get('Content-Type') == ARROW_MIMETYPE:
+            return ARROW_MIMETYPE, response.content
         # if API doesn't return crimes data, we must raise an exception
-        if response['code'] != 200:
-            raise Exception(response['message'])
-        return response['data']
+        if response.json()['code'] != 200:
+            raise Exception(response.json()['message'])
+        return 'application/json', response.content
+
+    @staticmethod
+    @st.experimental_memo(show_spinner=False, max_entries=DASHBOARD_MEMO_MAX_ENTRIES)
+    def __load_crimes_df(primary_type: str, dataset_version: int) -> pd.DataFrame:
+        """Load crimes data of primary type into a DataFrame
+
+        Args:
+            primary_type (str): A string to get crimes data
+            dataset_version (int): version of cached crimes data
+
+        Returns:
+            A pandas DataFrame of crimes data
+        """
+
+        content_type, content = StreamlitDashboardManager.__load_crimes_payload(primary_type, dataset_version)
+        if content_type == ARROW_MIMETYPE:
+            # "date" column is an Arrow date32 column, so it is converted to pandas datetime type directly
+            return pa.ipc.open_stream(content).read_pandas(date_as_object=False)
+        return StreamlitDashboardManager.load_crimes_of_type_into_df(json.loads(content)['data'])
+
+    @classmethod
+    def get_crimes_of_primary_type(cls, primary_type: str) -> pd.DataFrame:
+        """Returns crimes data of primary type of current crimes dataset version
+
+        Args:
+            primary_type (str): A string to get crimes data
+
+        Returns:
+            A pandas DataFrame of crimes data
+        """
+        return cls.__load_crimes_df(primary_type, cls.get_dataset_version())
+
+    @staticmethod
+    @st.experimental_singleton(show_spinner=False)
+    def get_prefetch_executor() -> Tuple[ThreadPoolExecutor, Dict[Tuple[str, int], Future], threading.Lock]:
+        """Returns a thread pool that fetches crimes in background, futures of primary types that are being
+        fetched, so a primary type is not fetched twice, and a lock of the futures, because sessions of dashboard
+        run in their own threads and share them
+
+        Returns:
+            A tuple of a ThreadPoolExecutor, a dict that maps (primary type, dataset version) to a Future, and a Lock
+        """
+        return ThreadPoolExecutor(max_workers=max(DASHBOARD_PREFETCH_PRIMARY_TYPES, 1)), {}, threading.Lock()
+
+    @classmethod
+    def prefetch_crimes_of_primary_types(cls, primary_types: List[str], selected_primary_type: str):
+        """Fetch crimes of the next primary types of dropdown menu in background,
+        so they are loaded from memory when user selects them
+
+        Args:
+            primary_types: A list of primary types in dropdown menu order
+            selected_primary_type (str): primary type that is selected by user
+        """
+
+        if not DASHBOARD_PREFETCH_PRIMARY_TYPES:
+            return
+        dataset_version = cls.get_dataset_version()
+        executor, futures, futures_lock = cls.get_prefetch_executor()
+        selected_index = primary_types.index(selected_primary_type)
+        next_primary_types = primary_types[selected_index + 1:selected_index + 1 + DASHBOARD_PREFETCH_PRIMARY_TYPES]
+        with futures_lock:
+            for primary_type in next_primary_types:
+                future = futures.get((primary_type, dataset_version))
+                if future is not None and (not future.done() or future.exception() is None):
+                    continue
+                futures[(primary_type, dataset_version)] = executor.submit(
+                    cls.__load_crimes_df, primary_type, dataset_version
+                )
+            # futures of old versions are not needed anymore
+            for key in [key for key in futures if key[1] != dataset_version]:
+                del futures[key]
+
+    @staticmethod
+    def get_map_cell_size() -> Tuple[float, float]:
+        """Calculate size of map cells in degrees, cells have the same size in meters around Chicago city center,
+        same as map cells of API
+
+        Returns:
+            A tuple of cell height(latitude degrees) and cell width(longitude degrees)
+        """
+        latitude_step = MAP_CELL_RESOLUTION / 111320
+        return latitude_step, latitude_step / math.cos(math.radians(41.8781))
+
+    @classmethod
+    def get_crimes_aggregate_of_primary_type(
+            cls, primary_type: str, date_range: Tuple[datetime.datetime]
+    ) -> pd.DataFrame:
+        """Returns number of crimes in each map cell of current crimes dataset version,
+        so the map draws occupied cells instead of all crimes.
+
+        Args:
+            primary_type (str): A string to get crimes data
+            date_range: A tuple of two selected date, crimes are not filtered until user selects both dates
+
+        Returns:
+            A pandas DataFrame of map cells that contains cell location and number of its crimes
+        """
+        return cls.__aggregate_crimes(primary_type, cls.get_dataset_version(), tuple(date_range))
+
+    @staticmethod
+    @st.experimental_memo(show_spinner=False, max_entries=DASHBOARD_MEMO_MAX_ENTRIES)
+    def __aggregate_crimes(
+            primary_type: str, dataset_version: int, date_range: Tuple[datetime.datetime]
+    ) -> pd.DataFrame:
+        """Count crimes of primary type between selected dates in map cells, crimes are already in memory,
+        so changing dates doesn't call API.
+
+        Args:
+            primary_type (str): A string to get crimes data
+            dataset_version (int): version of cached crimes data
+            date_range: A tuple of two selected date, crimes are not filtered until user selects both dates
+
+        Returns:
+            A pandas DataFrame of map cells that contains cell location and number of its crimes
+        """
+
+        crimes_df = StreamlitDashboardManager.filter_crimes_df_based_on_date(
+            StreamlitDashboardManager.__load_crimes_df(primary_type, dataset_version), date_range
+        )
+        latitude_step, longitude_step = StreamlitDashboardManager.get_map_cell_size()
+        rows = np.floor(crimes_df['lat'].to_numpy(dtype=np.float64) / latitude_step).astype(np.int64)
+        columns = np.floor(crimes_df['lon'].to_numpy(dtype=np.float64) / longitude_step).astype(np.int64)
+        # each cell is counted once by grouping crimes on their (row, column) pair
+        cells = pd.Series(rows).groupby([rows, columns]).size()
+        return pd.DataFrame({
+            'lat': (cells.index.get_level_values(0).to_numpy() + 0.5) * latitude_step,
+            'lon': (cells.index.get_level_values(1).to_numpy() + 0.5) * longitude_step,
+            'count': cells.to_numpy(),
+        })
+
+    @classmethod
+    def get_crimes_statistics_of_primary_type(
+            cls, primary_type: str, date_range: Tuple[datetime.datetime], period: str = 'weekly'
+    ) -> pd.DataFrame:
+        """Returns number of crimes in each period of current crimes dataset version,
+        so trend chart doesn't count all crimes on each run.
+
+        Args:
+            primary_type (str): A string to get crimes data
+            date_range: A tuple of two selected date, crimes are not filtered until user selects both dates
+            period (str): "daily", "weekly", or "monthly"
+
+        Returns:
+            A pandas DataFrame of number of crimes that is indexed by period start date
+        """
+        return cls.__count_crimes(primary_type, cls.get_dataset_version(), tuple(date_range), period)
+
+    @staticmethod
+    @st.experimental_memo(show_spinner=False, max_entries=DASHBOARD_MEMO_MAX_ENTRIES)
+    def __count_crimes(
+            primary_type: str, dataset_version: int, date_range: Tuple[datetime.datetime], period: str
+    ) -> pd.DataFrame:
+        """Count crimes of primary type between selected dates in each period, crimes are already in memory,
+        so changing dates doesn't call API.
+
+        Args:
+            primary_type (str): A string to get crimes data
+            dataset_version (int): version of cached crimes data
+            date_range: A tuple of two selected date, crimes are not filtered until user selects both dates
+            period (str): "daily", "weekly", or "monthly"
+
+        Returns:
+            A pandas DataFrame of number of crimes that is indexed by period start date
+        """
+
+        dates = StreamlitDashboardManager.filter_crimes_df_based_on_date(
+            StreamlitDashboardManager.__load_crimes_df(primary_type, dataset_version), date_range
+        )['date']
+        # crimes are counted in the same periods as API, weeks start on Monday
+        if period == 'weekly':
+            dates = dates - pd.to_timedelta(dates.dt.weekday, unit='D')
+        elif period == 'monthly':
+            dates = dates.dt.to_period('M').dt.to_timestamp()
+        return dates.value_counts().sort_index().rename_axis('date').to_frame('count')
 
     @classmethod
     def load_crimes_of_type_into_df(cls, crimes_data: List[Dict[str, Union[str, float]]]) -> pd.DataFrame:
@@ -81,12 +342,12 @@ class StreamlitDashboardManager:
             raise ex
 
     @classmethod
-    def create_crimes_map(cls, crimes_df: pd.DataFrame):
-        """Create a pydeck_chart of crimes DataFrame,
+    def create_crimes_map(cls, crimes_cells_df: pd.DataFrame):
+        """Create a pydeck_chart of aggregated crimes DataFrame,
         initialize latitude and longitude is Chicago city center.
 
         Args:
-            crimes_df: A pandas DataFrame of crimes data
+            crimes_cells_df: A pandas DataFrame of map cells and number of crimes in each of them
         """
         st.pydeck_chart(pdk.Deck(
             map_style=None,
@@ -97,13 +358,15 @@ class StreamlitDashboardManager:
                 pitch=50,
             ),
             layers=[
+                # crimes are already counted in each cell, so the browser doesn't need to bin them
                 pdk.Layer(
-                    'HexagonLayer',
-                    data=crimes_df,
+                    'ColumnLayer',
+                    data=crimes_cells_df,
                     get_position='[lon, lat]',  # the latitude and longitude column names in DataFrame
-                    radius=100,
+                    get_elevation='count',
+                    radius=MAP_CELL_RESOLUTION / 2,
                     elevation_scale=4,
-                    elevation_range=[0, 400],
+                    get_fill_color='[255, 140, 0, 180]',
                     pickable=True,
                     extruded=True,
                 ),
@@ -152,10 +415,10 @@ class StreamlitDashboardManager:
             primary_types = cls.get_primary_types()
             # create a dropdown menu with fetched primary types, first item in the list will be default
             selected_primary_type = st.selectbox('Crime Type', primary_types)
-            # get crimes data based on the selected primary type
-            crimes_of_primary_type = cls.get_crimes_of_primary_type(selected_primary_type)
-            # convert crimes data to a DataFrame, so we can create a map of it
-            crimes_df = cls.load_crimes_of_type_into_df(crimes_of_primary_type)
+            # user may select the next primary types, so their crimes are fetched while this one is shown
+            cls.prefetch_crimes_of_primary_types(primary_types, selected_primary_type)
+            # get crimes data based on the selected primary type as a DataFrame
+            crimes_df = cls.get_crimes_of_primary_type(selected_primary_type)
             # create a date input and let user change dates
             # default values will be the minimum and maximum of fetched crimes dates
             selected_dates = st.date_input(
@@ -168,8 +431,10 @@ class StreamlitDashboardManager:
             crimes_df = cls.filter_crimes_df_based_on_date(crimes_df, selected_dates)
             # let user know how many crimes are shown on the map
             st.write(f'Found {len(crimes_df)} crimes of type "{selected_primary_type}" between selected dates')
-            # everything is fine, show the map!
-            cls.create_crimes_map(crimes_df)
+            # everything is fine, show the map of crimes cells between selected dates!
+            cls.create_crimes_map(cls.get_crimes_aggregate_of_primary_type(selected_primary_type, selected_dates))
+            # trend of crimes in weeks
+            st.line_chart(cls.get_crimes_statistics_of_primary_type(selected_primary_type, selected_dates))
         except Exception:
             # it looks like we got in trouble, check the logs
             # let user know that error is happened
@@ -0,0 +1,170 @@
+import os
+import unittest
+from http import HTTPStatus
+from unittest import mock
+
+import fakeredis
+import httpx
+
+# Flask app reads its secret key when it is imported
+os.environ.setdefault('FLASK_SECRET_KEY', 'test secret key')
+
+from api import services
+from api.asgi import CrimesASGIApplication
+from api.app import application as flask_application
+from benchmarks.synthetic_crimes import SyntheticCrimes
+from celery_app.cache_manager import AsyncRedisUtils, CacheManager, RedisUtils
+from celery_app.crimes_aggregation import CrimesAggregator, crimes_aggregate_resolutions
+from celery_app.prepared_responses import PreparedResponse
+from utilities.metrics_utils import MetricsUtils
+
+
+class TestCrimesASGIApplication(unittest.IsolatedAsyncioTestCase):
+    primary_type = 'ARSON'
+
+    async def asyncSetUp(self):
+        self.redis_client, self.async_redis_client = RedisUtils.get_redis_client(), AsyncRedisUtils.get_redis_client()
+        # Flask app and event loop routes read the same fake redis server
+        redis_server = fakeredis.FakeServer()
+        RedisUtils.set_redis_client(fakeredis.FakeStrictRedis(server=redis_server))
+        AsyncRedisUtils.set_redis_client(fakeredis.FakeAsyncRedis(server=redis_server))
+        # responses are read from redis in each request, so tests don't depend on local cache of other tests
+        local_cache_patcher = mock.patch('api.local_cache.local_cache_ttl_seconds', 0)
+        local_cache_patcher.start()
+        self.addCleanup(local_cache_patcher.stop)
+
+        crimes = SyntheticCrimes.generate_columns(100)
+        self.generation = CacheManager.new_crimes_generation()
+        CacheManager.set_crimes_primary_types((self.primary_type, 'HOMICIDE'))
+        CacheManager.set_crimes_filtered_by_primary_type(self.primary_type, crimes, self.generation)
+        CacheManager.set_crimes_aggregates({self.primary_type: {
+            resolution: CrimesAggregator.aggregate(crimes, resolution) for resolution in crimes_aggregate_resolutions
+        }}, self.generation)
+        self.prepared_response = PreparedResponse.build(crimes.to_records())
+        CacheManager.set_crimes_prepared_responses({self.primary_type: self.prepared_response}, self.generation)
+        CacheManager.set_crimes_generation(self.generation)
+
+        self.application = CrimesASGIApplication(flask_application, wsgi_threads=2)
+        self.client = httpx.AsyncClient(transport=httpx.ASGITransport(app=self.application), base_url='http://test')
+
+    async def asyncTearDown(self):
+        await self.client.aclose()
+        await AsyncRedisUtils.get_redis_client().close()
+        RedisUtils.set_redis_client(self.redis_client)
+        AsyncRedisUtils.set_redis_client(self.async_redis_client)
+
+    def pass_requests_to(self, status: HTTPStatus):
+        """Replace Flask app with an app that answers all requests with given status"""
+
+        async def wsgi_application(scope, receive, send):
+            await send({'type': 'http.response.start', 'status': status.value, 'headers': []})
+            await send({'type': 'http.response.body', 'body': b''})
+
+        patcher = mock.patch.object(self.application, 'wsgi_application', wsgi_application)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    async def test_cached_responses_are_answered_in_event_loop(self):
+        self.pass_requests_to(HTTPStatus.IM_A_TEAPOT)
+        response = await self.client.get('/api/crimes/primary_types')
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertEqual(response.json()['data'], [self.primary_type, 'HOMICIDE'])
+        response = await self.client.get('/api/crimes/', params={'primary_type': self.primary_type})
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertEqual(len(response.json()['data']), 100)
+        response = await self.client.get(
+            '/api/crimes/aggregate', params={'primary_type': self.primary_type, 'resolution': 500}
+        )
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertEqual(sum(cell['count'] for cell in response.json()['data']), 100)
+
+        # requests that are not answered in event loop are passed to Flask app
+        for path, params in (
+                ('/api/crimes/version', {}),
+                ('/api/crimes/', {'primary_type': self.primary_type, 'limit': 10}),
+                ('/api/crimes/', {'primary_type': 'HOMICIDE'}),
+                ('/api/crimes/aggregate', {'primary_type': self.primary_type, 'resolution': 7}),
+        ):
+            response = await self.client.get(path, params=params)
+            self.assertEqual(response.status_code, HTTPStatus.IM_A_TEAPOT, path)
+
+    async def test_first_value_of_repeated_param_is_used(self):
+        self.pass_requests_to(HTTPStatus.IM_A_TEAPOT)
+        response = await self.client.get('/api/crimes/', params=[
+            ('primary_type', self.primary_type), ('primary_type', 'HOMICIDE')
+        ])
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertEqual(response.headers['etag'], f'"{self.prepared_response.etag}"')
+        response = await self.client.get('/api/crimes/', params=[
+            ('primary_type', 'HOMICIDE'), ('primary_type', self.primary_type)
+        ])
+        self.assertEqual(response.status_code, HTTPStatus.IM_A_TEAPOT)
+
+    async def test_cache_hits_are_counted(self):
+        hit_metric = b'crimes_cache_lookups_total{primary_type="ARSON",result="hit"}'
+
+        def count_hits() -> float:
+            metrics, _ = MetricsUtils.generate_metrics()
+            line = next((line for line in metrics.splitlines() if line.startswith(hit_metric)), None)
+            return float(line.split()[-1]) if line is not None else 0
+
+        hits = count_hits()
+        await self.client.get('/api/crimes/', params={'primary_type': self.primary_type})
+        self.assertEqual(count_hits(), hits + 1)
+
+    async def test_flask_fallback(self):
+        response = await self.client.get('/api/crimes/version')
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertIsInstance(response.json()['data'], int)
+        response = await self.client.get('/api/crimes/', params={'primary_type': self.primary_type, 'limit': 10})
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertEqual(len(response.json()['data']), 10)
+
+    async def test_etag(self):
+        params = {'primary_type': self.primary_type}
+        response = await self.client.get('/api/crimes/', params=params)
+        self.assertEqual(response.headers['etag'], f'"{self.prepared_response.etag}"')
+        response = await self.client.get(
+            '/api/crimes/', params=params, headers={'If-None-Match': response.headers['etag']}
+        )
+        self.assertEqual(response.status_code, HTTPStatus.NOT_MODIFIED)
+        self.assertEqual(response.content, b'')
+
+    async def test_content_encoding(self):
+        params = {'primary_type': self.primary_type}
+        response = await self.client.get('/api/crimes/', params=params, headers={'Accept-Encoding': 'gzip'})
+        self.assertEqual(response.headers['content-encoding'], 'gzip')
+        self.assertEqual(len(response.json()['data']), 100)
+        response = await self.client.get(
+            '/api/crimes/', params=params, headers={'Accept-Encoding': 'gzip;q=0, identity'}
+        )
+        self.assertNotIn('content-encoding', response.headers)
+        self.assertEqual(response.content, self.prepared_response.bodies['identity'])
+
+    async def test_stale_response_is_passed_to_flask(self):
+        RedisUtils.get_redis_client().delete(
+            CacheManager.crimes_freshness_key_generator(self.primary_type, self.generation)
+        )
+        with mock.patch.object(services.celery, 'send_task') as send_task:
+            response = await self.client.get('/api/crimes/', params={'primary_type': self.primary_type})
+        # Flask app serves stale crimes and requests a refresh of them
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertEqual(len(response.json()['data']), 100)
+        send_task.assert_called_once_with(
+            'get_crimes_by_primary_type_from_bigquery_and_cache', args=(self.primary_type,), queue='crimes'
+        )
+
+    async def test_request_duration_and_server_timing(self):
+        with mock.patch('api.asgi.request_profiling_enabled', True):
+            response = await self.client.get('/api/crimes/', params={'primary_type': self.primary_type})
+        # fakeredis client is not instrumented, so only the total duration is sent
+        self.assertIn('total;dur=', response.headers['server-timing'])
+        metrics, _ = MetricsUtils.generate_metrics()
+        self.assertIn(
+            b'api_request_duration_seconds_count{endpoint="chicago_crimes_routes.get_chicago_crimes_by_primary_type",'
+            b'status="200"}', metrics
+        )
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,91 @@
+import random
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+import numpy as np
+
+from benchmarks.load_test import CrimesLoadTest
+from benchmarks.run_benchmarks import CrimesBenchmarks, StubBigQueryManager
+from benchmarks.synthetic_crimes import SyntheticCrimes
+
+
+class TestSyntheticCrimes(unittest.TestCase):
+    def test_generate_columns(self):
+        crimes = SyntheticCrimes.generate_columns(5000)
+        south, west, north, east = SyntheticCrimes.city_bbox
+        self.assertEqual(len(crimes), 5000)
+        self.assertTrue(((crimes.lat >= south) & (crimes.lat <= north)).all())
+        self.assertTrue(((crimes.lon >= west) & (crimes.lon <= east)).all())
+        # crimes are sorted based on date in descending order like crimes data backends
+        self.assertTrue((np.diff(crimes.days) <= 0).all())
+        self.assertTrue(np.array_equal(crimes.lat, SyntheticCrimes.generate_columns(5000).lat))
+
+    def test_generate_arrow_table(self):
+        table = SyntheticCrimes.generate_arrow_table(5000, null_fraction=0.1)
+        self.assertEqual(table.column_names, ['latitude', 'longitude', 'crime_date'])
+        self.assertGreater(table.column('latitude').null_count, 0)
+
+
+class TestCrimesBenchmarks(unittest.TestCase):
+    def test_compare(self):
+        baseline = [
+            {'name': 'cache_set_crimes', 'rows': 2000, 'min_seconds': 0.010},
+            {'name': 'api_json_response', 'rows': 2000, 'min_seconds': 0.010},
+        ]
+        results = [
+            {'name': 'cache_set_crimes', 'rows': 2000, 'min_seconds': 0.011},
+            {'name': 'api_json_response', 'rows': 2000, 'min_seconds': 0.020},
+            {'name': 'api_arrow_response', 'rows': 2000, 'min_seconds': 0.020},
+            {'name': 'dashboard_load_crimes_of_type_into_df', 'rows': 2000, 'skipped': 'dependency is not installed'},
+        ]
+        regressions = CrimesBenchmarks.compare(baseline, results, max_slowdown=0.2)
+        self.assertEqual([(item['name'], item['rows']) for item in regressions], [('api_json_response', 2000)])
+        self.assertAlmostEqual(regressions[0]['slowdown'], 1.0)
+
+
+    def test_stub_bigquery_backend(self):
+        query_response = SyntheticCrimes.generate_arrow_table(1000, null_fraction=0)
+        backend = StubBigQueryManager.create(query_response)
+        crimes = backend.query_crimes_columns_by_primary_type('HOMICIDE')
+        self.assertEqual(len(crimes), 1000)
+        # results of stub client are not reused, so each backend converts its own query response
+        other_backend = StubBigQueryManager.create(SyntheticCrimes.generate_arrow_table(10, null_fraction=0))
+        self.assertEqual(len(other_backend.query_crimes_columns_by_primary_type('HOMICIDE')), 10)
+
+
+class TestCrimesLoadTest(unittest.TestCase):
+    def test_random_request(self):
+        with tempfile.TemporaryDirectory() as work_path:
+            load_test = CrimesLoadTest(rows_per_type=100, warm_types=5, work_path=work_path)
+        random_generator = random.Random(0)
+        for _ in range(200):
+            kind, primary_type, path, params, headers = load_test.random_request(random_generator)
+            self.assertTrue(path.startswith('/api/crimes/'))
+            self.assertEqual(params.get('primary_type'), primary_type)
+            if 'start_date' in params:
+                self.assertLess(params['start_date'], params['end_date'])
+
+    def test_only_requests_before_caching_are_cold(self):
+        with tempfile.TemporaryDirectory() as work_path:
+            load_test = CrimesLoadTest(rows_per_type=100, warm_types=5, work_path=work_path)
+        samples = []
+        with mock.patch('benchmarks.load_test.requests.Session') as session:
+            session.return_value.get.return_value.status_code = 200
+            load_test.run_client('http://test', time.monotonic() + 0.1, 0, samples)
+        cold_samples = [item for item in samples if item[1] == 'cold']
+        self.assertTrue(cold_samples)
+        # a primary type is cached by its first request, so one request of each cold primary type is cold
+        self.assertEqual(len(cold_samples), len(load_test.cached_types - load_test.warm_types))
+        # requests without primary type are neither warm nor cold
+        self.assertTrue(all((item[1] is None) == (item[0] in ('primary_types', 'version')) for item in samples))
+
+    def test_summarize(self):
+        samples = [('crimes_arrow', 'warm', False, item / 1000) for item in range(1, 101)]
+        samples.append(('version', None, True, 0.2))
+        summary = CrimesLoadTest.summarize(samples, duration=10)
+        self.assertEqual((summary['requests'], summary['errors']), (101, 1))
+        self.assertEqual(summary['requests_per_second'], 10.1)
+        self.assertAlmostEqual(summary['p50_ms'], 51, places=3)
+        self.assertEqual(summary['max_ms'], 200)
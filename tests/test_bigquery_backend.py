@@ -0,0 +1,43 @@
+import unittest
+
+from google.api_core.exceptions import Conflict
+
+from benchmarks.run_benchmarks import StubBigQueryClient
+from benchmarks.synthetic_crimes import SyntheticCrimes
+from big_query.crimes import BigQueryManager
+from big_query.query_cache import QueryResultCache
+
+
+class ConflictingBigQueryClient(StubBigQueryClient):
+    """A stub client whose shared query jobs already exist, and the existing job has failed"""
+
+    def __init__(self, query_response):
+        super().__init__(query_response)
+        self.job_ids = []
+
+    def query(self, query: str, **kwargs) -> StubBigQueryClient.QueryJob:
+        self.job_ids.append(kwargs.get('job_id') or kwargs.get('job_id_prefix'))
+        if kwargs.get('job_id'):
+            raise Conflict('Already Exists')
+        return super().query(query, **kwargs)
+
+    # noinspection PyUnusedLocal
+    def get_job(self, job_id: str, timeout: float) -> StubBigQueryClient.QueryJob:
+        failed_job = StubBigQueryClient.QueryJob(self.query_response)
+        failed_job.error_result = {'reason': 'backendError'}
+        return failed_job
+
+
+class TestBigQueryManager(unittest.TestCase):
+    def test_failed_shared_job_is_not_reused(self):
+        client = ConflictingBigQueryClient(SyntheticCrimes.generate_arrow_table(100, null_fraction=0))
+        backend = BigQueryManager(client=client, query_results=QueryResultCache(0))
+        self.assertEqual(len(backend.query_crimes_columns_by_primary_type('HOMICIDE')), 100)
+        shared_job_id, new_job_id = client.job_ids
+        # query runs again in a new job instead of waiting for the failed one
+        self.assertTrue(new_job_id.startswith(shared_job_id))
+        self.assertNotEqual(new_job_id, shared_job_id)
+
+
+if __name__ == '__main__':
+    unittest.main()
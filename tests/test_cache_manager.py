@@ -0,0 +1,73 @@
+import pickle
+import unittest
+
+import fakeredis
+
+from benchmarks.synthetic_crimes import SyntheticCrimes
+from celery_app.cache_manager import CacheManager, RedisUtils, crimes_generation_retention_seconds
+
+
+class TestCacheManager(unittest.TestCase):
+    def setUp(self):
+        self.redis_client = RedisUtils.get_redis_client()
+        RedisUtils.set_redis_client(fakeredis.FakeStrictRedis())
+
+    def tearDown(self):
+        RedisUtils.set_redis_client(self.redis_client)
+
+    def test_crimes_of_generation(self):
+        crimes = SyntheticCrimes.generate_columns(1000)
+        generation = CacheManager.new_crimes_generation()
+        self.assertTrue(CacheManager.set_crimes_filtered_by_primary_type('HOMICIDE', crimes, generation))
+        # crimes are not read by API workers until their generation is published
+        self.assertIsNone(CacheManager.get_crimes_columns_by_primary_type('HOMICIDE'))
+        self.assertTrue(CacheManager.set_crimes_generation(generation))
+        cached_crimes, is_fresh = CacheManager.get_crimes_columns_by_primary_type_with_freshness('HOMICIDE')
+        self.assertTrue(is_fresh)
+        self.assertEqual(cached_crimes.fingerprint, crimes.fingerprint)
+
+    def test_pickled_crimes_are_read_until_first_generation(self):
+        crimes = SyntheticCrimes.generate_columns(100).to_records()
+        redis_client = RedisUtils.get_redis_client()
+        # crimes of releases before the columnar encoding are pickled lists of dicts without a generation
+        redis_client.set('CrimesByType_ARSON', pickle.dumps(crimes))
+        CacheManager.set_crimes_primary_types(('ARSON',))
+        self.assertEqual(CacheManager.get_crimes_by_primary_type('ARSON'), crimes)
+        cached_crimes, is_fresh = CacheManager.get_crimes_columns_by_primary_type_with_freshness('ARSON')
+        self.assertEqual(len(cached_crimes), 100)
+        # pickled crimes are served while they are refreshed
+        self.assertFalse(is_fresh)
+
+        generation = CacheManager.new_crimes_generation()
+        CacheManager.set_crimes_filtered_by_primary_type('ARSON', crimes[:10], generation)
+        CacheManager.set_crimes_generation(generation)
+        self.assertEqual(len(CacheManager.get_crimes_by_primary_type('ARSON')), 10)
+        self.assertTrue(0 < redis_client.ttl('CrimesByType_ARSON') <= crimes_generation_retention_seconds)
+
+    def test_cold_crimes_keep_expiry_time_when_rewritten(self):
+        crimes = SyntheticCrimes.generate_columns(1000)
+        generation = CacheManager.new_crimes_generation()
+        CacheManager.set_crimes_filtered_by_primary_types({'ARSON': crimes, 'HOMICIDE': crimes}, generation)
+        CacheManager.set_crimes_generation(generation)
+        self.assertTrue(CacheManager.expire_crimes_of_primary_types(['ARSON']))
+        # a refresh in place writes crimes and derived data again
+        CacheManager.set_crimes_filtered_by_primary_types({'ARSON': crimes, 'HOMICIDE': crimes})
+        CacheManager.set_crimes_statistics({'ARSON': {'summary': {}}, 'HOMICIDE': {'summary': {}}})
+        redis_client = RedisUtils.get_redis_client()
+        for key_generator in (
+                CacheManager.crimes_by_primary_type_key_generator, CacheManager.crimes_statistics_key_generator
+        ):
+            self.assertGreater(redis_client.ttl(key_generator('ARSON', generation)), 0)
+            self.assertEqual(redis_client.ttl(key_generator('HOMICIDE', generation)), -1)
+
+    def test_only_cached_primary_types_are_counted(self):
+        CacheManager.set_crimes_primary_types(('ARSON', 'HOMICIDE'))
+        CacheManager.record_crimes_requests({'ARSON': 3, 'NOT A PRIMARY TYPE': 5}, {'ARSON': 1})
+        self.assertEqual(CacheManager.get_crimes_popularity(), {'ARSON': (3.0, 1.0)})
+        # counters that are decayed to almost zero are removed
+        CacheManager.decay_crimes_popularity(0.001)
+        self.assertEqual(CacheManager.get_crimes_popularity(), {})
+
+
+if __name__ == '__main__':
+    unittest.main()
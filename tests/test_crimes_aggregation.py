@@ -0,0 +1,24 @@
+import unittest
+
+from celery_app.crimes_aggregation import CrimesAggregator
+from celery_app.crimes_codec import CrimesColumns
+
+
+class TestCrimesAggregator(unittest.TestCase):
+    def test_aggregate(self):
+        crimes = CrimesColumns.from_records([
+            {'lat': 41.87810, 'lon': -87.62980, 'date': '2023-01-07'},
+            {'lat': 41.87811, 'lon': -87.62981, 'date': '2023-01-06'},
+            {'lat': 41.79234, 'lon': -87.60083, 'date': '2023-01-05'},
+        ])
+        cells = CrimesAggregator.aggregate(crimes, resolution=100)
+        self.assertEqual(sorted(item['count'] for item in cells), [1, 2])
+        latitude_step, longitude_step = CrimesAggregator.cell_size(100)
+        for cell in cells:
+            self.assertTrue(any(
+                abs(cell['lat'] - lat) <= latitude_step / 2 and abs(cell['lon'] - lon) <= longitude_step / 2
+                for lat, lon in zip(crimes.lat, crimes.lon)
+            ))
+
+    def test_aggregate_empty_crimes(self):
+        self.assertEqual(CrimesAggregator.aggregate(CrimesColumns.from_records([]), resolution=100), [])
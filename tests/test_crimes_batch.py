@@ -0,0 +1,94 @@
+import os
+import threading
+import time
+import unittest
+from http import HTTPStatus
+from unittest import mock
+
+import fakeredis
+
+# Flask app reads its secret key when it is imported
+os.environ.setdefault('FLASK_SECRET_KEY', 'test secret key')
+
+from api import services
+from api.app import application
+from benchmarks.synthetic_crimes import SyntheticCrimes
+from big_query.backend import CrimesDataBackend
+from celery_app.cache_manager import CacheManager, RedisUtils
+
+
+class TestCrimesBatch(unittest.TestCase):
+    def setUp(self):
+        self.redis_client = RedisUtils.get_redis_client()
+        RedisUtils.set_redis_client(fakeredis.FakeStrictRedis())
+        for patcher in (
+                # crimes are read from redis in each request, so tests don't depend on local cache of other tests
+                mock.patch('api.local_cache.local_cache_ttl_seconds', 0),
+                mock.patch.object(services.celery, 'send_task'),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        self.crimes = {
+            primary_type: SyntheticCrimes.generate_columns(rows, seed=rows)
+            for primary_type, rows in (('ARSON', 10), ('HOMICIDE', 20), ('THEFT', 30))
+        }
+        CacheManager.set_crimes_primary_types(tuple(self.crimes))
+        cached_crimes = {'ARSON': self.crimes['ARSON']}
+        self.generation = CacheManager.new_crimes_generation()
+        CacheManager.set_crimes_filtered_by_primary_types(cached_crimes, self.generation)
+        CacheManager.set_crimes_generation(self.generation)
+
+        self.backend = mock.Mock()
+        self.backend.query_latest_crimes_columns_of_primary_types.side_effect = lambda primary_types: {
+            primary_type: self.crimes[primary_type] for primary_type in primary_types
+        }
+        backend_patcher = mock.patch.object(CrimesDataBackend, 'get_backend', return_value=self.backend)
+        backend_patcher.start()
+        self.addCleanup(backend_patcher.stop)
+
+    def tearDown(self):
+        RedisUtils.set_redis_client(self.redis_client)
+
+    def get_batch(self, primary_types):
+        response = application.test_client().get('/api/crimes/batch', query_string={'primary_type': primary_types})
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        return response.json['data']
+
+    def test_only_missing_primary_types_are_fetched(self):
+        crimes = self.get_batch(['ARSON', 'HOMICIDE', 'THEFT'])
+        self.assertEqual({primary_type: len(items) for primary_type, items in crimes.items()}, {
+            'ARSON': 10, 'HOMICIDE': 20, 'THEFT': 30
+        })
+        self.backend.query_latest_crimes_columns_of_primary_types.assert_called_once_with(['HOMICIDE', 'THEFT'])
+        # fetched crimes are cached, so the next request doesn't query the backend
+        self.assertEqual(len(CacheManager.get_crimes_columns_by_primary_type('THEFT', self.generation)), 30)
+        self.get_batch(['HOMICIDE', 'THEFT'])
+        self.backend.query_latest_crimes_columns_of_primary_types.assert_called_once()
+
+    def test_primary_types_that_are_being_fetched_are_waited_for(self):
+        # another worker holds the lock of THEFT and caches its crimes
+        is_locked = threading.Event()
+
+        def fetch_theft_crimes():
+            lock = CacheManager.get_crimes_lock('THEFT', timeout=10)
+            lock.acquire(blocking=False)
+            is_locked.set()
+            time.sleep(0.2)
+            CacheManager.set_crimes_filtered_by_primary_type('THEFT', self.crimes['THEFT'], self.generation)
+            lock.release()
+
+        other_worker = threading.Thread(target=fetch_theft_crimes)
+        other_worker.start()
+        is_locked.wait()
+        crimes = self.get_batch(['ARSON', 'HOMICIDE', 'THEFT'])
+        other_worker.join()
+        self.assertEqual(len(crimes['THEFT']), 30)
+        self.backend.query_latest_crimes_columns_of_primary_types.assert_called_once_with(['HOMICIDE'])
+        self.backend.query_crimes_columns_by_primary_type.assert_not_called()
+        # locks of this worker are released
+        self.assertFalse(CacheManager.get_crimes_lock('HOMICIDE', timeout=10).locked())
+
+
+if __name__ == '__main__':
+    unittest.main()
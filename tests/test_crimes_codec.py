@@ -0,0 +1,67 @@
+import datetime
+import pickle
+import unittest
+
+from celery_app.crimes_codec import CrimesCodec, CrimesColumns, pyarrow
+
+
+class TestCrimesCodec(unittest.TestCase):
+    crimes = [
+        {'lat': 41.8781136, 'lon': -87.6297982, 'date': '2023-01-07'},
+        {'lat': 41.7923413, 'lon': -87.6008392, 'date': '2023-01-05'},
+        {'lat': 41.9012345, 'lon': -87.7012345, 'date': '2001-01-01'},
+    ]
+
+    def test_encode_and_decode(self):
+        for compression in ('none', 'zlib', 'zstd', 'lz4'):
+            encoded_crimes = CrimesCodec.encode(CrimesColumns.from_records(self.crimes), compression=compression)
+            self.assertTrue(CrimesCodec.is_encoded(encoded_crimes))
+            self.assertEqual(CrimesCodec.decode_records(encoded_crimes), self.crimes)
+
+    def test_float32_encoding(self):
+        encoded_crimes = CrimesCodec.encode(CrimesColumns.from_records(self.crimes), float_bits=32)
+        for decoded_crime, crime in zip(CrimesCodec.decode_records(encoded_crimes), self.crimes):
+            self.assertAlmostEqual(decoded_crime['lat'], crime['lat'], places=5)
+            self.assertAlmostEqual(decoded_crime['lon'], crime['lon'], places=5)
+            self.assertEqual(decoded_crime['date'], crime['date'])
+
+    def test_empty_crimes(self):
+        encoded_crimes = CrimesCodec.encode(CrimesColumns.from_records([]))
+        self.assertEqual(CrimesCodec.decode_records(encoded_crimes), [])
+
+    def test_decode_pickled_crimes(self):
+        pickled_crimes = pickle.dumps(self.crimes)
+        self.assertFalse(CrimesCodec.is_encoded(pickled_crimes))
+        self.assertEqual(CrimesCodec.decode_records(pickled_crimes), self.crimes)
+        self.assertEqual(CrimesCodec.decode_columns(pickled_crimes).to_records(), self.crimes)
+
+    def test_invalid_data(self):
+        with self.assertRaises(CrimesCodec.DecodeError):
+            CrimesCodec.decode(b'CRMS')
+
+    def test_date_range_indexes(self):
+        crimes_columns = CrimesColumns.from_records(self.crimes)
+        self.assertEqual(
+            crimes_columns.date_range_indexes(datetime.date(2023, 1, 5), datetime.date(2023, 1, 6)), (1, 2)
+        )
+        self.assertEqual(crimes_columns.date_range_indexes(start_date=datetime.date(2023, 1, 5)), (0, 2))
+        self.assertEqual(crimes_columns.date_range_indexes(end_date=datetime.date(2022, 1, 1)), (2, 3))
+        self.assertEqual(crimes_columns.date_range_indexes(), (0, 3))
+        self.assertEqual(crimes_columns[1:2].to_records(), self.crimes[1:2])
+
+    @unittest.skipIf(pyarrow is None, 'pyarrow is not installed')
+    def test_to_arrow_ipc(self):
+        table = pyarrow.ipc.open_stream(CrimesColumns.from_records(self.crimes).to_arrow_ipc()).read_all()
+        self.assertEqual(table.column_names, ['lat', 'lon', 'date'])
+        self.assertEqual(table.schema.field('date').type, pyarrow.date32())
+        records = [{**item, 'date': item['date'].isoformat()} for item in table.to_pylist()]
+        self.assertEqual(records, self.crimes)
+
+    @unittest.skipIf(pyarrow is None, 'pyarrow is not installed')
+    def test_from_arrow(self):
+        table = pyarrow.table({
+            'latitude': pyarrow.array([41.8781136, None, 0.0, 41.7923413], pyarrow.float64()),
+            'longitude': pyarrow.array([-87.6297982, -87.6, -87.6, -87.6008392], pyarrow.float64()),
+            'crime_date': pyarrow.array([datetime.date(2023, 1, day) for day in (7, 6, 6, 5)]),
+        })
+        self.assertEqual(CrimesColumns.from_arrow(table).to_records(), self.crimes[:2])
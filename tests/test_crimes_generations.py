@@ -0,0 +1,77 @@
+import unittest
+from unittest import mock
+
+import fakeredis
+
+from benchmarks.synthetic_crimes import SyntheticCrimes
+from celery_app.cache_manager import CacheManager, RedisUtils, crimes_generation_retention_seconds
+from celery_app.tasks import cache_crimes_of_primary_types
+
+
+class TestCrimesGenerations(unittest.TestCase):
+    def setUp(self):
+        self.redis_client = RedisUtils.get_redis_client()
+        RedisUtils.set_redis_client(fakeredis.FakeStrictRedis())
+        self.crimes = SyntheticCrimes.generate_columns(100)
+
+    def tearDown(self):
+        RedisUtils.set_redis_client(self.redis_client)
+
+    def test_partially_written_generation_is_not_published(self):
+        self.assertTrue(cache_crimes_of_primary_types({'ARSON': self.crimes}, new_generation=True))
+        generation = CacheManager.get_crimes_generation()
+        dataset_version = CacheManager.get_crimes_dataset_version()
+
+        with mock.patch.object(CacheManager, 'set_crimes_prepared_responses', return_value=False):
+            self.assertFalse(cache_crimes_of_primary_types(
+                {'ARSON': SyntheticCrimes.generate_columns(10, seed=1)}, new_generation=True
+            ))
+        # API workers keep reading the previous generation
+        self.assertEqual(CacheManager.get_crimes_generation(), generation)
+        self.assertEqual(CacheManager.get_crimes_dataset_version(), dataset_version)
+        self.assertEqual(len(CacheManager.get_crimes_columns_by_primary_type('ARSON')), 100)
+
+    def test_older_generation_does_not_replace_newer_one(self):
+        older_generation = CacheManager.new_crimes_generation()
+        newer_generation = CacheManager.new_crimes_generation()
+        self.assertTrue(CacheManager.set_crimes_generation(newer_generation))
+        self.assertFalse(CacheManager.set_crimes_generation(older_generation))
+        self.assertEqual(CacheManager.get_crimes_generation(), newer_generation)
+
+    def test_old_generations_expire(self):
+        cache_crimes_of_primary_types({'ARSON': self.crimes}, new_generation=True)
+        old_generation = CacheManager.get_crimes_generation()
+        cache_crimes_of_primary_types({'ARSON': self.crimes}, new_generation=True)
+        new_generation = CacheManager.get_crimes_generation()
+        self.assertGreater(new_generation, old_generation)
+
+        redis_client = RedisUtils.get_redis_client()
+        for key_generator in (
+                CacheManager.crimes_by_primary_type_key_generator, CacheManager.crimes_aggregates_key_generator,
+                CacheManager.crimes_response_key_generator
+        ):
+            self.assertTrue(
+                0 < redis_client.ttl(key_generator('ARSON', old_generation)) <= crimes_generation_retention_seconds
+            )
+            self.assertEqual(redis_client.ttl(key_generator('ARSON', new_generation)), -1)
+
+    def test_generations_of_failed_refreshes_expire(self):
+        cache_crimes_of_primary_types({'ARSON': self.crimes}, new_generation=True)
+        with mock.patch.object(CacheManager, 'set_crimes_prepared_responses', return_value=False):
+            cache_crimes_of_primary_types({'THEFT': self.crimes}, new_generation=True)
+        failed_generation = CacheManager.new_crimes_generation() - 1
+
+        redis_client = RedisUtils.get_redis_client()
+        # keys of old generations are known without scanning the keyspace
+        with mock.patch.object(redis_client, 'scan_iter', side_effect=AssertionError):
+            cache_crimes_of_primary_types({'ARSON': self.crimes}, new_generation=True)
+        for key in (
+                CacheManager.crimes_by_primary_type_key_generator('THEFT', failed_generation),
+                CacheManager.crimes_aggregates_key_generator('THEFT', failed_generation),
+                CacheManager.crimes_watermarks_key_generator(failed_generation)
+        ):
+            self.assertTrue(0 < redis_client.ttl(key) <= crimes_generation_retention_seconds, key)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,88 @@
+import unittest
+from unittest import mock
+
+import fakeredis
+
+from benchmarks.synthetic_crimes import SyntheticCrimes
+from big_query.backend import CrimesDataBackend
+from celery_app.cache_manager import CacheManager, RedisUtils
+from celery_app.crimes_codec import CrimesColumns
+from celery_app.tasks import (
+    cache_crimes_of_primary_types, merge_new_crimes, update_crimes_by_primary_type_incrementally
+)
+
+
+class TestCrimesIncrementalRefresh(unittest.TestCase):
+    def setUp(self):
+        self.redis_client = RedisUtils.get_redis_client()
+        RedisUtils.set_redis_client(fakeredis.FakeStrictRedis())
+        limit_patcher = mock.patch.object(CrimesDataBackend, 'crimes_limit', 100)
+        limit_patcher.start()
+        self.addCleanup(limit_patcher.stop)
+
+        self.crimes = {
+            primary_type: SyntheticCrimes.generate_columns(100, seed=seed)
+            for seed, primary_type in enumerate(('ARSON', 'HOMICIDE'))
+        }
+        CacheManager.set_crimes_primary_types(tuple(self.crimes))
+        cache_crimes_of_primary_types(self.crimes, new_generation=True)
+        self.generation = CacheManager.get_crimes_generation()
+
+        self.backend = mock.Mock()
+        backend_patcher = mock.patch.object(CrimesDataBackend, 'get_backend', return_value=self.backend)
+        backend_patcher.start()
+        self.addCleanup(backend_patcher.stop)
+
+    def tearDown(self):
+        RedisUtils.set_redis_client(self.redis_client)
+
+    @staticmethod
+    def crimes_of_day(crimes: CrimesColumns, day: int) -> CrimesColumns:
+        return crimes[crimes.days == day]
+
+    def test_merge_new_crimes(self):
+        cached_crimes = self.crimes['ARSON']
+        watermark = cached_crimes.dates[0]
+        new_crimes = CrimesColumns.from_records(
+            [{'lat': 41.9, 'lon': -87.6, 'date': '2099-01-01'}] +
+            self.crimes_of_day(cached_crimes, cached_crimes.days[0]).to_records()
+        )
+        merged_crimes = merge_new_crimes(cached_crimes, new_crimes, watermark)
+        # crimes of the watermark day are not duplicated, and the oldest crime is dropped to keep the row limit
+        self.assertEqual(len(merged_crimes), 100)
+        self.assertEqual(merged_crimes.dates[0], '2099-01-01')
+        self.assertEqual(merged_crimes[1:].fingerprint, cached_crimes[:99].fingerprint)
+
+    def test_only_changed_primary_types_are_written_into_current_generation(self):
+        arson, homicide = self.crimes['ARSON'], self.crimes['HOMICIDE']
+        self.backend.query_crimes_of_primary_types_since.return_value = {
+            'ARSON': [{'lat': 41.9, 'lon': -87.6, 'date': '2099-01-01'}] +
+            self.crimes_of_day(arson, arson.days[0]).to_records(),
+            # new crimes of HOMICIDE are only its cached crimes of the watermark day
+            'HOMICIDE': self.crimes_of_day(homicide, homicide.days[0]).to_records(),
+        }
+        redis_client = RedisUtils.get_redis_client()
+        # freshness key is set again when crimes of primary type are written
+        homicide_freshness_key = CacheManager.crimes_freshness_key_generator('HOMICIDE', self.generation)
+        redis_client.delete(homicide_freshness_key)
+        dataset_version = CacheManager.get_crimes_dataset_version()
+
+        self.assertTrue(update_crimes_by_primary_type_incrementally())
+        self.assertEqual(CacheManager.get_crimes_generation(), self.generation)
+        self.assertGreater(CacheManager.get_crimes_dataset_version(), dataset_version)
+        self.backend.query_latest_crimes_columns_of_primary_types.assert_not_called()
+        self.assertEqual(CacheManager.get_crimes_watermarks()['ARSON'], '2099-01-01')
+        self.assertEqual(CacheManager.get_crimes_statistics('ARSON', 'daily')['summary']['last_date'], '2099-01-01')
+        # unchanged primary types are not written again
+        self.assertFalse(redis_client.exists(homicide_freshness_key))
+
+    def test_nothing_is_written_without_new_crimes(self):
+        self.backend.query_crimes_of_primary_types_since.return_value = {'ARSON': [], 'HOMICIDE': []}
+        dataset_version = CacheManager.get_crimes_dataset_version()
+        self.assertTrue(update_crimes_by_primary_type_incrementally())
+        self.assertEqual(CacheManager.get_crimes_dataset_version(), dataset_version)
+        self.assertEqual(CacheManager.get_crimes_generation(), self.generation)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,46 @@
+import unittest
+
+from celery_app.crimes_codec import CrimesColumns
+from celery_app.crimes_statistics import CrimesStatistics
+
+
+class TestCrimesStatistics(unittest.TestCase):
+    def setUp(self):
+        self.crimes = CrimesColumns.from_records([
+            {'lat': 41.87810, 'lon': -87.62980, 'date': date}
+            for date in ['2023-02-01', '2023-01-09', '2023-01-08', '2023-01-08', '2023-01-02']
+        ])
+
+    def test_count(self):
+        counts = CrimesStatistics.count(self.crimes)
+        self.assertEqual(counts['daily'], [
+            {'date': '2023-01-02', 'count': 1}, {'date': '2023-01-08', 'count': 2},
+            {'date': '2023-01-09', 'count': 1}, {'date': '2023-02-01', 'count': 1}
+        ])
+        # weeks start on Monday, 2023-01-08 is a Sunday
+        self.assertEqual(counts['weekly'], [
+            {'date': '2023-01-02', 'count': 3}, {'date': '2023-01-09', 'count': 1}, {'date': '2023-01-30', 'count': 1}
+        ])
+        self.assertEqual(counts['monthly'], [{'date': '2023-01-01', 'count': 4}, {'date': '2023-02-01', 'count': 1}])
+
+    def test_summarize(self):
+        summary = CrimesStatistics.summarize(self.crimes)
+        self.assertEqual(summary['count'], 5)
+        self.assertEqual((summary['first_date'], summary['last_date']), ('2023-01-02', '2023-02-01'))
+        self.assertEqual((summary['max_per_day'], summary['max_date']), (2, '2023-01-08'))
+        self.assertEqual(summary['weekdays'], [2, 0, 1, 0, 0, 0, 2])
+
+    def test_empty_crimes(self):
+        statistics = CrimesStatistics.compute(CrimesColumns.from_records([]))
+        self.assertEqual(statistics['weekly'], [])
+        self.assertEqual(statistics['summary']['count'], 0)
+
+    def test_truncated_crimes(self):
+        statistics = CrimesStatistics.compute(self.crimes, is_truncated=True)
+        # crimes of the oldest day may be partial, so they and periods that start before the next day are dropped
+        self.assertEqual(statistics['summary']['truncated_before'], '2023-01-03')
+        self.assertEqual(statistics['summary']['count'], 4)
+        self.assertEqual(statistics['daily'][0], {'date': '2023-01-08', 'count': 2})
+        self.assertEqual(statistics['weekly'], [{'date': '2023-01-09', 'count': 1}, {'date': '2023-01-30', 'count': 1}])
+        self.assertEqual(statistics['monthly'], [{'date': '2023-02-01', 'count': 1}])
+        self.assertIsNone(CrimesStatistics.compute(self.crimes)['summary']['truncated_before'])
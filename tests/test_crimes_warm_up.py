@@ -0,0 +1,42 @@
+import unittest
+
+import fakeredis
+
+from benchmarks.synthetic_crimes import SyntheticCrimes
+from celery_app.cache_manager import CacheManager, RedisUtils
+from celery_app.tasks import publish_crimes_warm_up
+
+
+class TestCrimesWarmUp(unittest.TestCase):
+    def setUp(self):
+        self.redis_client = RedisUtils.get_redis_client()
+        RedisUtils.set_redis_client(fakeredis.FakeStrictRedis())
+        self.crimes = SyntheticCrimes.generate_columns(100)
+
+    def tearDown(self):
+        RedisUtils.set_redis_client(self.redis_client)
+
+    def test_warm_up_with_failed_primary_type_is_not_published(self):
+        generation = CacheManager.new_crimes_generation()
+        CacheManager.set_crimes_filtered_by_primary_type('ARSON', self.crimes, generation)
+        CacheManager.set_crimes_warm_up_status(generation, {
+            'status': 'running', 'started_at': 0, 'primary_type:ARSON': 'succeeded',
+            'primary_type:HOMICIDE': 'failed'
+        })
+        self.assertFalse(publish_crimes_warm_up(generation, ['ARSON', 'HOMICIDE', 'THEFT']))
+        self.assertEqual(CacheManager.get_crimes_generation(), 0)
+        warm_up_status = CacheManager.get_crimes_warm_up_status(generation)
+        self.assertEqual(warm_up_status['status'], 'failed')
+        # primary types without a result, e.g. a lost task, are failed too
+        self.assertEqual(warm_up_status['failed_primary_types'], 'HOMICIDE,THEFT')
+
+        CacheManager.set_crimes_warm_up_status(generation, {
+            'primary_type:HOMICIDE': 'succeeded', 'primary_type:THEFT': 'succeeded'
+        })
+        self.assertTrue(publish_crimes_warm_up(generation, ['ARSON', 'HOMICIDE', 'THEFT']))
+        self.assertEqual(CacheManager.get_crimes_generation(), generation)
+        self.assertEqual(CacheManager.get_crimes_warm_up_status()['status'], 'succeeded')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,38 @@
+import os
+import re
+import unittest
+
+root_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+env_sample_names = ('.env.local.sample', '.env.docker.sample')
+
+
+class TestEnvSamples(unittest.TestCase):
+    @staticmethod
+    def read_env_sample(env_sample_name: str) -> dict:
+        with open(os.path.join(root_dir, env_sample_name)) as env_sample:
+            lines = [line.strip() for line in env_sample if line.strip() and not line.startswith('#')]
+        for line in lines:
+            if not re.fullmatch(r"[A-Z][A-Z0-9_]*=('[^']*'|[^'=\s]*)", line):
+                raise AssertionError(f'{env_sample_name} has a malformed line: {line}')
+        keys = [line.split('=', 1)[0] for line in lines]
+        duplicated_keys = {key for key in keys if keys.count(key) > 1}
+        if duplicated_keys:
+            raise AssertionError(f'{env_sample_name} has duplicated keys: {duplicated_keys}')
+        return dict(line.split('=', 1) for line in lines)
+
+    def test_env_samples_are_well_formed(self):
+        for env_sample_name in env_sample_names:
+            with self.subTest(env_sample_name=env_sample_name):
+                environment = self.read_env_sample(env_sample_name)
+                self.assertEqual(int(environment['MAP_CELL_RESOLUTION']), 100)
+                self.assertGreater(int(environment['CRIMES_ROW_LIMIT']), 0)
+
+    def test_env_samples_have_the_same_keys(self):
+        local_keys = set(self.read_env_sample('.env.local.sample'))
+        docker_keys = set(self.read_env_sample('.env.docker.sample'))
+        # docker sample also has settings of docker compose services
+        self.assertFalse(local_keys - docker_keys)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -2,6 +2,9 @@ import datetime
 import unittest
 
 from api.app import application
+from api.services import CrimesDataManager
+from celery_app.cache_manager import CacheManager, RedisUtils
+from celery_app.tasks import cache_crimes_chunks_of_primary_type
 
 
 class TestFlaskAPIEndpoints(unittest.TestCase):
@@ -21,3 +24,47 @@ class TestFlaskAPIEndpoints(unittest.TestCase):
         self.assertTrue(any([isinstance(crime['lat'], float) for crime in crimes]))
         self.assertTrue(([isinstance(crime['lon'], float) for crime in crimes]))
         self.assertTrue(any([datetime.datetime.strptime(crime['date'], '%Y-%m-%d') for crime in crimes]))
+
+    def test_crimes_dataset_version(self):
+        response = application.test_client().get('/api/crimes/version')
+        self.assertTrue(response.status_code == 200)
+        self.assertIsInstance(response.json['data'], int)
+
+    def test_metrics(self):
+        application.test_client().get('/api/crimes/primary_types')
+        response = application.test_client().get('/metrics')
+        self.assertTrue(response.status_code == 200)
+        self.assertIn('api_request_duration_seconds', response.get_data(as_text=True))
+
+    def test_crimes_pages(self):
+        query_string = {'primary_type': 'HOMICIDE', 'limit': 10}
+        response = application.test_client().get('api/crimes/', query_string=query_string)
+        self.assertTrue(response.status_code == 200)
+        next_cursor = response.json['next_cursor']
+        if next_cursor is not None:
+            response = application.test_client().get(
+                'api/crimes/', query_string={**query_string, 'cursor': next_cursor}
+            )
+            self.assertTrue(response.status_code == 200)
+            # cursor of other crimes data doesn't point to the same crimes
+            fingerprint, index = next_cursor.split('.')
+            response = application.test_client().get(
+                'api/crimes/', query_string={**query_string, 'cursor': f'{int(fingerprint) + 1}.{index}'}
+            )
+            self.assertTrue(response.status_code == 410)
+        response = application.test_client().get('api/crimes/', query_string={**query_string, 'cursor': 'x'})
+        self.assertTrue(response.status_code == 400)
+
+    def test_crimes_stream(self):
+        primary_type = 'HOMICIDE'
+        self.assertTrue(cache_crimes_chunks_of_primary_type(primary_type))
+        response = application.test_client().get('api/crimes/stream', query_string={'primary_type': primary_type})
+        self.assertTrue(response.status_code == 200)
+        self.assertTrue(all(line.startswith(b'{') for line in response.get_data().splitlines()))
+
+        # a chunk that expires while streaming closes the stream with an error instead of truncating it
+        crimes_chunks = CrimesDataManager.iter_crimes_ndjson_by_primary_type(primary_type)
+        chunks_key, _ = CacheManager.get_crimes_chunks_key(primary_type)
+        RedisUtils.get_redis_client().delete(chunks_key)
+        with self.assertRaises(CrimesDataManager.CrimesChunkMissingError):
+            list(crimes_chunks)
@@ -0,0 +1,61 @@
+import csv
+import os
+import tempfile
+import unittest
+
+from big_query.backend import CrimesDataBackend
+from big_query.local_crimes import LocalCrimesManager
+
+
+class TestLocalCrimesBackend(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        extract_path = os.path.join(self.temp_dir.name, 'crimes.csv')
+        self.db_path = os.path.join(self.temp_dir.name, 'crimes.sqlite3')
+        with open(extract_path, 'w', newline='') as extract_file:
+            writer = csv.writer(extract_file)
+            writer.writerow(['ID', 'Date', 'Primary Type', 'Latitude', 'Longitude'])
+            writer.writerow([1, '01/05/2023 10:00:00 PM', 'HOMICIDE', 41.88, -87.63])
+            writer.writerow([2, '01/07/2023 01:30:00 AM', 'HOMICIDE', 41.79, -87.60])
+            writer.writerow([3, '01/06/2023 11:00:00 AM', 'HOMICIDE', '', ''])
+            writer.writerow([4, '01/06/2023 11:00:00 AM', 'NON - CRIMINAL', 41.90, -87.70])
+            writer.writerow([5, '01/06/2023 11:00:00 AM', 'NON-CRIMINAL', 41.91, -87.71])
+        self.assertEqual(LocalCrimesManager.load_extract(extract_path, self.db_path), 5)
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_crimes_primary_types(self):
+        primary_types = LocalCrimesManager(self.db_path).query_crimes_primary_types()
+        self.assertEqual(sorted(primary_types), ['HOMICIDE', 'NON-CRIMINAL'])
+
+    def test_crimes_by_primary_type(self):
+        crimes = LocalCrimesManager(self.db_path).query_crimes_by_primary_type('HOMICIDE')
+        self.assertEqual(
+            crimes,
+            [{'lat': 41.79, 'lon': -87.60, 'date': '2023-01-07'}, {'lat': 41.88, 'lon': -87.63, 'date': '2023-01-05'}]
+        )
+
+    def test_missing_database(self):
+        with self.assertRaises(CrimesDataBackend.QueryError):
+            LocalCrimesManager(os.path.join(self.temp_dir.name, 'missing.sqlite3')).query_crimes_primary_types()
+
+    def test_latest_crimes_of_primary_types(self):
+        backend = LocalCrimesManager(self.db_path)
+        crimes_of_primary_types = backend.query_latest_crimes_of_primary_types(['HOMICIDE', 'NON-CRIMINAL', 'ARSON'])
+        self.assertEqual(crimes_of_primary_types['HOMICIDE'], backend.query_crimes_by_primary_type('HOMICIDE'))
+        self.assertEqual(len(crimes_of_primary_types['NON-CRIMINAL']), 1)
+        self.assertEqual(crimes_of_primary_types['ARSON'], [])
+
+    def test_crimes_of_primary_types_since(self):
+        backend = LocalCrimesManager(self.db_path)
+        new_crimes = backend.query_crimes_of_primary_types_since({'HOMICIDE': '2023-01-06', 'NON-CRIMINAL': '2023-01-07'})
+        self.assertEqual(new_crimes['HOMICIDE'], [{'lat': 41.79, 'lon': -87.60, 'date': '2023-01-07'}])
+        self.assertEqual(new_crimes['NON-CRIMINAL'], [])
+
+    def test_iter_crimes_by_primary_type(self):
+        backend = LocalCrimesManager(self.db_path)
+        chunks = list(backend.iter_crimes_by_primary_type('HOMICIDE', chunk_size=1, limit=0))
+        self.assertEqual(len(chunks), 2)
+        self.assertEqual([item for chunk in chunks for item in chunk], backend.query_crimes_by_primary_type('HOMICIDE'))
+        self.assertEqual(len(list(backend.iter_crimes_by_primary_type('HOMICIDE', chunk_size=10, limit=1))), 1)
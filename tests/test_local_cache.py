@@ -0,0 +1,77 @@
+import json
+import time
+import unittest
+from unittest import mock
+
+import fakeredis
+
+from api.local_cache import CrimesLocalCache, LocalCache
+from celery_app.cache_manager import RedisUtils
+
+
+class TestLocalCache(unittest.TestCase):
+    def test_least_recently_used_item_is_evicted(self):
+        cache = LocalCache(max_items=2, ttl_seconds=60)
+        cache.set('HOMICIDE', 1)
+        cache.set('ARSON', 2)
+        self.assertEqual(cache.get('HOMICIDE'), 1)
+        cache.set('THEFT', 3)
+        self.assertIsNone(cache.get('ARSON'))
+        self.assertEqual(cache.get('HOMICIDE'), 1)
+        self.assertEqual(cache.get('THEFT'), 3)
+
+    def test_expired_item_is_not_returned(self):
+        cache = LocalCache(max_items=2, ttl_seconds=0.01)
+        cache.set('HOMICIDE', 1)
+        time.sleep(0.02)
+        self.assertIsNone(cache.get('HOMICIDE'))
+
+    def test_disabled_cache(self):
+        cache = LocalCache(max_items=2, ttl_seconds=0)
+        cache.set('HOMICIDE', 1)
+        self.assertIsNone(cache.get('HOMICIDE'))
+
+
+class TestCrimesLocalCache(unittest.TestCase):
+    def setUp(self):
+        self.redis_client = RedisUtils.get_redis_client()
+        RedisUtils.set_redis_client(fakeredis.FakeStrictRedis())
+        for patcher in (
+                mock.patch('api.local_cache.local_cache_ttl_seconds', 300),
+                # invalidations are sent to the cache directly instead of a listener thread
+                mock.patch('api.local_cache.threading.Thread'),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.keys = [('crimes', 'ARSON'), ('aggregate', 'ARSON', 100), ('crimes', 'THEFT'), 'generation']
+        self.loaded_keys = []
+
+    def tearDown(self):
+        RedisUtils.set_redis_client(self.redis_client)
+
+    def get_all(self):
+        for key in self.keys:
+            CrimesLocalCache.get_or_load(key, lambda key=key: self.loaded_keys.append(key) or key)
+
+    def test_refresh_of_primary_type_invalidates_only_its_items(self):
+        self.get_all()
+        dataset_version = CrimesLocalCache.get_dataset_version()
+        CrimesLocalCache.invalidate(json.dumps({'dataset_version': dataset_version + 1, 'primary_types': ['ARSON']}))
+        self.assertEqual(CrimesLocalCache.get_dataset_version(), dataset_version + 1)
+        self.loaded_keys.clear()
+        self.get_all()
+        self.assertEqual(self.loaded_keys, self.keys[:2])
+
+        # a new generation invalidates all items
+        CrimesLocalCache.invalidate(str(dataset_version + 2))
+        self.loaded_keys.clear()
+        self.get_all()
+        self.assertEqual(self.loaded_keys, self.keys)
+
+    def test_missed_invalidation_invalidates_all_items(self):
+        self.get_all()
+        dataset_version = CrimesLocalCache.get_dataset_version()
+        CrimesLocalCache.invalidate(json.dumps({'dataset_version': dataset_version + 2, 'primary_types': ['ARSON']}))
+        self.loaded_keys.clear()
+        self.get_all()
+        self.assertEqual(self.loaded_keys, self.keys)
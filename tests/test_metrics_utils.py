@@ -0,0 +1,18 @@
+import unittest
+
+from utilities.metrics_utils import MetricsUtils
+
+
+class TestMetricsUtils(unittest.TestCase):
+    def test_generate_metrics(self):
+        MetricsUtils.crimes_cache_lookups.labels(primary_type='HOMICIDE', result='hit').inc()
+        metrics, content_type = MetricsUtils.generate_metrics()
+        self.assertTrue(content_type.startswith('text/plain'))
+        self.assertIn(b'crimes_cache_lookups_total{primary_type="HOMICIDE",result="hit"}', metrics)
+        self.assertIn(b'redis_command_duration_seconds', metrics)
+
+    def test_primary_type_label(self):
+        primary_types = ('HOMICIDE', 'THEFT')
+        self.assertEqual(MetricsUtils.primary_type_label('HOMICIDE', primary_types), 'HOMICIDE')
+        self.assertEqual(MetricsUtils.primary_type_label('homicide<script>', primary_types), 'other')
+        self.assertEqual(MetricsUtils.primary_type_label('THEFT', ()), 'other')
@@ -0,0 +1,52 @@
+import gzip
+import json
+import unittest
+from http import HTTPStatus
+
+from werkzeug.datastructures import Accept
+from werkzeug.http import parse_accept_header, parse_etags
+
+from api.api_response import APIResponse
+from celery_app.prepared_responses import PreparedResponse
+
+
+class TestPreparedResponse(unittest.TestCase):
+    def test_build_and_mapping(self):
+        data = [{'lat': 41.8781, 'lon': -87.6298, 'date': '2023-01-07'}]
+        prepared_response = PreparedResponse.build(data)
+        body = json.loads(prepared_response.bodies['identity'])
+        self.assertEqual(body['data'], data)
+        self.assertEqual(body['code'], 200)
+        self.assertEqual(gzip.decompress(prepared_response.bodies['gzip']), prepared_response.bodies['identity'])
+
+        mapping = {key.encode(): value for key, value in prepared_response.to_mapping().items()}
+        restored = PreparedResponse.from_mapping(mapping)
+        self.assertEqual(restored.etag, prepared_response.etag)
+        self.assertEqual(restored.bodies, prepared_response.bodies)
+
+    def test_etag_changes_with_data(self):
+        first = PreparedResponse.build([{'lat': 1.0, 'lon': 2.0, 'date': '2023-01-07'}])
+        second = PreparedResponse.build([{'lat': 1.0, 'lon': 2.0, 'date': '2023-01-08'}])
+        self.assertNotEqual(first.etag, second.etag)
+        self.assertEqual(first.etag, PreparedResponse.build([{'lat': 1.0, 'lon': 2.0, 'date': '2023-01-07'}]).etag)
+
+
+    def test_negotiate_content_encoding(self):
+        prepared_response = PreparedResponse.build([{'lat': 1.0, 'lon': 2.0, 'date': '2023-01-07'}])
+        for accept_encoding, content_encoding in (
+                ('gzip, deflate', 'gzip'), ('gzip;q=0, deflate', None), ('*;q=0', None), ('', None)
+        ):
+            http_status, negotiated_encoding, body = APIResponse.negotiate_prepared_response(
+                prepared_response, parse_accept_header(accept_encoding, Accept), parse_etags(None)
+            )
+            self.assertEqual(http_status, HTTPStatus.OK)
+            self.assertEqual(negotiated_encoding, content_encoding)
+            self.assertEqual(body, prepared_response.bodies[content_encoding or 'identity'])
+        http_status, _, body = APIResponse.negotiate_prepared_response(
+            prepared_response, parse_accept_header('gzip', Accept), parse_etags(f'"{prepared_response.etag}"')
+        )
+        self.assertEqual((http_status, body), (HTTPStatus.NOT_MODIFIED, b''))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,26 @@
+import unittest
+
+from utilities.profiling_utils import ProfilingUtils
+
+
+class TestProfilingUtils(unittest.TestCase):
+    def test_stages_are_summed_up(self):
+        ProfilingUtils.start_request_timings()
+        for _ in range(3):
+            with ProfilingUtils.time_stage('redis'):
+                pass
+        with ProfilingUtils.time_stage('serialize'):
+            pass
+        timings = ProfilingUtils.stop_request_timings()
+        self.assertEqual(sorted(timings), ['redis', 'serialize'])
+        self.assertEqual(timings['redis'][1], 3)
+        self.assertGreaterEqual(timings['redis'][0], 0)
+
+    def test_stages_are_not_recorded_outside_requests(self):
+        with ProfilingUtils.time_stage('redis'):
+            pass
+        self.assertEqual(ProfilingUtils.stop_request_timings(), {})
+
+    def test_format_server_timing(self):
+        server_timing = ProfilingUtils.format_server_timing({'redis': [0.00125, 3]}, 0.0041)
+        self.assertEqual(server_timing, 'redis;dur=1.250;desc="3 calls", total;dur=4.100')
@@ -0,0 +1,43 @@
+import threading
+import time
+import unittest
+
+from big_query.query_cache import QueryResultCache
+
+
+class TestQueryResultCache(unittest.TestCase):
+    def test_concurrent_queries_share_one_run(self):
+        query_cache = QueryResultCache(ttl_seconds=60)
+        runs, results = [], []
+
+        def run_query():
+            runs.append(1)
+            time.sleep(0.1)
+            return 'result'
+
+        threads = [
+            threading.Thread(target=lambda: results.append(query_cache.get_or_run('query', run_query)))
+            for _ in range(5)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(results, ['result'] * 5)
+        self.assertEqual(query_cache.get_or_run('query', run_query), 'result')
+        self.assertEqual(len(runs), 1)
+
+    def test_errors_and_disabled_results_are_not_cached(self):
+        query_cache = QueryResultCache(ttl_seconds=0)
+
+        def failed_query():
+            raise ValueError
+
+        with self.assertRaises(ValueError):
+            query_cache.get_or_run('query', failed_query)
+        self.assertEqual(query_cache.get_or_run('query', lambda: 1), 1)
+        self.assertEqual(query_cache.get_or_run('query', lambda: 2), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,51 @@
+import unittest
+
+import numpy as np
+
+from celery_app.crimes_codec import CrimesCodec, CrimesColumns
+from celery_app.spatial_index import CrimesSpatialIndex
+
+
+class TestCrimesSpatialIndex(unittest.TestCase):
+    def setUp(self):
+        random_generator = np.random.default_rng(7)
+        crimes_count = 5000
+        self.crimes = CrimesColumns(
+            lat=41.65 + random_generator.random(crimes_count) * 0.37,
+            lon=-87.85 + random_generator.random(crimes_count) * 0.33,
+            days=np.sort(random_generator.integers(19000, 19500, crimes_count))[::-1]
+        )
+        self.spatial_index = CrimesSpatialIndex.decode(CrimesSpatialIndex.build(self.crimes).encode())
+
+    def test_query_bbox(self):
+        rows = self.spatial_index.query_bbox(self.crimes, 41.80, -87.70, 41.85, -87.60)
+        expected_rows = np.nonzero(
+            (self.crimes.lat >= 41.80) & (self.crimes.lat <= 41.85) &
+            (self.crimes.lon >= -87.70) & (self.crimes.lon <= -87.60)
+        )[0]
+        self.assertTrue(np.array_equal(rows, expected_rows))
+        self.assertEqual(len(self.spatial_index.query_bbox(self.crimes, 10, 10, 11, 11)), 0)
+
+    def test_query_radius(self):
+        rows = self.spatial_index.query_radius(self.crimes, 41.8781, -87.6298, 2000)
+        lat1, lon1 = np.radians(41.8781), np.radians(-87.6298)
+        lat2, lon2 = np.radians(self.crimes.lat), np.radians(self.crimes.lon)
+        distances = 2 * 6371008.8 * np.arcsin(np.sqrt(
+            np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+        ))
+        self.assertTrue(np.array_equal(rows, np.nonzero(distances <= 2000)[0]))
+
+    def test_empty_crimes(self):
+        crimes = CrimesColumns.from_records([])
+        spatial_index = CrimesSpatialIndex.decode(CrimesSpatialIndex.build(crimes).encode())
+        self.assertEqual(len(spatial_index.query_radius(crimes, 41.8781, -87.6298, 2000)), 0)
+
+    def test_fingerprint_of_indexed_crimes(self):
+        self.assertEqual(self.spatial_index.fingerprint, self.crimes.fingerprint)
+        # refreshed crimes may have the same number of rows, but the index doesn't belong to them
+        refreshed_crimes = CrimesColumns(lat=self.crimes.lat[::-1], lon=self.crimes.lon[::-1], days=self.crimes.days)
+        self.assertEqual(len(refreshed_crimes), self.spatial_index.count)
+        self.assertNotEqual(self.spatial_index.fingerprint, refreshed_crimes.fingerprint)
+        # crimes that are cached with 32 bit floats are the same crimes
+        cached_crimes = CrimesCodec.decode_columns(CrimesCodec.encode(self.crimes, float_bits=32))
+        self.assertEqual(self.spatial_index.fingerprint, cached_crimes.fingerprint)
@@ -0,0 +1,113 @@
+import os
+from typing import Collection, Tuple
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Histogram, generate_latest, multiprocess,
+    start_http_server
+)
+
+# buckets of operations that take less than a millisecond when everything is fine, e.g. redis commands
+fast_buckets = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+# buckets of crimes data backend queries and celery tasks, which take seconds
+slow_buckets = (0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+
+class MetricsUtils:
+    """A class of Prometheus metrics of API workers and celery workers. Each process writes its metrics to
+    memory mapped files of `PROMETHEUS_MULTIPROC_DIR` if it is set, so metrics of all gunicorn workers and celery
+    processes are summed up when they are exposed, otherwise metrics of the current process are exposed."""
+
+    api_request_seconds = Histogram(
+        'api_request_duration_seconds', 'Duration of API requests', ('endpoint', 'status')
+    )
+    api_serialize_seconds = Histogram(
+        'api_serialize_duration_seconds', 'Duration of serializing API responses', ('format',), buckets=fast_buckets
+    )
+    crimes_cache_lookups = Counter(
+        'crimes_cache_lookups', 'Lookups of cached crimes of each primary type in redis', ('primary_type', 'result')
+    )
+    crimes_backend_fetches = Counter(
+        'crimes_backend_fetches', 'Crimes of primary types that are fetched from crimes data backend by API workers',
+        ('primary_type',)
+    )
+    local_cache_lookups = Counter(
+        'local_cache_lookups', 'Lookups of local cache of API workers', ('cache', 'result')
+    )
+    redis_command_seconds = Histogram(
+        'redis_command_duration_seconds', 'Duration of redis commands and pipelines', ('command',),
+        buckets=fast_buckets
+    )
+    crimes_decode_seconds = Histogram(
+        'crimes_decode_duration_seconds', 'Duration of decoding cached crimes', ('format',), buckets=fast_buckets
+    )
+    bigquery_query_seconds = Histogram(
+        'bigquery_query_duration_seconds', 'Duration of BigQuery queries', ('outcome',), buckets=slow_buckets
+    )
+    bigquery_bytes_processed = Counter('bigquery_processed_bytes', 'Bytes that are processed by BigQuery queries')
+    bigquery_bytes_billed = Counter('bigquery_billed_bytes', 'Bytes that are billed for BigQuery queries')
+    bigquery_jobs = Counter('bigquery_jobs', 'BigQuery query jobs', ('cache_hit',))
+    celery_task_seconds = Histogram(
+        'celery_task_duration_seconds', 'Duration of celery tasks', ('task', 'outcome'), buckets=slow_buckets
+    )
+
+    # label of primary types that are not known, so names that clients send don't create new metric series
+    other_primary_type_label = 'other'
+
+    @staticmethod
+    def primary_type_label(primary_type: str, primary_types: Collection[str]) -> str:
+        """Returns value of "primary_type" label of a primary type, each label value is a new metric series
+        in every process, so only known primary types have their own label
+
+        Args:
+            primary_type (str): A string that indicates primary type
+            primary_types: A collection of known primary types, e.g. cached crimes primary types
+
+        Returns:
+            The primary type if it is known, otherwise "other"
+        """
+        return primary_type if primary_type in primary_types else MetricsUtils.other_primary_type_label
+
+    @staticmethod
+    def is_multiprocess() -> bool:
+        """Returns True if metrics of processes are written to `PROMETHEUS_MULTIPROC_DIR`"""
+        return bool(os.environ.get('PROMETHEUS_MULTIPROC_DIR'))
+
+    @staticmethod
+    def get_registry() -> CollectorRegistry:
+        """Returns a registry of metrics that must be exposed, it collects metrics of all processes
+        in multiprocess mode"""
+
+        if not MetricsUtils.is_multiprocess():
+            return REGISTRY
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return registry
+
+    @staticmethod
+    def generate_metrics() -> Tuple[bytes, str]:
+        """Generate Prometheus text exposition of metrics
+
+        Returns:
+            A tuple of exposition bytes and its content type
+        """
+        return generate_latest(MetricsUtils.get_registry()), CONTENT_TYPE_LATEST
+
+    @staticmethod
+    def start_metrics_server(port: int):
+        """Expose metrics in a background HTTP server, it is used by processes that don't serve HTTP, e.g. celery
+
+        Args:
+            port (int): TCP port of metrics server
+        """
+        start_http_server(port, registry=MetricsUtils.get_registry())
+
+    @staticmethod
+    def mark_process_dead(pid: int):
+        """Remove live gauges of a dead process in multiprocess mode, counters and histograms of the process
+        are kept, so totals don't decrease
+
+        Args:
+            pid (int): id of the dead process
+        """
+        if MetricsUtils.is_multiprocess():
+            multiprocess.mark_process_dead(pid)
@@ -0,0 +1,91 @@
+import contextvars
+import time
+from typing import Dict, List, Optional
+
+# seconds and number of calls of each stage of the current request, None when timings of the current request
+# are not recorded, e.g. in celery tasks or when request profiling is disabled
+request_timings: contextvars.ContextVar[Optional[Dict[str, List[float]]]] = contextvars.ContextVar(
+    'request_timings', default=None
+)
+
+
+class StageTimer:
+    """A context manager that measures a stage of a request, e.g. redis commands or serializing response.
+    Duration is observed by the given Prometheus histogram and added to timings of the current request
+    if they are recorded"""
+
+    __slots__ = ('stage', 'histogram', 'start_time')
+
+    def __init__(self, stage: str, histogram=None):
+        self.stage = stage
+        self.histogram = histogram
+        self.start_time = 0.0
+
+    def __enter__(self) -> 'StageTimer':
+        self.start_time = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        duration = time.perf_counter() - self.start_time
+        if self.histogram is not None:
+            self.histogram.observe(duration)
+        timings = request_timings.get()
+        if timings is not None:
+            stage_timings = timings.get(self.stage)
+            if stage_timings is None:
+                timings[self.stage] = [duration, 1]
+            else:
+                stage_timings[0] += duration
+                stage_timings[1] += 1
+
+
+class ProfilingUtils:
+    """A class to record per-stage timings of requests, timings are sent to clients as `Server-Timing` header"""
+
+    @staticmethod
+    def time_stage(stage: str, histogram=None) -> StageTimer:
+        """Measure a stage of the current request
+
+        Args:
+            stage (str): name of stage, e.g. "redis", the same stages of a request are summed up
+            histogram: A Prometheus histogram(with its labels) that observes duration too, None means no metric
+
+        Returns:
+            A StageTimer context manager
+        """
+        return StageTimer(stage, histogram)
+
+    @staticmethod
+    def start_request_timings():
+        """Start recording stage timings of the current request"""
+        request_timings.set({})
+
+    @staticmethod
+    def stop_request_timings() -> Dict[str, List[float]]:
+        """Stop recording stage timings of the current request
+
+        Returns:
+            A dict that maps each stage to its seconds and number of calls
+        """
+
+        timings = request_timings.get()
+        request_timings.set(None)
+        return timings or {}
+
+    @staticmethod
+    def format_server_timing(timings: Dict[str, List[float]], total_seconds: float) -> str:
+        """Format stage timings as value of `Server-Timing` header, durations are in milliseconds
+
+        Args:
+            timings: A dict that maps each stage to its seconds and number of calls
+            total_seconds (float): duration of the whole request
+
+        Returns:
+            A string like 'redis;dur=1.250;desc="3 calls", total;dur=4.100'
+        """
+
+        metrics = [
+            f'{stage};dur={seconds * 1000:.3f};desc="{int(calls)} calls"' for stage, (seconds, calls) in timings.items()
+        ]
+        metrics.append(f'total;dur={total_seconds * 1000:.3f}')
+        return ', '.join(metrics)